@@ -0,0 +1,278 @@
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import tracemalloc
+
+from calc_engine import MappingRewriter, normalize_expression, DEFAULT_FUNCTION_MAPPINGS, DEFAULT_DIGITS
+
+# Benchmarks for the evaluation pipeline, one stage at a time. Everything runs
+# in this process with calc_math imported directly, so no worker pool and no
+# QApplication are involved; the numbers are the cost of the stage itself.
+
+STAGES = ("strip", "rewrite", "parse", "approx", "closed_form", "latex")
+PERCENTILES = (50, 95, 99)
+DEFAULT_REPEAT = 20
+DEFAULT_THRESHOLD = 0.25
+# Stages faster than this are all noise; they never count as regressions
+DEFAULT_MIN_DELTA_MS = 0.05
+
+
+# ==============================
+# Corpus
+# ==============================
+def _heavy_mappings():
+    # A few hundred user mappings, including literal ones, like a power
+    # user's settings file
+    mappings = dict(DEFAULT_FUNCTION_MAPPINGS)
+    for i in range(300):
+        mappings["fn{0}".format(i)] = "sin" if i % 2 else "cos"
+    mappings.update({"×": "*", "÷": "/", "√": "sqrt", "π": "pi"})
+    return mappings
+
+
+def _continued_fraction(depth):
+    latex_str = "1"
+    for _ in range(depth):
+        latex_str = "\\frac{{1}}{{1+{0}}}".format(latex_str)
+    return latex_str
+
+
+def _fraction_sum(count):
+    return " + ".join("\\frac{{{0}}}{{{1}}}".format(k, k + 1) for k in range(1, count + 1))
+
+
+HEAVY_MAPPINGS = _heavy_mappings()
+
+# name, kind, input, angle mode, mappings
+CORPUS = (
+    ("trig_deg", "expr", "sin(30) + cos(60) * tan(45)", "deg", DEFAULT_FUNCTION_MAPPINGS),
+    ("trig_deg_inverse", "expr", "arcsin(0.5) + arctan(1)", "deg", DEFAULT_FUNCTION_MAPPINGS),
+    ("trig_rad", "expr", "sin(pi/7)**2 + cos(pi/7)**2 + tan(pi/12)", "rad", DEFAULT_FUNCTION_MAPPINGS),
+    ("factorial_large", "expr", "1000!", "rad", DEFAULT_FUNCTION_MAPPINGS),
+    ("factorial_ratio", "expr", "factorial(500) / factorial(497)", "rad", DEFAULT_FUNCTION_MAPPINGS),
+    ("nested_radical", "expr", "sqrt(2 + sqrt(3))", "rad", DEFAULT_FUNCTION_MAPPINGS),
+    ("nested_radical_deep", "expr", "sqrt(5 + 2*sqrt(6)) + sqrt(3 + sqrt(2 + sqrt(1 + sqrt(5))))", "rad",
+     DEFAULT_FUNCTION_MAPPINGS),
+    ("mappings_heavy", "expr", " + ".join("fn{0}(π÷{1})×2".format(i, i + 2) for i in range(0, 300, 15)),
+     "rad", HEAVY_MAPPINGS),
+    ("mappings_literal", "expr", "√(2)×√(8)÷π + arcsin(1)", "rad", HEAVY_MAPPINGS),
+    ("latex_fraction_long", "latex", _fraction_sum(40), "rad", None),
+    ("latex_continued_fraction", "latex", _continued_fraction(12), "rad", None),
+    ("latex_trig", "latex", "\\sin^2 \\frac{\\pi}{5} + \\cos^2 \\frac{\\pi}{5} + \\sqrt[3]{27}", "rad", None),
+)
+
+
+# ==============================
+# Stages
+# ==============================
+def _clear_caches(calc_math):
+    # Every sample starts cold: the parser and subtree caches and sympy's own
+    # cache would otherwise make every repeat after the first a dictionary lookup
+    import calc_latex
+    calc_math.sp.core.cache.clear_cache()
+    calc_math._LATEX_CACHE.clear()
+    calc_math._NUMERIC.clear()
+    calc_math._CLOSED_FORMS.clear()
+    calc_latex._GROUP_CACHE.clear()
+
+
+def stage_plan(calc_math, case):
+    # (stage, callable) pairs for one corpus entry. Each stage gets the output
+    # of the previous one, computed once up front, so only its own work is timed.
+    name, kind, input_str, angle_mode, mappings = case
+    plan = []
+    if kind == "latex":
+        latex_str = input_str.strip()
+        plan.append(("latex", lambda: calc_math.parse_latex(latex_str)))
+        expr = calc_math.parse_latex(latex_str)
+    else:
+        rewriter = MappingRewriter(mappings)
+        stripped = normalize_expression(input_str)
+        mapped = rewriter.rewrite(stripped)
+        plan.append(("strip", lambda: normalize_expression(input_str)))
+        plan.append(("rewrite", lambda: rewriter.rewrite(stripped)))
+        plan.append(("parse", lambda: calc_math.parse_expression(mapped, angle_mode)))
+        expr = calc_math.parse_expression(mapped, angle_mode)
+    plan.append(("approx", lambda: calc_math.approximate(expr, DEFAULT_DIGITS)))
+    plan.append(("closed_form", lambda: calc_math.find_closed_form(expr)))
+    return plan
+
+
+def percentile(sorted_values, pct):
+    # Nearest rank
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct * len(sorted_values) / 100.0) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_benchmarks(corpus=CORPUS, repeat=DEFAULT_REPEAT, stages=STAGES, memory=True, progress=None):
+    import calc_math
+    samples = {stage: [] for stage in stages}
+    peaks = {stage: 0 for stage in stages}
+    for case in corpus:
+        if progress:
+            progress(case[0])
+        for stage, func in stage_plan(calc_math, case):
+            if stage not in samples:
+                continue
+            # Timing runs first without tracemalloc, which slows allocation-heavy
+            # code down several times; one traced run then gives the peak
+            for _ in range(repeat):
+                _clear_caches(calc_math)
+                start = time.perf_counter()
+                func()
+                samples[stage].append((time.perf_counter() - start) * 1000.0)
+            if not memory:
+                continue
+            _clear_caches(calc_math)
+            tracemalloc.start()
+            try:
+                func()
+                peaks[stage] = max(peaks[stage], tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+    results = {}
+    for stage in stages:
+        values = sorted(samples[stage])
+        if not values:
+            continue
+        stats = {"p{0}".format(pct): round(percentile(values, pct), 4) for pct in PERCENTILES}
+        stats["peak_kb"] = round(peaks[stage] / 1024.0, 1) if memory else None
+        stats["samples"] = len(values)
+        results[stage] = stats
+    return results
+
+
+# ==============================
+# Baselines
+# ==============================
+def environment():
+    import sympy
+    return {"python": platform.python_version(), "sympy": sympy.__version__, "machine": platform.machine()}
+
+
+def write_baseline(results, path):
+    data = {"version": 1, "environment": environment(), "stages": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def read_baseline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("stages"), dict):
+        raise ValueError("{0} is not a benchmark baseline".format(path))
+    return data
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    # A stage regresses when its median or p95 latency, or its peak memory,
+    # grew by more than `threshold` of the baseline. p99 is reported but not
+    # gated; with a few hundred samples it is one or two outliers.
+    regressions = []
+    for stage, stats in results.items():
+        base = baseline["stages"].get(stage)
+        if not base:
+            continue
+        for metric in ("p50", "p95"):
+            if (stats[metric] > base[metric] * (1 + threshold)
+                    and stats[metric] - base[metric] > min_delta_ms):
+                regressions.append((stage, metric, base[metric], stats[metric]))
+        if stats["peak_kb"] is None or base.get("peak_kb") is None:
+            continue
+        if stats["peak_kb"] > base["peak_kb"] * (1 + threshold) and stats["peak_kb"] - base["peak_kb"] > 64:
+            regressions.append((stage, "peak_kb", base["peak_kb"], stats["peak_kb"]))
+    return regressions
+
+
+# ==============================
+# Output
+# ==============================
+def _cell(value, spec):
+    return (format(value, spec) if value is not None else "-").rjust(10)
+
+
+def _change(stats, base, key):
+    if stats.get(key) is None or not base.get(key):
+        return None
+    return stats[key] / base[key] - 1
+
+
+def format_table(results, baseline=None):
+    header = "{0:<12} {1:>10} {2:>10} {3:>10} {4:>10} {5:>8}".format(
+        "stage", "p50 ms", "p95 ms", "p99 ms", "peak KB", "samples")
+    lines = [header, "-" * len(header)]
+    for stage, stats in results.items():
+        lines.append("{0:<12} {1} {2} {3} {4} {5:>8}".format(
+            stage, *(_cell(stats[key], ".3f") for key in ("p50", "p95", "p99")),
+            _cell(stats["peak_kb"], ".1f"), stats["samples"]))
+        base = baseline["stages"].get(stage) if baseline else None
+        if base:
+            lines.append("{0:<12} {1}".format("  vs base", " ".join(
+                _cell(_change(stats, base, key), "+.0%") for key in ("p50", "p95", "p99", "peak_kb"))))
+    return "\n".join(lines)
+
+
+# ==============================
+# Entry Point
+# ==============================
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Time each stage of the evaluation pipeline over a fixed corpus.")
+    parser.add_argument("-n", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="timed runs per corpus entry and stage (default: %(default)s)")
+    parser.add_argument("-s", "--stage", action="append", choices=STAGES,
+                        help="only run this stage (repeatable)")
+    parser.add_argument("-k", "--case", action="append",
+                        help="only run corpus entries whose name contains this (repeatable)")
+    parser.add_argument("--baseline", help="baseline JSON to compare against; regressions exit with 1")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction of the baseline (default: %(default)s)")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="ignore latency changes smaller than this (default: %(default)s)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced run that measures peak memory (much faster)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stages = tuple(args.stage) if args.stage else STAGES
+    corpus = [case for case in CORPUS if not args.case or any(part in case[0] for part in args.case)]
+    if not corpus:
+        print("No corpus entries match.", file=sys.stderr)
+        return 2
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = read_baseline(args.baseline)
+        except (OSError, ValueError) as e:
+            print(str(e), file=sys.stderr)
+            return 2
+    results = run_benchmarks(corpus, max(args.repeat, 1), stages, not args.no_memory,
+                             progress=None if args.json else lambda name: print(name, file=sys.stderr))
+    if args.json:
+        print(json.dumps({"environment": environment(), "stages": results}, indent=2, sort_keys=True))
+    else:
+        print(format_table(results, baseline))
+    if args.save_baseline:
+        write_baseline(results, args.save_baseline)
+    if baseline is None:
+        return 0
+    if baseline.get("environment") != environment():
+        print("Note: baseline was recorded with {0}".format(baseline.get("environment")), file=sys.stderr)
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for stage, metric, before, after in regressions:
+        print("REGRESSION {0} {1}: {2} -> {3}".format(stage, metric, before, after), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
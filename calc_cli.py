@@ -0,0 +1,209 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from calc_engine import (
+    WorkerPool, ExpressionCache, MappingRewriter, normalize_expression, cache_key, latex_cache_key,
+    DEFAULT_TRANSFORMATIONS, DEFAULT_FUNCTION_MAPPINGS, DEFAULT_DIGITS, MAX_DIGITS
+)
+
+CUSTOMIZATION_FILE = "customizations.txt"
+CSV_FIELDS = ["line", "input", "status", "analytical", "approx", "error"]
+
+
+# ==============================
+# Settings
+# ==============================
+def read_settings(path):
+    # Same file and defaults as the GUI; a missing or broken file just means defaults
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    data.setdefault("mappings", dict(DEFAULT_FUNCTION_MAPPINGS))
+    data.setdefault("angle_mode", "rad")
+    data.setdefault("transformations", list(DEFAULT_TRANSFORMATIONS))
+    data.setdefault("eval_timeout", 30)
+    data.setdefault("analytical_deadline", 5)
+    data.setdefault("precision", DEFAULT_DIGITS)
+    data.setdefault("worker_max_jobs", 100)
+    data.setdefault("worker_memory_limit_mb", 2048)
+    data.setdefault("worker_cpu_limit", 60)
+    return data
+
+
+# ==============================
+# Batch Evaluation
+# ==============================
+class BatchEvaluator:
+    # Runs one pool job per input line. Duplicate lines are answered from the
+    # cache once the first copy has finished.
+    def __init__(self, pool, settings, latex=False, timeout=None, analytical_deadline=None):
+        self.pool = pool
+        self.latex = latex
+        self.angle_mode = settings["angle_mode"]
+        self.transformations = list(settings["transformations"])
+        self.rewriter = MappingRewriter(settings["mappings"])
+        self.digits = min(max(int(settings["precision"]), DEFAULT_DIGITS), MAX_DIGITS)
+        self.timeout = timeout if timeout is not None else settings["eval_timeout"]
+        self.analytical_deadline = (analytical_deadline if analytical_deadline is not None
+                                    else settings["analytical_deadline"])
+        self.cache = ExpressionCache(max_entries=10000, max_bytes=64 * 1024 * 1024)
+        self.cache_lock = threading.Lock()
+
+    def request_for(self, input_str):
+        if self.latex:
+            expr_str = input_str.strip()
+            return expr_str, latex_cache_key(expr_str), {"op": "latex", "expr": expr_str}
+        expr_str = self.rewriter.rewrite(normalize_expression(input_str))
+        key = cache_key(expr_str, self.angle_mode, self.transformations, self.rewriter.digest, self.digits)
+        return expr_str, key, {"op": "eval", "expr": expr_str, "angle_mode": self.angle_mode,
+                               "transformations": self.transformations, "digits": self.digits}
+
+    def evaluate(self, line_no, input_str):
+        result = {"line": line_no, "input": input_str, "status": "ok",
+                  "analytical": None, "approx": None, "error": None}
+        expr_str, key, request = self.request_for(input_str)
+        with self.cache_lock:
+            cached = self.cache.get(key)
+        if cached is not None:
+            result["analytical"] = cached.get("analytical")
+            result["approx"] = cached.get("approx")
+            return result
+        partials = []
+        response = self.pool.submit(request, timeout=self.timeout, on_partial=partials.append,
+                                    partial_timeout=None if self.latex else self.analytical_deadline)
+        status = response["status"]
+        if status == "ok":
+            result["analytical"] = response.get("analytical")
+            result["approx"] = response["approx"]
+            with self.cache_lock:
+                self.cache.put(key, {"expr": response["expr"], "approx": response["approx"],
+                                     "analytical": result["analytical"]})
+        elif status == "timeout" and partials:
+            # Same as the GUI: keep the approximation, the analytical form ran out of time
+            result["approx"] = partials[-1]["approx"]
+            result["status"] = "partial"
+        else:
+            result["status"] = status
+            result["error"] = response.get("error") or status
+        return result
+
+
+def read_inputs(stream):
+    for line_no, line in enumerate(stream, 1):
+        line = line.rstrip("\r\n")
+        if line.strip():
+            yield line_no, line
+
+
+def evaluate_stream(evaluator, inputs, jobs):
+    # Results come out in input order while at most a few jobs per worker are in
+    # flight, so arbitrarily long inputs are streamed rather than loaded up front
+    window = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for line_no, input_str in inputs:
+            window.append(executor.submit(evaluator.evaluate, line_no, input_str))
+            if len(window) >= jobs * 4:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+# ==============================
+# Output
+# ==============================
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, result):
+        self.stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+class CsvWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, result):
+        self.writer.writerow(result)
+        self.stream.flush()
+
+
+WRITERS = {
+    "jsonl": JsonLinesWriter,
+    "csv": CsvWriter,
+}
+
+
+# ==============================
+# Entry Point
+# ==============================
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Evaluate one expression per line with the calculator's engine.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file with one expression per line, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout (default)")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS), default="jsonl")
+    parser.add_argument("-j", "--jobs", type=int, default=0,
+                        help="worker processes (default: worker_count from the settings, else CPU count)")
+    parser.add_argument("--latex", action="store_true", help="treat every line as LaTeX")
+    parser.add_argument("--angle-mode", choices=["rad", "deg"], help="override the saved angle mode")
+    parser.add_argument("--digits", type=int, help="approximation digits (default: precision from the settings)")
+    parser.add_argument("--timeout", type=float, help="seconds per expression (default: eval_timeout)")
+    parser.add_argument("--analytical-deadline", type=float,
+                        help="seconds to look for a closed form after the approximation")
+    parser.add_argument("--settings", default=CUSTOMIZATION_FILE,
+                        help="customizations file to read mappings and modes from")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = read_settings(args.settings)
+    if args.angle_mode:
+        settings["angle_mode"] = args.angle_mode
+    if args.digits:
+        settings["precision"] = args.digits
+    # Unlike the GUI pool, a batch run may use every core
+    jobs = args.jobs or settings.get("worker_count") or os.cpu_count() or 1
+    pool = WorkerPool(size=jobs, max_jobs=settings["worker_max_jobs"],
+                      memory_limit_mb=settings["worker_memory_limit_mb"],
+                      cpu_limit=settings["worker_cpu_limit"])
+    pool.start()
+    evaluator = BatchEvaluator(pool, settings, latex=args.latex, timeout=args.timeout,
+                               analytical_deadline=args.analytical_deadline)
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    failures = 0
+    try:
+        writer = WRITERS[args.format](sink)
+        for result in evaluate_stream(evaluator, read_inputs(source), jobs):
+            if result["status"] not in ("ok", "partial"):
+                failures += 1
+            writer.write(result)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        pool.shutdown()
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import json
+import time
+import threading
+import itertools
+from collections import deque
+
+# Per-evaluation timing spans. A Tracer keeps the last MAX_TRACES evaluations
+# in a ring buffer; the Settings tab shows the slowest of them and they can be
+# exported as a Chrome trace (chrome://tracing, Perfetto). While the tracer is
+# disabled, begin() hands out NULL_TRACE, whose methods do nothing, so the
+# instrumented code pays for one attribute check and an empty call.
+
+MAX_TRACES = 500
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _NullTrace:
+    def __bool__(self):
+        return False
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def add(self, name, start, end):
+        pass
+
+    def add_remote(self, spans, base):
+        pass
+
+    def finish(self, status="ok"):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class _Span:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Trace:
+    # Spans are (name, start, end) in perf_counter seconds. They may nest:
+    # "widget" contains the "persist" of the history row it finished.
+    def __init__(self, tracer, trace_id, label, source):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.label = label
+        self.source = source
+        self.start = time.perf_counter()
+        self.end = None
+        self.status = None
+        self.spans = []
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def add(self, name, start, end):
+        self.spans.append((name, start, end))
+
+    def add_remote(self, spans, base):
+        # Worker spans come as [name, offset, duration] from the start of the
+        # job; they are placed relative to when the job was submitted
+        for name, offset, duration in spans or ():
+            self.spans.append((name, base + offset, base + offset + duration))
+
+    def finish(self, status="ok"):
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        self.status = status
+        self.tracer.record(self)
+
+    @property
+    def total(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def breakdown(self):
+        # Total seconds per stage name, in order of first appearance
+        totals = {}
+        for name, start, end in self.spans:
+            totals[name] = totals.get(name, 0.0) + end - start
+        return totals
+
+
+class Tracer:
+    def __init__(self, max_traces=MAX_TRACES):
+        self.enabled = False
+        self.traces = deque(maxlen=max_traces)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        # Chrome traces want microseconds from some origin; the first trace is as good as any
+        self.origin = time.perf_counter()
+
+    def begin(self, label, source):
+        if not self.enabled:
+            return NULL_TRACE
+        return Trace(self, next(self.ids), label, source)
+
+    def record(self, trace):
+        with self.lock:
+            self.traces.append(trace)
+
+    def recent(self):
+        with self.lock:
+            return list(self.traces)
+
+    def slowest(self, count=10):
+        return sorted(self.recent(), key=lambda trace: trace.total, reverse=True)[:count]
+
+    def clear(self):
+        with self.lock:
+            self.traces.clear()
+
+    def chrome_trace(self):
+        events = []
+        for trace in self.recent():
+            tid = trace.trace_id
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                           "args": {"name": "{0}: {1}".format(trace.source, trace.label)}})
+            events.append({"name": trace.label, "cat": trace.source, "ph": "X", "pid": 1, "tid": tid,
+                           "ts": self.micros(trace.start), "dur": round(trace.total * 1e6, 1),
+                           "args": {"status": trace.status}})
+            for name, start, end in trace.spans:
+                events.append({"name": name, "cat": "stage", "ph": "X", "pid": 1, "tid": tid,
+                               "ts": self.micros(start), "dur": round((end - start) * 1e6, 1)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def micros(self, seconds):
+        return round((seconds - self.origin) * 1e6, 1)
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+
+TRACER = Tracer()
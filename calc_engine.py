@@ -0,0 +1,805 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import queue
+import signal
+import threading
+import itertools
+import multiprocessing
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from calc_profile import ProfileCapture
+
+# ==============================
+# Input Rewriting
+# ==============================
+# Optional sympy_parser transformations, in the order parse_expr applies them
+TRANSFORMATION_NAMES = ("factorial_notation", "convert_xor", "implicit_multiplication")
+DEFAULT_TRANSFORMATIONS = ("factorial_notation",)
+
+# Approximations always arrive at DEFAULT_DIGITS first; higher precisions are
+# reached through the intermediate stages so something useful shows early
+DEFAULT_DIGITS = 15
+PRECISION_STAGES = (100,)
+MAX_DIGITS = 10000
+
+
+def refinement_stages(digits):
+    if digits <= DEFAULT_DIGITS:
+        return []
+    return [stage for stage in PRECISION_STAGES if stage < digits] + [digits]
+
+
+# Table sweeps: x runs from start in `step` increments up to stop (inclusive)
+TABLE_VARIABLE = "x"
+MAX_TABLE_POINTS = 10 ** 7
+
+
+def table_points(start, stop, step):
+    if not step:
+        raise ValueError("Step must not be zero")
+    span = (stop - start) / step
+    if span < 0:
+        raise ValueError("Step goes away from the end of the range")
+    # Tolerate rounding so 0..1 step 0.1 includes 1
+    count = int(span + 1e-9) + 1
+    if count > MAX_TABLE_POINTS:
+        raise ValueError("More than {0} points".format(MAX_TABLE_POINTS))
+    return count
+
+
+DEFAULT_FUNCTION_MAPPINGS = {
+    "arcsin": "asin",
+    "arccos": "acos",
+    "arctan": "atan"
+}
+
+
+def normalize_expression(expr_str):
+    return expr_str.replace("\n", "").replace("\t", "").replace(" ", "")
+
+
+_NUMBER_PATTERN = r"(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+_NAME_PATTERN = r"[^\W\d]\w*"
+_NAME_RE = re.compile(_NAME_PATTERN)
+_DEFINITION_RE = re.compile(r"({0})\(([^()]*)\):=(.+)".format(_NAME_PATTERN))
+
+
+def mappings_digest(mappings):
+    data = json.dumps(sorted(mappings.items()), ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+class MappingRewriter:
+    # Applies all mappings in one left-to-right pass. Mappings whose name is an
+    # identifier only replace whole identifiers ("arcsin" leaves "xarcsin"
+    # alone); any other mapping ("^", "×", ...) is matched literally, longest
+    # first. Numbers are consumed as tokens so "2arcsin" still maps.
+    def __init__(self, mappings):
+        self.mappings = dict(mappings)
+        self.digest = mappings_digest(self.mappings)
+        literals = sorted((name for name in self.mappings if name and not _NAME_RE.fullmatch(name)),
+                          key=len, reverse=True)
+        parts = []
+        if literals:
+            parts.append("(?P<literal>{0})".format("|".join(re.escape(name) for name in literals)))
+        parts.append("(?P<number>{0})".format(_NUMBER_PATTERN))
+        parts.append("(?P<name>{0})".format(_NAME_PATTERN))
+        self.pattern = re.compile("|".join(parts))
+
+    def _replace(self, match):
+        text = match.group()
+        if match.lastgroup == "number":
+            return text
+        return self.mappings.get(text, text)
+
+    def rewrite(self, expr_str):
+        if not self.mappings:
+            return expr_str
+        return self.pattern.sub(self._replace, expr_str)
+
+
+# ==============================
+# Note Scope
+# ==============================
+FUNCTION_TYPE = "Function"
+
+# Names the parser already gives a meaning to. A note by one of these names
+# would change every expression that uses it (a note "pi" makes sin(pi)
+# sin(3)), so notes can't take them. The rest of sympy's namespace is
+# refused by the worker when such a note is used.
+RESERVED_NAMES = frozenset((
+    "pi", "e", "E", "I", "oo", "zoo", "nan", "S", "N", "O", "Q",
+    "sin", "cos", "tan", "sec", "csc", "cot", "asin", "acos", "atan", "asec", "acsc", "acot", "atan2",
+    "sinh", "cosh", "tanh", "asinh", "acosh", "atanh", "sqrt", "cbrt", "root", "exp", "log", "ln",
+    "factorial", "gamma", "beta", "zeta", "binomial", "floor", "ceiling", "sign", "re", "im", "arg",
+    "Abs", "abs", "Max", "Min", "max", "min", "round", "pow", "Sum", "Product", "Integral", "integrate",
+    "diff", "limit", "erf", "polylog", "LambertW", "Rational", "Integer", "Float", "Symbol",
+))
+
+
+def check_note_name(name):
+    if name.strip() in RESERVED_NAMES:
+        raise ValueError("'{0}' is a built-in name and cannot name a note".format(name.strip()))
+
+
+def parse_definition(expr_str):
+    # "f(a,b):=body" (normalized) -> (name, params, body); None if expr_str
+    # is not a definition at all
+    match = _DEFINITION_RE.fullmatch(expr_str)
+    if match is None:
+        return None
+    name, params, body = match.groups()
+    check_note_name(name)
+    params = params.split(",") if params else []
+    if (any(not _NAME_RE.fullmatch(param) for param in params) or len(set(params)) != len(params)
+            or name in params):
+        raise ValueError("Invalid parameter list in definition of {0}".format(name))
+    if name in _NAME_RE.findall(body):
+        raise ValueError("{0} cannot be used in its own definition".format(name))
+    return name, params, body
+
+
+class NoteScope:
+    # Notes as named values inside expressions. Only the dependency graph
+    # lives here: which notes each note's definition mentions. A note is
+    # defined by its input if that parses, else by its value; the sympy values
+    # are parsed and cached in the workers, keyed by the definitions they came
+    # from, so editing one note only invalidates the notes downstream of it.
+    # Function notes have the type "Function" and the definition itself,
+    # f(a,b) := body, as their input; the parameters and body come from there.
+    def __init__(self, notes, rewriter):
+        self.definitions = {}
+        self.types = {}
+        self.params = {}
+        for note in notes:
+            name = (note.get("name") or "").strip()
+            if not _NAME_RE.fullmatch(name) or name in self.definitions or name in RESERVED_NAMES:
+                continue
+            params = None
+            texts = (note.get("input") or "", note.get("value") or "")
+            if note.get("type") == FUNCTION_TYPE:
+                try:
+                    definition = parse_definition(normalize_expression(texts[0]))
+                except ValueError:
+                    definition = None
+                if definition is not None:
+                    params, texts = definition[1], (definition[2],)
+            definitions = []
+            for text in texts:
+                definition = rewriter.rewrite(normalize_expression(text))
+                if definition and definition not in definitions:
+                    definitions.append(definition)
+            self.definitions[name] = tuple(definitions)
+            self.types[name] = note.get("type") or ""
+            self.params[name] = params
+        # A note's own name in its definition is a plain symbol, not a cycle;
+        # neither are a function's parameters
+        self.dependencies = {name: sorted(self.referenced(" ".join(definitions)) - {name}
+                                          - set(self.params[name] or ()))
+                             for name, definitions in self.definitions.items()}
+        self.dependents = {name: [] for name in self.definitions}
+        for name, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                self.dependents[dependency].append(name)
+
+    def referenced(self, expr_str):
+        return {name for name in _NAME_RE.findall(expr_str) if name in self.definitions}
+
+    def closure(self, names):
+        # Every note the given names need, dependencies first, as the
+        # [name, definitions, dependencies, params] entries the worker
+        # expects; params is None for notes that are plain values
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError("Circular note reference: " + " -> ".join(path + [name]))
+            state[name] = "visiting"
+            for dependency in self.dependencies[name]:
+                visit(dependency, path + [name])
+            state[name] = "done"
+            order.append([name, list(self.definitions[name]), self.dependencies[name], self.params[name]])
+
+        for name in sorted(names):
+            visit(name, [])
+        return order
+
+    def affected(self, name):
+        # Notes whose value has to be recomputed after `name` changed
+        seen = set()
+        pending = [name]
+        while pending:
+            for dependent in self.dependents.get(pending.pop(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    pending.append(dependent)
+        return seen
+
+    @staticmethod
+    def digest(closure):
+        data = json.dumps(closure, ensure_ascii=False)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+# ==============================
+# Expression Cache
+# ==============================
+def cache_key(mapped_str, angle_mode, transformations, mapping_digest, digits=DEFAULT_DIGITS):
+    return "{0}|{1}|{2}|{3}|{4}".format(angle_mode, digits, ",".join(sorted(transformations)), mapping_digest,
+                                        mapped_str)
+
+
+def latex_cache_key(latex_str):
+    return "latex|||" + latex_str.strip()
+
+
+class ExpressionCache:
+    # LRU of evaluation results bounded by entry count and (approximate) size.
+    # Entries are dicts of strings: "expr" (srepr of the parsed expression),
+    # "approx" and "analytical".
+    ENTRY_OVERHEAD = 64
+
+    def __init__(self, max_entries=1000, max_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _size(self, key, entry):
+        return self.ENTRY_OVERHEAD + len(key) + sum(len(v) for v in entry.values() if isinstance(v, str))
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        if key in self.entries:
+            self.bytes -= self._size(key, self.entries.pop(key))
+        size = self._size(key, entry)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            old_key, old_entry = self.entries.popitem(last=False)
+            self.bytes -= self._size(old_key, old_entry)
+
+    @staticmethod
+    def _valid_entry(entry):
+        # Only "approx" is always there; Solve entries have no "expr" and
+        # LaTeX ones no "analytical"
+        if not isinstance(entry, dict) or not isinstance(entry.get("approx"), str):
+            return False
+        return all(isinstance(entry.get(name), str) or entry.get(name) is None for name in ("expr", "analytical"))
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except Exception:
+            return
+        if not isinstance(items, list):
+            return
+        # A hand-edited or foreign file shouldn't stop the app from starting;
+        # anything that isn't a [key, entry] pair of the right shape is dropped
+        for item in items:
+            if not isinstance(item, (list, tuple)) or len(item) != 2:
+                continue
+            key, entry = item
+            if isinstance(key, str) and self._valid_entry(entry):
+                self.put(key, entry)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(list(self.entries.items()), f, ensure_ascii=False)
+
+
+# ==============================
+# Worker Protocol
+# ==============================
+# Requests are dicts {"id": int, "op": str, ...}; every request gets exactly one
+# final response {"id": int, "status": str, ...}. Status is one of:
+#   "partial"   -- an intermediate result (e.g. the approximation before the
+#                  analytical form); more messages follow for the same id
+#   "ok"        -- the op succeeded, op-specific result keys are set
+#   "error"     -- the op raised, "error" holds the message
+#   "timeout"   -- the job exceeded its wall-clock budget and the worker was killed
+#   "cancelled" -- the caller cancelled the job and the worker was killed
+#   "crashed"   -- the worker died (e.g. CPU limit, segfault) before responding
+# A worker announces itself with {"op": "ready"} and exits on {"op": "shutdown"}.
+# "ping" and "preload" do no evaluation; they measure and warm up a worker.
+
+# Imported by worker_main: the sympy side is only ever loaded in workers
+calc_math = None
+
+
+class CPULimitExceeded(Exception):
+    pass
+
+
+def _timed(request, stage, func, *args):
+    # Requests sent with "trace" get [stage, offset, duration] spans back;
+    # everything else pays for one dict lookup
+    spans = request.get("spans")
+    if spans is None:
+        return func(*args)
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        spans.append([stage, start, time.perf_counter() - start])
+
+
+def _approximate(request, expr, transformations, digits):
+    # Prefer the fast path's digits so the worker agrees with what the GUI
+    # showed first. The fast path handles calls to function notes but gives
+    # up on expressions that use note values.
+    return (calc_math.fast_approximate(request["expr"], request["angle_mode"], transformations, digits,
+                                       request.get("notes"))
+            or calc_math.approximate(expr, digits))
+
+
+def _handle_eval(request, emit):
+    transformations = request.get("transformations", DEFAULT_TRANSFORMATIONS)
+    names = _timed(request, "notes", calc_math.resolve_notes, request.get("notes", ()), request["angle_mode"],
+                   transformations)
+    expr = _timed(request, "parse", calc_math.parse_expression, request["expr"], request["angle_mode"],
+                  transformations, names)
+    approx_str = _timed(request, "numeric", _approximate, request, expr, transformations, DEFAULT_DIGITS)
+    expr_srepr = calc_math.sp.srepr(expr)
+    if not request.get("analytical", True):
+        # Previews only want the number
+        return {"expr": expr_srepr, "analytical": None, "approx": approx_str}
+    # "final" marks the last numeric stage; the analytical deadline starts there
+    stages = refinement_stages(request.get("digits", DEFAULT_DIGITS))
+    emit({"stage": "approx", "expr": expr_srepr, "approx": approx_str, "digits": DEFAULT_DIGITS,
+          "final": not stages})
+    for digits in stages:
+        approx_str = _timed(request, "refine", _approximate, request, expr, transformations, digits)
+        emit({"stage": "refine", "expr": expr_srepr, "approx": approx_str, "digits": digits,
+              "final": digits == stages[-1]})
+    analytical_str = _timed(request, "nsimplify", calc_math.find_closed_form, expr)
+    return {"expr": expr_srepr, "analytical": analytical_str, "approx": approx_str}
+
+
+def _handle_latex(request, emit):
+    expr = _timed(request, "parse", calc_math.parse_latex, request["expr"])
+    approx_str = _timed(request, "numeric", calc_math.approximate, expr)
+    return {"expr": calc_math.sp.srepr(expr), "approx": approx_str}
+
+
+def _handle_table(request, emit):
+    transformations = request.get("transformations", DEFAULT_TRANSFORMATIONS)
+    values = calc_math.tabulate(request["expr"], request["angle_mode"], transformations,
+                                request["start"], request["step"], request["count"])
+    return {"values": values}
+
+
+def _handle_sample(request, emit):
+    # One chunk of adaptive samples per requested interval
+    transformations = request.get("transformations", DEFAULT_TRANSFORMATIONS)
+    chunks = [calc_math.adaptive_sample(request["expr"], request["angle_mode"], transformations, start, stop,
+                                        request["tolerance"], request["min_width"], request["y_range"])
+              for start, stop in request["intervals"]]
+    return {"chunks": chunks}
+
+
+def _handle_solve(request, emit):
+    transformations = request.get("transformations", DEFAULT_TRANSFORMATIONS)
+    return calc_math.solve_equations(request["equations"], request["angle_mode"], transformations,
+                                     request["method"], request.get("start"),
+                                     request.get("digits", DEFAULT_DIGITS))
+
+
+def _handle_notes(request, emit):
+    # Display values for the notes in "targets", e.g. after a note they depend on changed
+    transformations = request.get("transformations", DEFAULT_TRANSFORMATIONS)
+    names = calc_math.resolve_notes(request["notes"], request["angle_mode"], transformations)
+    values = {}
+    for name, note_type in request["targets"]:
+        expr = names[name]
+        if note_type == "Approximation":
+            values[name] = calc_math.approximate(expr, request.get("digits", DEFAULT_DIGITS))
+        elif note_type == "Analytical":
+            values[name] = calc_math.find_closed_form(expr)
+        else:
+            values[name] = str(expr)
+    return {"values": values}
+
+
+def _handle_define(request, emit):
+    # Checks a new function definition, the last entry of "notes", before the
+    # GUI saves it
+    transformations = request.get("transformations", DEFAULT_TRANSFORMATIONS)
+    names = calc_math.resolve_notes(request["notes"], request["angle_mode"], transformations)
+    name = request["notes"][-1][0]
+    function = names[name]
+    return {"analytical": "{0}({1}) = {2}".format(name, ", ".join(str(v) for v in function.variables),
+                                                  function.expr),
+            "value": str(function.expr)}
+
+
+def _handle_ping(request, emit):
+    return {"pid": os.getpid()}
+
+
+def _handle_preload(request, emit):
+    # Warms optional parts (e.g. the LaTeX parser) before the first real job needs them
+    if "latex" in request.get("parts", ()):
+        calc_math.get_latex_parser()
+    return {}
+
+
+REQUEST_HANDLERS = {
+    "eval": _handle_eval,
+    "latex": _handle_latex,
+    "table": _handle_table,
+    "sample": _handle_sample,
+    "solve": _handle_solve,
+    "notes": _handle_notes,
+    "define": _handle_define,
+    "ping": _handle_ping,
+    "preload": _handle_preload,
+}
+
+
+def _raise_cpu_limit(signum, frame):
+    raise CPULimitExceeded("CPU time limit exceeded")
+
+
+def _apply_memory_limit(memory_limit_mb):
+    if resource is None or not memory_limit_mb:
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _apply_cpu_limit(cpu_limit):
+    # RLIMIT_CPU counts the whole process lifetime, so move the soft limit
+    # forward by the per-job budget before each job
+    if resource is None or not cpu_limit:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        limit = int(used + cpu_limit) + 1
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def worker_main(conn, memory_limit_mb, cpu_limit):
+    global calc_math
+    import calc_math
+    _apply_memory_limit(memory_limit_mb)
+    if resource is not None and hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+    for angle_mode in ("rad", "deg"):
+        calc_math.get_parse_context(angle_mode)
+    conn.send({"op": "ready", "pid": os.getpid()})
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request.get("op") == "shutdown":
+            break
+        response = {"id": request.get("id")}
+        handler = REQUEST_HANDLERS.get(request.get("op"))
+        job_start = time.perf_counter()
+        if request.get("trace"):
+            request["spans"] = []
+
+        def emit(message, request_id=request.get("id"), spans=request.get("spans")):
+            message = dict(message, id=request_id, status="partial")
+            if spans is not None:
+                # Partials carry the spans so far, so a job that times out
+                # still shows where its time went
+                message["spans"] = [[name, start - job_start, duration] for name, start, duration in spans]
+            conn.send(message)
+
+        _apply_cpu_limit(cpu_limit)
+        capture = ProfileCapture(request["profile"], request.get("op")) if request.get("profile") else None
+        try:
+            if handler is None:
+                raise ValueError("Unknown request: {0}".format(request.get("op")))
+            response.update(handler(request, emit))
+            response["status"] = "ok"
+        except MemoryError:
+            response.update(status="error", error="Memory limit exceeded", recycle=True)
+        except CPULimitExceeded as e:
+            response.update(status="error", error=str(e), recycle=True)
+        except Exception as e:
+            response.update(status="error", error=str(e))
+        if capture is not None:
+            profile_path = capture.finish(response["status"])
+            if profile_path:
+                response["profile"] = profile_path
+        if request.get("spans") is not None:
+            response["spans"] = [[name, start - job_start, duration] for name, start, duration in request["spans"]]
+        try:
+            conn.send(response)
+        except (EOFError, OSError):
+            break
+    conn.close()
+
+
+# ==============================
+# Worker Pool
+# ==============================
+def _default_context():
+    # forkserver keeps a warm parent with sympy imported so replacing a killed
+    # worker is a cheap fork; spawn is the portable fallback (Windows)
+    if "forkserver" in multiprocessing.get_all_start_methods() and not getattr(sys, "frozen", False):
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["__main__", __name__, "calc_math"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb, cpu_limit):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(child_conn, memory_limit_mb, cpu_limit),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if self.ready:
+            return True
+        if self.conn.poll(timeout):
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                return False
+            self.ready = message.get("op") == "ready"
+        return self.ready
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def retire(self):
+        try:
+            self.conn.send({"op": "shutdown"})
+        except (EOFError, OSError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+
+class WorkerPool:
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, size=None, max_jobs=100, memory_limit_mb=2048, cpu_limit=60, ctx=None):
+        self.size = size or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.max_jobs = max_jobs
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_limit = cpu_limit
+        self.ctx = ctx or _default_context()
+        self._idle = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return _Worker(self.ctx, self.memory_limit_mb, self.cpu_limit)
+
+    def _replace(self, worker, retire=False):
+        # Replace in the background so the caller never waits on process teardown
+        def run():
+            if retire:
+                worker.retire()
+            else:
+                worker.kill()
+        threading.Thread(target=run, daemon=True).start()
+        with self._lock:
+            if not self._closed:
+                self._idle.put(self._spawn())
+
+    def _acquire(self, cancel_event):
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            try:
+                return self._idle.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+    def submit(self, request, timeout=None, cancel_event=None, on_partial=None, partial_timeout=None):
+        # Blocking; call from a background thread. Partial messages are passed
+        # to on_partial; after the one marked "final" the job gets at most
+        # partial_timeout more seconds (within the overall timeout) to finish.
+        request = dict(request, id=next(self._ids))
+        worker = self._acquire(cancel_event)
+        if worker is None:
+            return {"id": request["id"], "status": "cancelled"}
+        overall_deadline = deadline = time.monotonic() + timeout if timeout is not None else None
+        response = None
+        try:
+            while not worker.ready:
+                if not worker.wait_ready(self.POLL_INTERVAL):
+                    if not worker.process.is_alive():
+                        response = {"status": "crashed"}
+                        break
+                    if cancel_event is not None and cancel_event.is_set():
+                        response = {"status": "cancelled"}
+                        break
+            if response is None:
+                worker.conn.send(request)
+                worker.jobs += 1
+            while response is None:
+                if worker.conn.poll(self.POLL_INTERVAL):
+                    try:
+                        message = worker.conn.recv()
+                    except (EOFError, OSError):
+                        message = {"status": "crashed"}
+                    if message.get("status") != "partial":
+                        response = message
+                        continue
+                    if on_partial is not None:
+                        on_partial(message)
+                    if partial_timeout is not None and message.get("final"):
+                        partial_deadline = time.monotonic() + partial_timeout
+                        deadline = (partial_deadline if overall_deadline is None
+                                    else min(overall_deadline, partial_deadline))
+                elif cancel_event is not None and cancel_event.is_set():
+                    response = {"status": "cancelled"}
+                elif deadline is not None and time.monotonic() > deadline:
+                    response = {"status": "timeout"}
+                elif not worker.process.is_alive() and not worker.conn.poll():
+                    response = {"status": "crashed"}
+        except (EOFError, OSError):
+            response = {"status": "crashed"}
+        response["id"] = request["id"]
+        if response["status"] in ("ok", "error") and not response.pop("recycle", False):
+            if worker.jobs >= self.max_jobs:
+                self._replace(worker, retire=True)
+            else:
+                self._idle.put(worker)
+        else:
+            self._replace(worker)
+        return response
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.retire()
+
+
+# ==============================
+# Solver Portfolio
+# ==============================
+# A solve request is fanned out to several methods at once, each on its own
+# worker: sympy's solve and solveset for exact answers, and nsolve from a few
+# starting points for equations neither can handle. The first exact answer
+# wins and the remaining jobs are cancelled. Numeric roots only win once every
+# exact method has given up, or NUMERIC_GRACE seconds after the first root
+# arrived; roots from different starting points are merged.
+NSOLVE_STARTS = (1.0, -1.0, 10.0, -10.0)
+NUMERIC_GRACE = 2.0
+
+
+def split_equations(text):
+    return [normalize_expression(part) for part in re.split(r"[;\n]", text) if normalize_expression(part)]
+
+
+def solver_requests(equations, angle_mode, transformations, digits=DEFAULT_DIGITS):
+    base = {"op": "solve", "equations": list(equations), "angle_mode": angle_mode,
+            "transformations": list(transformations), "digits": digits}
+    requests = [dict(base, method="solve"), dict(base, method="solveset")]
+    requests.extend(dict(base, method="nsolve", start=start) for start in NSOLVE_STARTS)
+    return requests
+
+
+def _portfolio_result(responses):
+    # Returns the winning response, or None while it is too early to tell
+    exact = [response for response in responses if response["status"] == "ok" and response["exact"]]
+    if exact:
+        winner = exact[0]
+        return {"status": "ok", "method": winner["method"], "exact": True,
+                "analytical": "; ".join(winner["solutions"]) or "∅",
+                "approx": "; ".join(winner["approximations"]) or "∅"}
+    roots = []
+    for response in responses:
+        if response["status"] == "ok":
+            roots.extend(root for root in response["approximations"] if root not in roots)
+    if roots:
+        return {"status": "ok", "method": "nsolve", "exact": False, "analytical": None, "approx": "; ".join(roots)}
+    return None
+
+
+def _portfolio_failure(responses):
+    # Prefer what solve itself said; it has the most useful error messages
+    for status in ("error", "timeout", "crashed", "cancelled"):
+        for response in sorted(responses, key=lambda r: r["method"] != "solve"):
+            if response["status"] == status:
+                return dict(response)
+    return {"status": "cancelled"}
+
+
+def solve_portfolio(pool, requests, timeout=None, cancel_event=None, numeric_grace=NUMERIC_GRACE):
+    # Blocking, like WorkerPool.submit. Jobs beyond the pool size simply queue.
+    stop = threading.Event()
+    condition = threading.Condition()
+    responses = []
+
+    def run(request):
+        response = pool.submit(request, timeout, stop)
+        response["method"] = request["method"]
+        with condition:
+            responses.append(response)
+            condition.notify_all()
+
+    for request in requests:
+        threading.Thread(target=run, args=(request,), daemon=True).start()
+    first_root = None
+    with condition:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                result = {"status": "cancelled"}
+                break
+            result = _portfolio_result(responses)
+            if result is not None and result["exact"]:
+                break
+            if result is not None:
+                if first_root is None:
+                    first_root = time.monotonic()
+                if len(responses) == len(requests) or time.monotonic() - first_root > numeric_grace:
+                    break
+            elif len(responses) == len(requests):
+                result = _portfolio_failure(responses)
+                break
+            condition.wait(0.05)
+    stop.set()
+    return result
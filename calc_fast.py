@@ -0,0 +1,295 @@
+import ast
+from collections import OrderedDict
+
+from calc_engine import DEFAULT_TRANSFORMATIONS, DEFAULT_DIGITS
+
+# Numeric fast path for plain arithmetic. Expressions are compiled from the
+# Python AST into mpmath closures without touching sympy; anything the
+# compiler doesn't know (symbols, decimals, unknown functions, implicit multiplication,
+# "5!", ...) returns None and the caller falls back to the worker. A result is
+# only trusted when two evaluations at different precisions agree, which
+# catches the cases where sympy would have found an exact value (sin(pi) -> 0)
+# or a pole (tan(pi/2) -> zoo).
+#
+# Function notes (f(a,b) := body) are compiled the same way, once per
+# definition, into callables whose parameters are slots in a frame, so
+# f(1, 2) costs a call and never goes through sympy's parser.
+
+mpmath = None  # imported on first use; keeps it off the startup path
+
+# Extra bits for the two check evaluations, on top of what `digits` needs
+CHECK_GUARD_BITS = (40, 104)
+AGREEMENT_GUARD_BITS = 10
+MAX_COMPILED = 512
+MAX_FUNCTIONS = 256
+
+
+class FastPathUnsupported(Exception):
+    pass
+
+
+def _load_mpmath():
+    global mpmath
+    if mpmath is None:
+        import mpmath as module
+        mpmath = module
+    return mpmath
+
+
+# Names resolve the way ParseContext resolves them: local_dict first, then the
+# sympy namespace
+def _radians(x):
+    # fmod is exact, so sin(10**10) in degrees loses nothing to the product
+    # with pi the way x * pi / 180 would
+    return mpmath.fmod(x, 360) * mpmath.pi / 180
+
+
+def _sin_deg(x):
+    return mpmath.sin(_radians(x))
+
+
+def _cos_deg(x):
+    return mpmath.cos(_radians(x))
+
+
+def _tan_deg(x):
+    return mpmath.tan(_radians(x))
+
+
+def _log(x, base=None):
+    return mpmath.log(x) if base is None else mpmath.log(x) / mpmath.log(base)
+
+
+def _functions(angle_mode):
+    if angle_mode == 'deg':
+        trig = {"sin": _sin_deg, "cos": _cos_deg, "tan": _tan_deg}
+    else:
+        trig = {"sin": lambda x: mpmath.sin(x), "cos": lambda x: mpmath.cos(x), "tan": lambda x: mpmath.tan(x)}
+    functions = {
+        "asin": lambda x: mpmath.asin(x), "acos": lambda x: mpmath.acos(x), "atan": lambda x: mpmath.atan(x),
+        "sinh": lambda x: mpmath.sinh(x), "cosh": lambda x: mpmath.cosh(x), "tanh": lambda x: mpmath.tanh(x),
+        "sqrt": lambda x: mpmath.sqrt(x), "exp": lambda x: mpmath.exp(x),
+        "ln": _log, "log": _log,
+        "Abs": lambda x: abs(x), "abs": lambda x: abs(x),
+        "max": lambda *args: max(args), "Max": lambda *args: max(args),
+        "min": lambda *args: min(args), "Min": lambda *args: min(args),
+    }
+    functions.update(trig)
+    return functions
+
+
+_ARITY = {"log": (1, 2), "ln": (1, 2), "max": (1, None), "Max": (1, None), "min": (1, None), "Min": (1, None)}
+
+_CONSTANTS = {
+    "pi": lambda: +mpmath.pi,
+    "e": lambda: +mpmath.e,
+    "E": lambda: +mpmath.e,
+}
+
+_BINARY = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.Pow: lambda a, b: a ** b,
+}
+
+
+class _Frame:
+    __slots__ = ("args",)
+
+    def __init__(self):
+        self.args = ()
+
+
+class _Compiler:
+    # user_functions: compiled function notes by name. shadowed: every note
+    # name, since a note hides the built-in of the same name. params: slot
+    # index of each parameter in `frame`, when compiling a function body.
+    def __init__(self, angle_mode, transformations, user_functions=None, shadowed=(), params=None, frame=None):
+        self.functions = _functions(angle_mode)
+        self.xor_is_pow = "convert_xor" in transformations
+        self.user_functions = user_functions or {}
+        self.shadowed = shadowed
+        self.params = params or {}
+        self.frame = frame
+
+    def compile(self, node):
+        method = getattr(self, "visit_" + type(node).__name__, None)
+        if method is None:
+            raise FastPathUnsupported(type(node).__name__)
+        return method(node)
+
+    def visit_Expression(self, node):
+        return self.compile(node.body)
+
+    def visit_Constant(self, node):
+        value = node.value
+        # Float literals are left to sympy: a Float carries 15 digits and
+        # everything it touches is evaluated eagerly at that precision, which
+        # the closures here would have to reproduce digit for digit
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise FastPathUnsupported(repr(value))
+        return lambda: mpmath.mpf(value)
+
+    def visit_Name(self, node):
+        slot = self.params.get(node.id)
+        if slot is not None:
+            frame = self.frame
+            return lambda: frame.args[slot]
+        if node.id in self.shadowed:
+            raise FastPathUnsupported(node.id)
+        constant = _CONSTANTS.get(node.id)
+        if constant is None:
+            raise FastPathUnsupported(node.id)
+        return constant
+
+    def visit_UnaryOp(self, node):
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.USub):
+            return lambda: -operand()
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        raise FastPathUnsupported(type(node.op).__name__)
+
+    def visit_BinOp(self, node):
+        op_type = type(node.op)
+        if op_type is ast.BitXor and self.xor_is_pow:
+            op_type = ast.Pow
+        op = _BINARY.get(op_type)
+        if op is None:
+            raise FastPathUnsupported(op_type.__name__)
+        left, right = self.compile(node.left), self.compile(node.right)
+        return lambda: op(left(), right())
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise FastPathUnsupported("call")
+        name = node.func.id
+        user_function = self.user_functions.get(name)
+        if user_function is not None:
+            if len(node.args) != user_function.arity:
+                raise FastPathUnsupported(name)
+            args = [self.compile(arg) for arg in node.args]
+            return lambda: user_function(*[arg() for arg in args])
+        function = None if name in self.shadowed or name in self.params else self.functions.get(name)
+        if function is None:
+            raise FastPathUnsupported(name)
+        low, high = _ARITY.get(name, (1, 1))
+        if len(node.args) < low or (high is not None and len(node.args) > high):
+            raise FastPathUnsupported(name)
+        args = [self.compile(arg) for arg in node.args]
+        if len(args) == 1:
+            arg = args[0]
+            return lambda: function(arg())
+        return lambda: function(*[arg() for arg in args])
+
+
+_COMPILED = OrderedDict()
+_FUNCTIONS = OrderedDict()
+
+
+def _compile_function(params, body, angle_mode, transformations, user_functions, shadowed):
+    frame = _Frame()
+    slots = {param: index for index, param in enumerate(params)}
+    code = _Compiler(angle_mode, transformations, user_functions, shadowed, slots, frame).compile(
+        ast.parse(body, mode="eval"))
+
+    def call(*args):
+        saved = frame.args
+        frame.args = args
+        try:
+            return code()
+        finally:
+            frame.args = saved
+
+    call.arity = len(params)
+    return call
+
+
+def _user_functions(notes, angle_mode, transformations):
+    # Compiled function notes by name, built lazily and memoized per
+    # definition (and the definitions of the functions it calls). A function
+    # whose body the fast path can't handle is simply left out, so calls to
+    # it make the whole expression unsupported.
+    user_functions = {}
+    shadowed = frozenset(entry[0] for entry in notes)
+    keys = {}
+    for name, definitions, dependencies, params in notes:
+        if params is None or not definitions:
+            continue
+        key = (name, tuple(params), definitions[0], angle_mode, "convert_xor" in transformations,
+               tuple(keys.get(dependency) for dependency in dependencies), shadowed)
+        keys[name] = key
+        if key in _FUNCTIONS:
+            _FUNCTIONS.move_to_end(key)
+            function = _FUNCTIONS[key]
+        else:
+            try:
+                function = _compile_function(params, definitions[0], angle_mode, transformations,
+                                             user_functions, shadowed)
+            except (SyntaxError, ValueError, RecursionError, FastPathUnsupported):
+                function = None
+            _FUNCTIONS[key] = function
+            if len(_FUNCTIONS) > MAX_FUNCTIONS:
+                _FUNCTIONS.popitem(last=False)
+        if function is not None:
+            user_functions[name] = function
+    return user_functions, shadowed
+
+
+def compile_fast(expr_str, angle_mode, transformations=DEFAULT_TRANSFORMATIONS, notes=None):
+    # Returns a zero-argument closure evaluating at the current mpmath
+    # precision, or None. Results (including None) are memoized. notes is
+    # the NoteScope.closure the expression was resolved against.
+    key = (expr_str, angle_mode, "convert_xor" in transformations, repr(notes) if notes else None)
+    if key in _COMPILED:
+        _COMPILED.move_to_end(key)
+        return _COMPILED[key]
+    try:
+        tree = ast.parse(expr_str, mode="eval")
+        user_functions, shadowed = _user_functions(notes or (), angle_mode, transformations)
+        function = _Compiler(angle_mode, transformations, user_functions, shadowed).compile(tree)
+    except (SyntaxError, ValueError, RecursionError, FastPathUnsupported):
+        function = None
+    _COMPILED[key] = function
+    if len(_COMPILED) > MAX_COMPILED:
+        _COMPILED.popitem(last=False)
+    return function
+
+
+def _evaluate_at(function, bits):
+    with mpmath.workprec(bits):
+        value = function()
+    if not isinstance(value, mpmath.mpf) or not mpmath.isfinite(value):
+        raise FastPathUnsupported("non-real result")
+    return value
+
+
+def fast_approximate(expr_str, angle_mode, transformations=DEFAULT_TRANSFORMATIONS, digits=DEFAULT_DIGITS,
+                     notes=None):
+    # Formatted like str(sp.N(expr, digits)), or None when sympy is needed.
+    # The compiled closure and mpmath's constant cache carry over between
+    # calls, so refining the same expression to more digits starts warm.
+    function = compile_fast(expr_str, angle_mode, transformations, notes)
+    if function is None:
+        return None
+    _load_mpmath()
+    bits = mpmath.libmp.dps_to_prec(digits)
+    try:
+        low, high = (_evaluate_at(function, bits + guard) for guard in CHECK_GUARD_BITS)
+    except (FastPathUnsupported, ZeroDivisionError, ValueError, OverflowError, TypeError):
+        return None
+    if not high:
+        return "0" if not low else None
+    if abs(low - high) > abs(high) * mpmath.ldexp(1, -(bits + AGREEMENT_GUARD_BITS)):
+        return None
+    # Rounded the way str(sp.N(...)) rounds: to a `bits`-bit float first, then
+    # to that float's decimal precision
+    value = mpmath.libmp.mpf_pos(high._mpf_, bits, mpmath.libmp.round_nearest)
+    text = mpmath.libmp.to_str(value, mpmath.libmp.prec_to_dps(bits), strip_zeros=False)
+    if text.startswith("-.0"):
+        return "-0." + text[3:]
+    if text.startswith(".0"):
+        return "0." + text[2:]
+    return text
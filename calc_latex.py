@@ -0,0 +1,355 @@
+import re
+from collections import OrderedDict
+
+import sympy as sp
+
+# Hand-written recursive-descent parser for the LaTeX most people type into a
+# calculator: numbers, single-letter and Greek symbols, + - * / \cdot \times
+# \div, implicit multiplication, ^, !, |x|, \frac, \sqrt, \left( \right),
+# trig/log functions (with \sin^2 x and \sin^{-1} x) and \sum / \prod.
+# Anything outside that subset raises LatexUnsupported and the caller falls
+# back to sympy's ANTLR parser. Precedence follows sympy's LaTeX grammar.
+
+
+class LatexUnsupported(Exception):
+    pass
+
+
+# Numbers are whole tokens, as in sympy's lexer, so 2^10 reads the same as
+# there; \frac12 splits a number back into TeX's single digits
+_TOKEN_RE = re.compile(r"\\[a-zA-Z]+|\\[,;:! ]|\d+(?:\.\d*)?|\.\d+|\S")
+
+_SPACING = {"\\,", "\\;", "\\:", "\\!", "\\ ", "\\quad", "\\qquad", "\\displaystyle", "\\textstyle"}
+
+_CONSTANTS = {
+    "\\pi": sp.pi,
+    "\\infty": sp.oo,
+    "e": sp.E,
+}
+
+_GREEK = {
+    "\\alpha", "\\beta", "\\gamma", "\\delta", "\\epsilon", "\\zeta", "\\eta", "\\theta", "\\iota",
+    "\\kappa", "\\lambda", "\\mu", "\\nu", "\\xi", "\\rho", "\\sigma", "\\tau", "\\upsilon", "\\phi",
+    "\\chi", "\\psi", "\\omega",
+}
+
+_FUNCTIONS = {
+    "\\sin": sp.sin, "\\cos": sp.cos, "\\tan": sp.tan,
+    "\\sec": sp.sec, "\\csc": sp.csc, "\\cot": sp.cot,
+    "\\arcsin": sp.asin, "\\arccos": sp.acos, "\\arctan": sp.atan,
+    "\\sinh": sp.sinh, "\\cosh": sp.cosh, "\\tanh": sp.tanh,
+    "\\exp": sp.exp, "\\ln": sp.log, "\\log": sp.log,
+}
+
+# \sin^{-1} x means the inverse function, as in sympy's parser
+_INVERSES = {
+    "\\sin": sp.asin, "\\cos": sp.acos, "\\tan": sp.atan,
+    "\\sec": sp.asec, "\\csc": sp.acsc, "\\cot": sp.acot,
+    "\\sinh": sp.asinh, "\\cosh": sp.acosh, "\\tanh": sp.atanh,
+}
+
+_MULTIPLY = {"*", "\\cdot", "\\times"}
+_DIVIDE = {"/", "\\div"}
+_FRACTIONS = {"\\frac", "\\dfrac", "\\tfrac"}
+_BIG_OPERATORS = {"\\sum": sp.Sum, "\\prod": sp.Product}
+_OPENERS = {"(": ")", "[": "]"}
+_DIFFERENTIALS = {"d", "\\partial"}
+
+MAX_GROUP_CACHE = 4096
+
+# Brace groups are parsed once per distinct source text, so formulas built
+# from repeated blocks (the same \frac{..}{..} over and over, or an edited
+# formula where most groups are unchanged) skip straight to the result
+_GROUP_CACHE = OrderedDict()
+
+
+def _is_number(token):
+    return token is not None and (token[0].isdigit() or (token[0] == "." and len(token) > 1))
+
+
+def tokenize(latex_str):
+    return [token for token in _TOKEN_RE.findall(latex_str) if token not in _SPACING]
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise LatexUnsupported("unexpected end of input")
+        self.pos += 1
+        return token
+
+    def expect(self, token):
+        if self.next() != token:
+            raise LatexUnsupported("expected " + token)
+
+    def parse(self):
+        expr = self.expression()
+        if self.peek() is not None:
+            raise LatexUnsupported("unexpected " + self.peek())
+        return expr
+
+    # Sums and products are collected and built in one Add/Mul call; adding
+    # terms one at a time re-flattens the whole sum each time
+    def expression(self):
+        terms = [self.term()]
+        while self.peek() in ("+", "-"):
+            if self.next() == "+":
+                terms.append(self.term())
+            else:
+                terms.append(-self.term())
+        return terms[0] if len(terms) == 1 else sp.Add(*terms)
+
+    def starts_factor(self, token, functions=True):
+        if token is None:
+            return False
+        if token in _FUNCTIONS or token in _BIG_OPERATORS:
+            return functions
+        return (token.isalpha() or _is_number(token) or token in ("{", "(", "\\left") or token in _CONSTANTS
+                or token in _GREEK or token in _FRACTIONS or token == "\\sqrt")
+
+    def term(self, functions=True):
+        # Implicit products bind tighter than an explicit division, as in
+        # sympy's grammar: a/b c is a/(b c)
+        factors = [self.implicit_product(functions)]
+        while True:
+            token = self.peek()
+            if token in _MULTIPLY:
+                self.next()
+                factors.append(self.implicit_product(functions))
+            elif token in _DIVIDE:
+                self.next()
+                factors.append(sp.Pow(self.implicit_product(functions), -1))
+            else:
+                return factors[0] if len(factors) == 1 else sp.Mul(*factors)
+
+    def implicit_product(self, functions=True):
+        factors = [self.signed()]
+        while self.starts_factor(self.peek(), functions):
+            factors.append(self.postfix())
+        return factors[0] if len(factors) == 1 else sp.Mul(*factors)
+
+    def signed(self):
+        token = self.peek()
+        if token == "-":
+            self.next()
+            return -self.signed()
+        if token == "+":
+            self.next()
+            return self.signed()
+        return self.postfix()
+
+    def postfix(self):
+        expr = self.primary()
+        while True:
+            token = self.peek()
+            if token == "^":
+                self.next()
+                expr = expr ** self.script()
+            elif token == "!":
+                self.next()
+                if self.peek() == "^":
+                    # sympy's grammar reads x!^2 as x!, so leave it to sympy
+                    # rather than answer differently
+                    raise LatexUnsupported("power of a factorial")
+                expr = sp.factorial(expr)
+            else:
+                return expr
+
+    def argument(self):
+        # What a command takes: a brace group or a single token (\frac12)
+        token = self.peek()
+        if token == "{":
+            return self.group()
+        if _is_number(token):
+            return self.digit()
+        if token is not None and (token.isalpha() or token in _CONSTANTS or token in _GREEK):
+            return self.primary()
+        raise LatexUnsupported("argument")
+
+    def digit(self):
+        token = self.peek()
+        if not token[0].isdigit():
+            raise LatexUnsupported("argument")
+        if len(token) > 1:
+            # Leave the rest of the number for whatever comes next
+            self.tokens[self.pos] = token[1:]
+        else:
+            self.pos += 1
+        return sp.Integer(token[0])
+
+    def script(self):
+        # Unbraced ^ and _ take the whole number, as in sympy's grammar: 2^10
+        # is 2**10, not TeX's 2^1 0
+        if _is_number(self.peek()):
+            return self.number()
+        return self.argument()
+
+    def group(self):
+        start = self.pos
+        self.expect("{")
+        depth = 1
+        end = start + 1
+        while depth:
+            token = self.tokens[end] if end < len(self.tokens) else None
+            if token is None:
+                raise LatexUnsupported("unbalanced braces")
+            depth += {"{": 1, "}": -1}.get(token, 0)
+            end += 1
+        key = " ".join(self.tokens[start:end])
+        cached = _GROUP_CACHE.get(key)
+        if cached is not None:
+            _GROUP_CACHE.move_to_end(key)
+            self.pos = end
+            return cached
+        inner = _Parser(self.tokens[start + 1:end - 1])
+        expr = inner.parse()
+        self.pos = end
+        _GROUP_CACHE[key] = expr
+        if len(_GROUP_CACHE) > MAX_GROUP_CACHE:
+            _GROUP_CACHE.popitem(last=False)
+        return expr
+
+    def delimited(self, closer):
+        expr = self.expression()
+        if self.peek() == "\\right":
+            self.next()
+        self.expect(closer)
+        return expr
+
+    def number(self):
+        text = self.next()
+        if _is_number(self.peek()):
+            # sympy joins numbers across spaces in ways that depend on where
+            # they stand (2 3 is 23); leave those to it
+            raise LatexUnsupported("spaced digits")
+        return sp.Float(text) if "." in text else sp.Integer(text)
+
+    def primary(self):
+        token = self.peek()
+        if token is None:
+            raise LatexUnsupported("unexpected end of input")
+        if _is_number(token):
+            return self.number()
+        if token in _CONSTANTS:
+            self.next()
+            return _CONSTANTS[token]
+        if token in _GREEK:
+            self.next()
+            return sp.Symbol(token[1:])
+        if token.isalpha() and len(token) == 1:
+            self.next()
+            if self.peek() == "_":
+                raise LatexUnsupported("subscripted symbol")
+            return sp.Symbol(token)
+        if token == "{":
+            return self.group()
+        if token in _OPENERS:
+            self.next()
+            return self.delimited(_OPENERS[token])
+        if token == "|":
+            self.next()
+            return sp.Abs(self.delimited("|"))
+        if token == "\\left":
+            self.next()
+            opener = self.next()
+            if opener == "|":
+                return sp.Abs(self.delimited("|"))
+            if opener not in _OPENERS:
+                raise LatexUnsupported("delimiter " + opener)
+            return self.delimited(_OPENERS[opener])
+        if token in _FRACTIONS:
+            self.next()
+            if self.leibniz():
+                # \frac{dy}{dx} is a derivative, not y/x; sympy's grammar knows it
+                raise LatexUnsupported("derivative")
+            numerator = self.argument()
+            return numerator / self.argument()
+        if token == "\\sqrt":
+            self.next()
+            if self.peek() == "[":
+                self.next()
+                index = self.delimited("]")
+                return sp.root(self.argument(), index)
+            if _is_number(self.peek()) and len(self.peek()) > 1:
+                # TeX reads \sqrt12 as sqrt(1)*2; too easy to misread either way
+                raise LatexUnsupported("unbraced root of a number")
+            return sp.sqrt(self.argument())
+        if token in _FUNCTIONS:
+            return self.function()
+        if token in _BIG_OPERATORS:
+            return self.big_operator()
+        raise LatexUnsupported(token)
+
+    def leibniz(self):
+        # Both arguments of the \frac ahead start with d or \partial
+        offset = 0
+        if self.peek() == "{":
+            depth = 0
+            while True:
+                token = self.peek(offset)
+                if token is None:
+                    return False
+                depth += {"{": 1, "}": -1}.get(token, 0)
+                if depth == 0:
+                    break
+                offset += 1
+            numerator = self.peek(1)
+        else:
+            numerator = self.peek()
+        offset += 1
+        denominator = self.peek(offset + 1) if self.peek(offset) == "{" else self.peek(offset)
+        return numerator in _DIFFERENTIALS and denominator in _DIFFERENTIALS
+
+    def function(self):
+        name = self.next()
+        function = _FUNCTIONS[name]
+        base = None
+        power = None
+        if name == "\\log" and self.peek() == "_":
+            self.next()
+            base = self.script()
+        if self.peek() == "^":
+            self.next()
+            power = self.script()
+        if power == -1 and name in _INVERSES:
+            function, power = _INVERSES[name], None
+        token = self.peek()
+        if token in _OPENERS or token == "\\left":
+            arg = self.primary()
+        else:
+            # Like sympy's func_arg_noparens: a product that stops before the
+            # next function, so \sin 2x is sin(2x) and \sin x \cos x is sin(x) cos(x)
+            arg = self.term(functions=False)
+        expr = function(arg) if base is None else sp.log(arg, base)
+        return expr if power is None else expr ** power
+
+    def big_operator(self):
+        operator = _BIG_OPERATORS[self.next()]
+        self.expect("_")
+        self.expect("{")
+        variable = self.next()
+        if not (variable.isalpha() and len(variable) == 1):
+            raise LatexUnsupported("index variable")
+        self.expect("=")
+        lower = self.expression()
+        self.expect("}")
+        self.expect("^")
+        upper = self.script()
+        body = self.implicit_product()
+        return operator(body, (sp.Symbol(variable), lower, upper))
+
+
+def parse_latex_fast(latex_str):
+    # Built unevaluated like sympy's own parser; evaluating every node while a
+    # long formula is assembled costs far more than the parse itself
+    with sp.evaluate(False):
+        return _Parser(tokenize(latex_str)).parse()
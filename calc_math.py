@@ -0,0 +1,720 @@
+import math
+import types
+import builtins
+from collections import OrderedDict
+
+import mpmath
+import sympy as sp
+from sympy.parsing.sympy_parser import (
+    parse_expr, lambda_notation, auto_symbol, repeated_decimals, auto_number,
+    factorial_notation, convert_xor, implicit_multiplication
+)
+
+from calc_engine import DEFAULT_TRANSFORMATIONS, DEFAULT_DIGITS, TABLE_VARIABLE, MAX_TABLE_POINTS
+from calc_fast import fast_approximate
+from calc_latex import parse_latex_fast, LatexUnsupported
+
+# Everything that needs sympy lives here. Only worker processes (and the
+# forkserver that forks them) import this module, so the GUI never pays for it.
+
+
+# ==============================
+# LaTeX Parsing
+# ==============================
+_LATEX_PARSER = None
+_LATEX_CACHE = OrderedDict()
+MAX_LATEX_CACHE = 256
+
+# sympy's parser reads \pi and e as plain symbols; the fast parser and the
+# Standard tab both mean the constants
+_LATEX_CONSTANTS = {sp.Symbol("pi"): sp.pi, sp.Symbol("e"): sp.E}
+
+
+def get_latex_parser():
+    # sympy.parsing.latex pulls in the ANTLR runtime; load it on the first LaTeX
+    # job. Its lexer/parser tables are class-level, so they stay warm afterwards.
+    global _LATEX_PARSER
+    if _LATEX_PARSER is None:
+        try:
+            from sympy.parsing.latex import parse_latex
+        except ImportError:
+            def parse_latex(latex_str):
+                raise NotImplementedError("Install antlr4-python3-runtime for LaTeX parsing.")
+        _LATEX_PARSER = parse_latex
+    return _LATEX_PARSER
+
+
+def parse_latex(latex_str):
+    expr = _LATEX_CACHE.get(latex_str)
+    if expr is not None:
+        _LATEX_CACHE.move_to_end(latex_str)
+        return expr
+    try:
+        expr = parse_latex_fast(latex_str)
+    except LatexUnsupported:
+        expr = get_latex_parser()(latex_str).xreplace(_LATEX_CONSTANTS)
+    _LATEX_CACHE[latex_str] = expr
+    if len(_LATEX_CACHE) > MAX_LATEX_CACHE:
+        _LATEX_CACHE.popitem(last=False)
+    return expr
+
+
+# ==============================
+# Parse Contexts
+# ==============================
+class DegreeSin(sp.Function):
+    @classmethod
+    def eval(cls, x):
+        return sp.sin(x * sp.pi / 180)
+
+
+class DegreeCos(sp.Function):
+    @classmethod
+    def eval(cls, x):
+        return sp.cos(x * sp.pi / 180)
+
+
+class DegreeTan(sp.Function):
+    @classmethod
+    def eval(cls, x):
+        return sp.tan(x * sp.pi / 180)
+
+
+# Optional transformations in the order parse_expr has to apply them
+TRANSFORMATION_OPTIONS = (
+    ("factorial_notation", factorial_notation),
+    ("convert_xor", convert_xor),
+    ("implicit_multiplication", implicit_multiplication),
+)
+_BASE_TRANSFORMATIONS = (lambda_notation, auto_symbol, repeated_decimals, auto_number)
+
+
+class ParseContext:
+    # Everything parse_expr would otherwise rebuild on every call: the local
+    # names, the "from sympy import *" global namespace and the transformations
+    def __init__(self, angle_mode, transformations=DEFAULT_TRANSFORMATIONS):
+        if angle_mode == 'deg':
+            trig_sin, trig_cos, trig_tan = DegreeSin, DegreeCos, DegreeTan
+        else:
+            trig_sin, trig_cos, trig_tan = sp.sin, sp.cos, sp.tan
+        self.local_dict = {
+            "asin": sp.asin, "acos": sp.acos, "atan": sp.atan, "ln": sp.log,
+            "sin": trig_sin, "cos": trig_cos, "tan": trig_tan,
+            "pi": sp.pi, "e": sp.E
+        }
+        self.global_dict = {}
+        exec("from sympy import *", self.global_dict)
+        for name, obj in vars(builtins).items():
+            if isinstance(obj, types.BuiltinFunctionType):
+                self.global_dict[name] = obj
+        self.global_dict["max"] = sp.Max
+        self.global_dict["min"] = sp.Min
+        self.transformations = _BASE_TRANSFORMATIONS + tuple(
+            transformation for name, transformation in TRANSFORMATION_OPTIONS if name in transformations)
+
+    def parse(self, expr_str, names=None):
+        # local_dict is copied because parse_expr evaluates into it; `names`
+        # (note values) go on top and shadow everything else
+        local_dict = dict(self.local_dict)
+        if names:
+            local_dict.update(names)
+        return parse_expr(expr_str, local_dict=local_dict, global_dict=self.global_dict,
+                          transformations=self.transformations, evaluate=True)
+
+
+_PARSE_CONTEXTS = {}
+
+
+def get_parse_context(angle_mode, transformations=DEFAULT_TRANSFORMATIONS):
+    key = (angle_mode, frozenset(transformations))
+    context = _PARSE_CONTEXTS.get(key)
+    if context is None:
+        context = _PARSE_CONTEXTS[key] = ParseContext(angle_mode, transformations)
+    return context
+
+
+def parse_expression(expr_str, angle_mode, transformations=DEFAULT_TRANSFORMATIONS, names=None):
+    # expr_str is expected to be normalized and mapping-applied already
+    return get_parse_context(angle_mode, transformations).parse(expr_str, names)
+
+
+# ==============================
+# Notes
+# ==============================
+# Parsed note values, keyed by everything they were built from: the note's
+# definitions and, recursively, the keys of the notes it uses. An edited note
+# gets a new key, and so does everything downstream of it; the rest hit.
+_NOTE_VALUES = OrderedDict()
+MAX_NOTE_VALUES = 1024
+
+
+def _parse_note(name, definitions, names, angle_mode, transformations):
+    error = None
+    for definition in definitions:
+        try:
+            return parse_expression(definition, angle_mode, transformations, names)
+        except Exception as e:
+            error = e
+    raise ValueError("Note '{0}' is not an expression: {1}".format(name, error))
+
+
+def _parse_function(name, definitions, params, names, angle_mode, transformations):
+    # Parameters shadow notes of the same name. The result is a Lambda, which
+    # parse_expr calls like any sympy function: f(1, 2) substitutes into the
+    # body parsed here instead of parsing it again.
+    variables = tuple(sp.Symbol(param) for param in params)
+    scope = dict(names)
+    scope.update(zip(params, variables))
+    return sp.Lambda(variables, _parse_note(name, definitions, scope, angle_mode, transformations))
+
+
+def resolve_notes(notes, angle_mode, transformations=DEFAULT_TRANSFORMATIONS):
+    # notes: [name, definitions, dependencies, params] entries, dependencies
+    # first (NoteScope.closure). Returns {name: sympy value or Lambda}.
+    values = {}
+    keys = {}
+    for name, definitions, dependencies, params in notes:
+        key = (name, tuple(definitions), tuple(params) if params is not None else None,
+               tuple(keys[dependency] for dependency in dependencies), angle_mode, frozenset(transformations))
+        value = _NOTE_VALUES.get(key)
+        if value is None:
+            # RESERVED_NAMES keeps the common ones out of the GUI; this catches
+            # the rest of the namespace before a note can shadow it
+            context = get_parse_context(angle_mode, transformations)
+            if name in context.local_dict or name in context.global_dict:
+                raise ValueError("'{0}' is a built-in name and cannot name a note".format(name))
+            scope = {dependency: values[dependency] for dependency in dependencies}
+            if params is None:
+                value = _parse_note(name, definitions, scope, angle_mode, transformations)
+            else:
+                value = _parse_function(name, definitions, params, scope, angle_mode, transformations)
+            _NOTE_VALUES[key] = value
+            if len(_NOTE_VALUES) > MAX_NOTE_VALUES:
+                _NOTE_VALUES.popitem(last=False)
+        else:
+            _NOTE_VALUES.move_to_end(key)
+        values[name] = value
+        keys[name] = key
+    return values
+
+
+# ==============================
+# Shared Subexpressions
+# ==============================
+# Numeric values and closed forms are kept per sympy subtree for the life of
+# the worker. Expressions hash and compare structurally, so the same sub-term
+# reached from different inputs (sqrt(2)*pi/7 in consecutive entries) is the
+# same key. Both caches are bounded by an estimate of the memory they hold
+# rather than by entry count.
+CSE_MIN_NODES = 40
+# The CSE result is computed at two precisions above the target; if they
+# disagree the sub-terms cancelled too much and plain sp.N is used instead
+CSE_GUARD_DIGITS = (10, 20)
+NODE_BYTES = 200
+MAX_NUMERIC_BYTES = 16 * 1024 * 1024
+MAX_CLOSED_FORM_BYTES = 16 * 1024 * 1024
+# nsimplify's working precision
+CLOSED_FORM_DIGITS = 30
+
+
+def tree_size(expr):
+    return sum(1 for _ in sp.preorder_traversal(expr))
+
+
+class SubtreeCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    def get(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        self.entries.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+_NUMERIC = SubtreeCache(MAX_NUMERIC_BYTES)
+_CLOSED_FORMS = SubtreeCache(MAX_CLOSED_FORM_BYTES)
+
+
+def _numeric(expr, digits, size):
+    key = (expr, digits)
+    value = _NUMERIC.get(key)
+    if value is None:
+        value = sp.N(expr, digits)
+        _NUMERIC.put(key, value, size * NODE_BYTES + digits)
+    return value
+
+
+def _approximate_cse(expr, digits):
+    # Each repeated sub-term is evaluated once (and only once per session,
+    # through _NUMERIC), then the reduced expression is evaluated over the
+    # values. Returns None when that can't be trusted.
+    # Unevaluated, cse and the rebuilds below only re-wrap existing args;
+    # evaluating every rebuilt node costs more than the sp.N it saves
+    with sp.evaluate(False):
+        replacements, reduced = sp.cse(expr, order="none")
+        if not replacements:
+            return None
+        originals = {}
+        subterms = []
+        for symbol, sub in replacements:
+            # The sub-term as it appears in the input, so the cache key is the
+            # same whichever expression it came from
+            originals[symbol] = sub.xreplace(originals)
+            subterms.append((symbol, originals[symbol], tree_size(sub)))
+    results = []
+    for guard in CSE_GUARD_DIGITS:
+        values = {symbol: _numeric(original, digits + guard, size) for symbol, original, size in subterms}
+        result = reduced[0].evalf(digits + guard, subs=values)
+        if not result.is_Float:
+            return None
+        results.append(result)
+    low, high = results
+    if not high or abs(low - high) > abs(high) * sp.Float(10) ** -(digits + 1):
+        return None
+    return sp.N(high, digits)
+
+
+# ==============================
+# Evaluation
+# ==============================
+def approximate(expr, digits=DEFAULT_DIGITS):
+    # evalf keeps mpmath's cached constants (pi, e, log 2, ...) between
+    # calls, so each refinement stage only pays for the extra digits
+    key = (expr, digits)
+    value = _NUMERIC.get(key)
+    if value is None:
+        size = tree_size(expr)
+        if size >= CSE_MIN_NODES and not expr.free_symbols:
+            value = _approximate_cse(expr, digits)
+        if value is None:
+            value = sp.N(expr, digits)
+        _NUMERIC.put(key, value, size * NODE_BYTES + digits)
+    return str(value)
+
+
+def _agrees(expr, form, size):
+    # Equal to the digits nsimplify works at, so the form can stand in for
+    # the sub-term without changing the value nsimplify sees
+    value = _numeric(expr, CLOSED_FORM_DIGITS, size)
+    error = sp.Abs(value - sp.N(form, CLOSED_FORM_DIGITS))
+    try:
+        return bool(error <= sp.Max(1, sp.Abs(value)) * sp.Float(10) ** (2 - CLOSED_FORM_DIGITS))
+    except TypeError:
+        return False
+
+
+def find_closed_form(expr):
+    # Sub-terms that were identified before (as whole inputs) are replaced by
+    # their closed forms first, so nsimplify starts from what it already
+    # found. That may only change how fast the answer comes, never the answer:
+    # a form is reused only if it agrees with its sub-term to nsimplify's
+    # precision and the sub-term has no Float (Floats set nsimplify's
+    # tolerance), and the result only counts if nsimplify identified the
+    # value. When it can't, it hands back the input rewritten, which depends
+    # on how the input was written, so the original goes through instead.
+    cached = _CLOSED_FORMS.get(expr)
+    if cached is not None:
+        return str(cached[0])
+    known = {}
+    walk = sp.preorder_traversal(expr)
+    for sub in walk:
+        if sub is expr or sub.is_Atom:
+            continue
+        cached = _CLOSED_FORMS.get(sub)
+        if cached is not None and cached[1]:
+            known[sub] = cached[0]
+            walk.skip()
+    form = None
+    if known:
+        substituted = expr.xreplace(known)
+        form = sp.nsimplify(substituted, [sp.pi, sp.E], rational=False)
+        if form == substituted:
+            form = None
+    if form is None:
+        form = sp.nsimplify(expr, [sp.pi, sp.E])
+    size = tree_size(expr)
+    reusable = not expr.has(sp.Float) and _agrees(expr, form, size)
+    _CLOSED_FORMS.put(expr, (form, reusable), (size + tree_size(form)) * NODE_BYTES)
+    return str(form)
+
+
+def evaluate_expression(expr_str, angle_mode, transformations=DEFAULT_TRANSFORMATIONS):
+    expr = parse_expression(expr_str, angle_mode, transformations)
+    return expr, find_closed_form(expr), approximate(expr)
+
+
+def evaluate_latex(latex_str):
+    expr = parse_latex(latex_str)
+    return expr, str(sp.N(expr))
+
+
+# ==============================
+# Tables
+# ==============================
+_TABLE_KERNELS = OrderedDict()
+MAX_TABLE_KERNELS = 64
+# The mpmath fallback costs about 20 us a point
+MAX_FALLBACK_POINTS = 200000
+
+
+def _gamma_point(value):
+    try:
+        if isinstance(value, complex):
+            return complex(mpmath.gamma(value))
+        return math.gamma(value)
+    except OverflowError:
+        return math.inf
+    except (ValueError, ZeroDivisionError):
+        # Poles, where sympy gives zoo
+        return math.nan
+
+
+def _gamma(values):
+    import numpy as np
+    values = np.asarray(values)
+    return np.frompyfunc(_gamma_point, 1, 1)(values).astype(values.dtype if np.iscomplexobj(values) else float)
+
+
+def _cut_from_below(function):
+    # asin, acos and atanh have branch cuts along the real axis past +-1.
+    # sympy takes a real argument on the cut from below when it is positive
+    # (asin(2) = pi/2 - 1.32i) and from above when negative; NumPy always
+    # takes it from above.
+    import numpy as np
+
+    def wrapped(values):
+        if np.iscomplexobj(values):
+            values = np.array(values)
+            values.imag[(values.imag == 0) & (values.real > 0)] = -0.0
+        return function(values)
+    return wrapped
+
+
+def _numpy_extras():
+    import numpy as np
+    return {
+        # math.gamma per point is ~50x faster than the mpmath fallback and
+        # still matches the Standard tab to float precision
+        "gamma": _gamma, "factorial": lambda values: _gamma(values + 1),
+        "asin": _cut_from_below(np.arcsin), "acos": _cut_from_below(np.arccos),
+        "atanh": _cut_from_below(np.arctanh),
+        # acosh's cut is the real axis below 1, which sympy takes from above
+        "acosh": lambda values: np.arccosh(values + 0j) if np.iscomplexobj(values) else np.arccosh(values),
+        **_numpy_degree_functions()
+    }
+
+
+# Table kernels take trig arguments that are multiples of pi (every one in
+# degree mode) in degrees, so whole multiples of 90 are exact: float pi/180
+# would make tan(90) 1.6e16 where the Standard tab gives zoo. Each entry:
+# name, radian function, {angle mod 180: exact value}.
+_DEGREE_TRIG = {
+    sp.sin: ("sind", "sin", {0: 0.0}),
+    sp.cos: ("cosd", "cos", {90: 0.0}),
+    sp.tan: ("tand", "tan", {0: 0.0, 90: math.nan}),
+    sp.cot: ("cotd", "cot", {0: math.nan, 90: 0.0}),
+    sp.sec: ("secd", "sec", {90: math.nan}),
+    sp.csc: ("cscd", "csc", {0: math.nan}),
+}
+
+
+def _degree_trig(expr):
+    # sin(pi*x/180) back to sind(x); sympy may have turned the function into
+    # another one (tan(x + 90) is -cot(x)), which gets its own degree version
+    def in_degrees(node):
+        return node.func in _DEGREE_TRIG and not sp.expand(node.args[0] / sp.pi).has(sp.pi)
+
+    def to_degrees(node):
+        name = _DEGREE_TRIG[node.func][0]
+        return sp.Function(name)(sp.expand(node.args[0] * 180 / sp.pi))
+    return expr.replace(in_degrees, to_degrees)
+
+
+def _numpy_degree_function(radian_function, exact):
+    import numpy as np
+
+    def wrapped(values):
+        values = np.asarray(values)
+        if np.iscomplexobj(values):
+            result = np.array(radian_function(np.deg2rad(values)), dtype=np.complex128)
+            real = np.where(values.imag == 0, values.real, np.nan)
+        else:
+            # fmod is exact, so sin(10**10) reduces like the Standard tab's
+            real = np.fmod(values, 360.0)
+            result = np.array(radian_function(np.deg2rad(real)), dtype=np.float64)
+        turned = np.abs(np.fmod(real, 180.0))
+        for angle, value in exact.items():
+            result[np.broadcast_to(turned == angle, result.shape)] = value
+        return result
+    return wrapped
+
+
+def _mpmath_degree_functions():
+    turns = lambda value: mpmath.mpmathify(value) / 180
+    return {
+        "sind": lambda value: mpmath.sinpi(turns(value)), "cosd": lambda value: mpmath.cospi(turns(value)),
+        "tand": lambda value: mpmath.sinpi(turns(value)) / mpmath.cospi(turns(value)),
+        "cotd": lambda value: mpmath.cospi(turns(value)) / mpmath.sinpi(turns(value)),
+        "secd": lambda value: 1 / mpmath.cospi(turns(value)), "cscd": lambda value: 1 / mpmath.sinpi(turns(value)),
+    }
+
+
+def _numpy_degree_functions():
+    import numpy as np
+    radians = {"sin": np.sin, "cos": np.cos, "tan": np.tan, "cot": lambda values: 1 / np.tan(values),
+               "sec": lambda values: 1 / np.cos(values), "csc": lambda values: 1 / np.sin(values)}
+    return {name: _numpy_degree_function(radians[radian_name], exact)
+            for name, radian_name, exact in _DEGREE_TRIG.values()}
+
+
+def _table_expression(expr_str, angle_mode, transformations):
+    return _degree_trig(parse_expression(expr_str, angle_mode, transformations))
+
+
+def _vectorized_fallback(variable, expr):
+    # For the other functions NumPy has no ufunc for: mpmath one point at a
+    # time. Slow, but the same numbers the Standard tab gives.
+    import numpy as np
+    scalar = sp.lambdify(variable, expr, modules=[_mpmath_degree_functions(), "mpmath"])
+
+    def point(value):
+        try:
+            return complex(scalar(value))
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            return complex("nan")
+
+    kernel = np.vectorize(point, otypes=[complex])
+    kernel.point_by_point = True
+    return kernel
+
+
+def table_kernel(expr_str, angle_mode, transformations=DEFAULT_TRANSFORMATIONS):
+    # Parsed and lambdified once per expression; the kernel takes a whole
+    # NumPy array of x values
+    import numpy as np
+    key = (expr_str, angle_mode, frozenset(transformations))
+    kernel = _TABLE_KERNELS.get(key)
+    if kernel is not None:
+        _TABLE_KERNELS.move_to_end(key)
+        return kernel
+    variable = sp.Symbol(TABLE_VARIABLE)
+    expr = _table_expression(expr_str, angle_mode, transformations)
+    unknown = sorted(str(symbol) for symbol in expr.free_symbols if symbol != variable)
+    if unknown:
+        raise ValueError("Unknown variables: " + ", ".join(unknown))
+    kernel = sp.lambdify(variable, expr, modules=[_numpy_extras(), "numpy"])
+    try:
+        # Printers emit names NumPy doesn't have for some functions; find out now
+        with np.errstate(all="ignore"):
+            kernel(np.linspace(0.5, 1.5, 3))
+    except (NameError, TypeError, AttributeError):
+        kernel = _vectorized_fallback(variable, expr)
+    _TABLE_KERNELS[key] = kernel
+    if len(_TABLE_KERNELS) > MAX_TABLE_KERNELS:
+        _TABLE_KERNELS.popitem(last=False)
+    return kernel
+
+
+def _kernel_values(kernel, xs):
+    import numpy as np
+    values = np.asarray(kernel(xs))
+    if values.dtype == object:
+        values = values.astype(complex)
+    # Constant expressions come back as a scalar
+    return np.broadcast_to(values, xs.shape)
+
+
+def tabulate(expr_str, angle_mode, transformations, start, step, count):
+    # One vectorized call over every point. Real results come back as float64,
+    # anything with an imaginary part as complex128; undefined points are nan.
+    import numpy as np
+    if not 0 < count <= MAX_TABLE_POINTS:
+        raise ValueError("More than {0} points".format(MAX_TABLE_POINTS))
+    kernel = table_kernel(expr_str, angle_mode, transformations)
+    if getattr(kernel, "point_by_point", False) and count > MAX_FALLBACK_POINTS:
+        raise ValueError("This expression is evaluated point by point; at most {0} points".format(
+            MAX_FALLBACK_POINTS))
+    xs = start + step * np.arange(count, dtype=np.float64)
+    with np.errstate(all="ignore"):
+        values = _kernel_values(kernel, xs)
+        # NumPy's real functions give nan where the Standard tab gives a
+        # complex value (sqrt(-1), log(-2)); those points are evaluated again
+        # on complex input, or point by point where NumPy has no complex
+        # version of a function (floor)
+        missing = np.isnan(values)
+        if missing.any() and not np.iscomplexobj(values):
+            try:
+                retry = _kernel_values(kernel, xs[missing].astype(np.complex128))
+            except (TypeError, ValueError):
+                retry = None
+                if np.count_nonzero(missing) <= MAX_FALLBACK_POINTS:
+                    expr = _table_expression(expr_str, angle_mode, transformations)
+                    retry = _vectorized_fallback(sp.Symbol(TABLE_VARIABLE), expr)(xs[missing])
+            if retry is not None and not np.isnan(retry).all():
+                values = values.astype(np.complex128)
+                values[missing] = retry
+    if np.iscomplexobj(values):
+        if not values.imag.any():
+            values = values.real
+    else:
+        values = values.astype(np.float64, copy=False)
+    return np.ascontiguousarray(values)
+
+
+# ==============================
+# Plotting
+# ==============================
+PLOT_INITIAL_POINTS = 64
+PLOT_MAX_POINTS = 40000
+PLOT_MAX_ROUNDS = 30
+
+
+def _real_values(kernel, xs):
+    import numpy as np
+    with np.errstate(all="ignore"):
+        values = np.asarray(kernel(xs))
+    if values.dtype == object:
+        values = values.astype(complex)
+    if np.iscomplexobj(values):
+        # Only the real part of the curve is drawn
+        values = np.where(values.imag == 0, values.real, np.nan)
+    return np.broadcast_to(values.astype(np.float64, copy=False), xs.shape)
+
+
+def adaptive_sample(expr_str, angle_mode, transformations, start, stop, tolerance, min_width,
+                    y_range=(-float("inf"), float("inf"))):
+    # Starts from a coarse grid and keeps splitting the intervals whose
+    # midpoint is more than `tolerance` (y units, about half a pixel) off the
+    # chord. That deviation is f''·h²/8, so splits go where the curve bends and
+    # flat stretches stay at a handful of points. Intervals narrower than
+    # min_width (a fraction of a pixel) or entirely above or below y_range are
+    # never split.
+    import numpy as np
+    kernel = table_kernel(expr_str, angle_mode, transformations)
+    xs = np.linspace(start, stop, PLOT_INITIAL_POINTS + 1)
+    ys = _real_values(kernel, xs)
+    for _ in range(PLOT_MAX_ROUNDS):
+        candidates = np.nonzero(np.diff(xs) > min_width)[0]
+        budget = PLOT_MAX_POINTS - len(xs)
+        if not len(candidates) or budget <= 0:
+            break
+        mids = (xs[candidates] + xs[candidates + 1]) / 2
+        ym = _real_values(kernel, mids)
+        ya, yb = ys[candidates], ys[candidates + 1]
+        finite = np.isfinite(ya) & np.isfinite(yb) & np.isfinite(ym)
+        # Where the curve enters or leaves its domain, keep narrowing in on the edge
+        edge = ~finite & (np.isfinite(ya) | np.isfinite(yb) | np.isfinite(ym))
+        outside = ((ya > y_range[1]) & (yb > y_range[1]) & (ym > y_range[1])) | (
+            (ya < y_range[0]) & (yb < y_range[0]) & (ym < y_range[0]))
+        refine = edge | (finite & ~outside & (np.abs(ym - (ya + yb) / 2) > tolerance))
+        if not refine.any():
+            break
+        picked = np.nonzero(refine)[0][:budget]
+        xs = np.insert(xs, candidates[picked] + 1, mids[picked])
+        ys = np.insert(ys, candidates[picked] + 1, ym[picked])
+    # A jump that survives refinement is a pole (midpoint outside both ends)
+    # or, once the interval is down to min_width, a step (midpoint sticks to
+    # one end). A nan between the ends breaks the line there.
+    mids = (xs[:-1] + xs[1:]) / 2
+    ym = _real_values(kernel, mids)
+    ya, yb = ys[:-1], ys[1:]
+    with np.errstate(all="ignore"):
+        low, high = np.fmin(ya, yb), np.fmax(ya, yb)
+        pole = (ym < low - tolerance) | (ym > high + tolerance)
+        step = (np.diff(xs) <= 2 * min_width) & (np.fmin(np.abs(ym - ya), np.abs(ym - yb)) <= tolerance)
+        jumps = np.nonzero((pole | step) & (high - low > 16 * tolerance))[0]
+    if len(jumps):
+        xs = np.insert(xs, jumps + 1, mids[jumps])
+        ys = np.insert(ys, jumps + 1, np.nan)
+    return xs, np.ascontiguousarray(ys)
+
+
+# ==============================
+# Solving
+# ==============================
+def parse_equations(equations, angle_mode, transformations=DEFAULT_TRANSFORMATIONS):
+    # "lhs=rhs" becomes lhs - rhs; a bare expression is taken as "= 0". The
+    # unknowns are every free symbol, in name order.
+    exprs = []
+    for equation in equations:
+        sides = equation.split("=")
+        if len(sides) > 2 or not all(sides):
+            raise ValueError("Not an equation: " + equation)
+        lhs = parse_expression(sides[0], angle_mode, transformations)
+        rhs = parse_expression(sides[1], angle_mode, transformations) if len(sides) == 2 else sp.Integer(0)
+        exprs.append(lhs - rhs)
+    symbols = sorted(set().union(*(expr.free_symbols for expr in exprs)), key=str)
+    if not symbols:
+        raise ValueError("No unknowns to solve for")
+    return exprs, symbols
+
+
+def _describe(solution, symbols, digits):
+    # One solution as display strings: "x = sqrt(2)" and "x = 1.41421356237310"
+    names = [symbol for symbol in symbols if symbol in solution]
+    exact = ", ".join("{0} = {1}".format(symbol, solution[symbol]) for symbol in names)
+    approx = ", ".join("{0} = {1}".format(symbol, sp.N(solution[symbol], digits)) for symbol in names)
+    return exact, approx
+
+
+def solve_equations(equations, angle_mode, transformations, method, start=None, digits=DEFAULT_DIGITS):
+    # One method of the solver portfolio. Returns {"exact", "solutions",
+    # "approximations"}; raises when the method has nothing useful to say.
+    exprs, symbols = parse_equations(equations, angle_mode, transformations)
+    if method == "solve":
+        found = sp.solve(exprs, symbols, dict=True)
+        if not found:
+            raise ValueError("No solution found")
+        described = [_describe(solution, symbols, digits) for solution in found]
+    elif method == "solveset":
+        if len(exprs) == 1 and len(symbols) == 1:
+            result = sp.solveset(exprs[0], symbols[0])
+        else:
+            result = sp.nonlinsolve(exprs, symbols)
+        if isinstance(result, sp.ConditionSet):
+            raise ValueError("No closed-form solution set")
+        if result is sp.S.EmptySet:
+            # A proof that there is no solution, which is a result too
+            return {"exact": True, "solutions": [], "approximations": []}
+        if not isinstance(result, sp.FiniteSet):
+            # Infinite families (ImageSet, unions of them) stay as one set
+            description = "{0} ∈ {1}".format(", ".join(map(str, symbols)), result)
+            return {"exact": True, "solutions": [description], "approximations": [description]}
+        found = [dict(zip(symbols, point if isinstance(point, (tuple, sp.Tuple)) else (point,))) for point in result]
+        described = [_describe(solution, symbols, digits) for solution in found]
+    elif method == "nsolve":
+        if len(exprs) != len(symbols):
+            raise ValueError("Numeric solving needs as many equations as unknowns")
+        # Slightly different start values per unknown avoid singular Jacobians
+        guess = [start * (1 + 0.1 * index) for index in range(len(symbols))]
+        if len(symbols) == 1:
+            values = [sp.nsolve(exprs[0], symbols[0], guess[0], prec=digits)]
+        else:
+            values = list(sp.nsolve(exprs, symbols, guess, prec=digits))
+        solution = dict(zip(symbols, values))
+        approx = _describe(solution, symbols, digits)[1]
+        return {"exact": False, "solutions": None, "approximations": [approx]}
+    else:
+        raise ValueError("Unknown solver: {0}".format(method))
+    return {"exact": True,
+            "solutions": [exact for exact, approx in described],
+            "approximations": [approx for exact, approx in described]}
@@ -0,0 +1,102 @@
+import math
+
+# Bookkeeping for the Plot tab. Workers return adaptive samples for an
+# x interval at a given resolution; a SampleStore keeps those chunks per curve
+# so panning and zooming only ask for the intervals the view has not covered
+# yet, and drawing picks the finest chunk available for every part of the view.
+
+# Fraction of the view added on each side when sampling, so small pans are free
+PLOT_PREFETCH = 0.25
+MAX_CHUNKS = 48
+
+
+def subtract_intervals(interval, covered):
+    # Parts of `interval` not inside any of the `covered` (start, stop) pairs
+    gaps = [interval]
+    for cover_start, cover_stop in covered:
+        remaining = []
+        for start, stop in gaps:
+            if cover_stop <= start or cover_start >= stop:
+                remaining.append((start, stop))
+                continue
+            if cover_start > start:
+                remaining.append((start, cover_start))
+            if cover_stop < stop:
+                remaining.append((cover_stop, stop))
+        gaps = remaining
+    return gaps
+
+
+def resolution(units_per_pixel):
+    # Tolerances are rounded down to a power of two so chunks sampled a few
+    # zoom steps apart can still be reused
+    return 2.0 ** math.floor(math.log2(units_per_pixel))
+
+
+def nice_step(span, target_lines):
+    raw = span / max(target_lines, 1)
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+class SampleChunk:
+    def __init__(self, start, stop, tolerance, y_range, xs, ys):
+        self.start = start
+        self.stop = stop
+        self.tolerance = tolerance
+        self.y_range = y_range
+        self.xs = xs
+        self.ys = ys
+
+    def serves(self, tolerance, y_range):
+        # Fine enough, and refined over at least the visible y range
+        return (self.tolerance <= tolerance and self.y_range[0] <= y_range[0]
+                and self.y_range[1] >= y_range[1])
+
+
+class SampleStore:
+    def __init__(self):
+        self.chunks = []
+
+    def missing(self, start, stop, tolerance, y_range, min_gap):
+        covered = [(chunk.start, chunk.stop) for chunk in self.chunks if chunk.serves(tolerance, y_range)]
+        return [(gap_start, gap_stop) for gap_start, gap_stop in subtract_intervals((start, stop), covered)
+                if gap_stop - gap_start > min_gap]
+
+    def add(self, chunk, view):
+        self.chunks.append(chunk)
+        # Drop chunks a finer one has fully replaced, then the ones farthest
+        # from the view once there are too many
+        kept = []
+        for index, old in enumerate(self.chunks):
+            finer = [(other.start, other.stop) for other in self.chunks[index + 1:]
+                     if other.tolerance <= old.tolerance]
+            if subtract_intervals((old.start, old.stop), finer):
+                kept.append(old)
+        if len(kept) > MAX_CHUNKS:
+            center = (view[0] + view[1]) / 2
+            kept.sort(key=lambda c: max(c.start - center, center - c.stop, 0))
+            kept = kept[:MAX_CHUNKS]
+        self.chunks = kept
+
+    def visible(self, start, stop):
+        # (xs, ys) pieces covering [start, stop], finest chunks first. Each
+        # piece keeps one point past its ends so the line reaches the border.
+        pieces = []
+        covered = []
+        for chunk in sorted(self.chunks, key=lambda c: c.tolerance):
+            clipped = (max(chunk.start, start), min(chunk.stop, stop))
+            if clipped[0] >= clipped[1]:
+                continue
+            for piece_start, piece_stop in subtract_intervals(clipped, covered):
+                low = max(chunk.xs.searchsorted(piece_start, "right") - 1, 0)
+                high = chunk.xs.searchsorted(piece_stop, "left") + 1
+                pieces.append((chunk.xs[low:high], chunk.ys[low:high]))
+            covered.append(clipped)
+        return pieces
+
+    def clear(self):
+        self.chunks = []
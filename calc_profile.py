@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+
+# Sampling profiler for slow evaluations. A worker job that asks for a profile
+# is sampled from a background thread: every SAMPLE_INTERVAL the job thread's
+# Python stack is recorded. Once the job has run for the threshold, the
+# samples are written as collapsed stacks ("a;b;c 12" per line, the input of
+# flamegraph.pl, speedscope and inferno) next to a JSON file describing the
+# input. The snapshot is rewritten while the job keeps running, so a job that
+# ends up timed out and killed still leaves one behind.
+
+SAMPLE_INTERVAL = 0.005
+FLUSH_INTERVAL = 2.0
+
+
+class StackSampler:
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self.labels = {}
+        self.lock = threading.Lock()
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = "{0} ({1}:{2})".format(
+                code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+        return label
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self.label(frame.f_code))
+            frame = frame.f_back
+        if not stack:
+            return
+        stack.reverse()
+        with self.lock:
+            self.counts[";".join(stack)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        with self.lock:
+            return ["{0} {1}".format(stack, count) for stack, count in sorted(self.counts.items())]
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ProfileCapture:
+    # settings: the request's "profile" dict, with the output directory, the
+    # threshold in seconds and whatever describes the input (expression,
+    # angle mode, mappings, ...), which is saved as-is
+    def __init__(self, settings, op):
+        self.directory = settings["dir"]
+        self.threshold = settings.get("threshold", 0)
+        self.info = {key: value for key, value in settings.items() if key not in ("dir", "threshold")}
+        self.info["op"] = op
+        self.base_path = None
+        self.sampler = StackSampler(threading.get_ident())
+        self.start = time.perf_counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        next_flush = self.start + self.threshold
+        while not self.stopped.wait(self.sampler.interval):
+            self.sampler.sample()
+            now = time.perf_counter()
+            if now >= next_flush:
+                self.write("running")
+                next_flush = now + FLUSH_INTERVAL
+
+    def write(self, status):
+        if self.base_path is None:
+            os.makedirs(self.directory, exist_ok=True)
+            name = "{0}-{1}-{2}".format(time.strftime("%Y%m%d-%H%M%S"), os.getpid(), int(self.start * 1000) % 100000)
+            self.base_path = os.path.join(self.directory, name)
+        info = dict(self.info, status=status, seconds=round(time.perf_counter() - self.start, 3),
+                    samples=self.sampler.samples, interval=self.sampler.interval)
+        try:
+            _write_atomic(self.base_path + ".folded", "\n".join(self.sampler.collapsed()) + "\n")
+            _write_atomic(self.base_path + ".json", json.dumps(info, ensure_ascii=False, indent=2))
+        except OSError:
+            # A profile is never worth failing the evaluation over
+            return None
+        return self.base_path + ".folded"
+
+    def finish(self, status):
+        # Path of the snapshot, or None if the job was faster than the threshold
+        self.stopped.set()
+        self.thread.join()
+        if time.perf_counter() - self.start < self.threshold:
+            return None
+        return self.write(status)
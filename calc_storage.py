@@ -0,0 +1,365 @@
+import os
+import re
+import csv
+import json
+import bisect
+import time
+import sqlite3
+import tempfile
+import threading
+
+
+# ==============================
+# JSON Store
+# ==============================
+class JsonStore:
+    # One JSON document on disk. Callers mutate .data in place and call
+    # mark_dirty(); a background thread coalesces bursts of changes into one
+    # write after `delay` seconds and replaces the file atomically.
+    # .data is serialized once per write, by snapshot(), which has to run on
+    # the thread that mutates it: the writer hands it to `dispatch` to get
+    # there. Without a dispatch the writer serializes .data itself.
+    def __init__(self, path, indent=None, delay=0.5, dispatch=None):
+        self.path = path
+        self.indent = indent
+        self.delay = delay
+        self.dispatch = dispatch
+        self.data = None
+        self.dirty = False
+        # Text of the latest snapshot not yet on disk
+        self.pending = None
+        self.closed = False
+        self.deadline = 0.0
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.thread = None
+
+    def load(self, default):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = default
+        return self.data
+
+    def mark_dirty(self):
+        # Cheap enough to call on every change; nothing is serialized here
+        with self.condition:
+            self.dirty = True
+            self.deadline = time.monotonic() + self.delay
+            if self.thread is None and not self.closed:
+                self.thread = threading.Thread(target=self._run, name="JsonStore-" + os.path.basename(self.path),
+                                               daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def snapshot(self):
+        with self.condition:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.pending = json.dumps(self.data, indent=self.indent, ensure_ascii=False)
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.dirty and self.pending is None and not self.closed:
+                    self.condition.wait()
+                # Every further change pushes the deadline back
+                while self.pending is None and not self.closed:
+                    remaining = self.deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.closed:
+                    # close() writes whatever is left
+                    return
+            if self.dispatch is None:
+                self.snapshot()
+            elif self.pending is None:
+                self.dispatch(self.snapshot)
+                with self.condition:
+                    while self.pending is None and self.dirty and not self.closed:
+                        self.condition.wait()
+            self._write()
+
+    def _write(self):
+        # The text is taken under write_lock, so writes land in the order
+        # their snapshots were made
+        with self.write_lock:
+            with self.condition:
+                text, self.pending = self.pending, None
+            if text is None:
+                return
+            folder = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=folder)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def flush(self):
+        # On the thread that mutates .data
+        self.snapshot()
+        self._write()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+
+# ==============================
+# History Log
+# ==============================
+class HistoryLog:
+    # Append-only SQLite log (WAL mode) of finished calculations. Rows are only
+    # ever read a page at a time; search goes through an FTS5 index when the
+    # SQLite build has it and falls back to a LIKE scan otherwise.
+    COLUMNS = "id, source, created, input, analytical, approx, error, analytical_missing"
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                created REAL NOT NULL,
+                input TEXT NOT NULL,
+                analytical TEXT,
+                approx TEXT,
+                error INTEGER NOT NULL DEFAULT 0,
+                analytical_missing TEXT
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS history_source ON history(source, id)")
+        self.has_fts = self._create_fts()
+        self.conn.commit()
+
+    def _create_fts(self):
+        try:
+            self.conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    input, analytical, approx, content='history', content_rowid='id'
+                )""")
+        except sqlite3.OperationalError:
+            return False
+        self.conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+                INSERT INTO history_fts(rowid, input, analytical, approx)
+                VALUES (new.id, new.input, new.analytical, new.approx);
+            END;
+            CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+                INSERT INTO history_fts(history_fts, rowid, input, analytical, approx)
+                VALUES ('delete', old.id, old.input, old.analytical, old.approx);
+            END;
+        """)
+        return True
+
+    def append(self, source, input_str, analytical_str, approx_str, error=False, analytical_missing=None):
+        cursor = self.conn.execute(
+            "INSERT INTO history (source, created, input, analytical, approx, error, analytical_missing) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source, time.time(), input_str, analytical_str, approx_str, int(error), analytical_missing))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def delete(self, row_id):
+        self.conn.execute("DELETE FROM history WHERE id = ?", (row_id,))
+        self.conn.commit()
+
+    def clear(self, source):
+        self.conn.execute("DELETE FROM history WHERE source = ?", (source,))
+        self.conn.commit()
+
+    def recent(self, source, limit, before_id=None):
+        # Newest first
+        if before_id is None:
+            return self.conn.execute(
+                "SELECT {0} FROM history WHERE source = ? ORDER BY id DESC LIMIT ?".format(self.COLUMNS),
+                (source, limit)).fetchall()
+        return self.conn.execute(
+            "SELECT {0} FROM history WHERE source = ? AND id < ? ORDER BY id DESC LIMIT ?".format(self.COLUMNS),
+            (source, before_id, limit)).fetchall()
+
+    def search(self, source, text, limit):
+        # Every word of text has to match as a prefix of some token
+        words = re.findall(r"\w+", text)
+        if not words:
+            return []
+        if self.has_fts:
+            query = " ".join('"{0}"*'.format(word) for word in words)
+            return self.conn.execute(
+                "SELECT {0} FROM history WHERE source = ? AND id IN "
+                "(SELECT rowid FROM history_fts WHERE history_fts MATCH ?) "
+                "ORDER BY id DESC LIMIT ?".format(self.COLUMNS),
+                (source, query, limit)).fetchall()
+        # LIKE only finds the words anywhere in the text; the rows it lets
+        # through are checked for whole-token prefixes here
+        clauses = " AND ".join("(input LIKE ? OR analytical LIKE ? OR approx LIKE ?)" for _ in words)
+        params = [source]
+        for word in words:
+            params.extend(["%" + word + "%"] * 3)
+        words = [word.lower() for word in words]
+        rows = []
+        for row in self.conn.execute(
+                "SELECT {0} FROM history WHERE source = ? AND {1} ORDER BY id DESC".format(self.COLUMNS, clauses),
+                params):
+            tokens = re.findall(r"\w+", " ".join(row[column] or "" for column in ("input", "analytical", "approx")))
+            tokens = [token.lower() for token in tokens]
+            if all(any(token.startswith(word) for token in tokens) for word in words):
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+
+# ==============================
+# Notes
+# ==============================
+NOTE_FIELDS = ("name", "type", "value", "input")
+_SEPARATOR_RE = re.compile(r"[\s,]*")
+
+
+class NoteIndex:
+    # In-memory word index over the name, type and value of every note. Like
+    # HistoryLog.search, each word of a query has to match as a prefix of some
+    # token; the sorted token list turns a prefix into one bisect.
+    INDEXED_FIELDS = ("name", "type", "value")
+
+    def __init__(self, notes=()):
+        self.postings = {}
+        self.note_tokens = {}
+        # Built in one go; add() keeps the token list sorted one insert at a time
+        for note in notes:
+            tokens = self.note_tokens[id(note)] = self._tokenize(note)
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(id(note))
+        self.tokens = sorted(self.postings)
+
+    def _tokenize(self, note):
+        text = " ".join(str(note.get(field) or "") for field in self.INDEXED_FIELDS)
+        return set(re.findall(r"\w+", text.lower()))
+
+    def add(self, note):
+        tokens = self._tokenize(note)
+        self.note_tokens[id(note)] = tokens
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = set()
+                bisect.insort(self.tokens, token)
+            postings.add(id(note))
+
+    def remove(self, note):
+        for token in self.note_tokens.pop(id(note), ()):
+            postings = self.postings[token]
+            postings.discard(id(note))
+            if not postings:
+                del self.postings[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+    def update(self, note):
+        self.remove(note)
+        self.add(note)
+
+    def search(self, text):
+        # ids of the matching notes, or None when text has no words (no filter)
+        words = re.findall(r"\w+", text.lower())
+        if not words:
+            return None
+        result = None
+        for word in words:
+            matches = set()
+            position = bisect.bisect_left(self.tokens, word)
+            while position < len(self.tokens) and self.tokens[position].startswith(word):
+                matches |= self.postings[self.tokens[position]]
+                position += 1
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return result
+
+
+def _note_row(row):
+    if not isinstance(row, dict):
+        raise ValueError("Not a note: {0!r}".format(row))
+    return {field: str(row.get(field) or "") for field in NOTE_FIELDS}
+
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    # Yields the items of a top-level JSON array, reading chunk_size at a time
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of notes")
+    position = 1
+    eof = False
+    while True:
+        position = _SEPARATOR_RE.match(buffer, position).end()
+        if buffer.startswith("]", position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise
+            more = f.read(chunk_size)
+            eof = not more
+            buffer = buffer[position:] + more
+            position = 0
+            continue
+        yield item
+
+
+def read_notes(path):
+    # Notes one at a time from .csv (with a header row), .jsonl or .json
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            rows = csv.DictReader(f)
+        elif extension == ".jsonl":
+            rows = (json.loads(line) for line in f if line.strip())
+        elif extension == ".json":
+            rows = _iter_json_array(f)
+        else:
+            raise ValueError("Unsupported notes file: " + path)
+        for row in rows:
+            yield _note_row(row)
+
+
+def write_notes(notes, path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in (".csv", ".jsonl", ".json"):
+        raise ValueError("Unsupported notes file: " + path)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            writer = csv.DictWriter(f, fieldnames=NOTE_FIELDS)
+            writer.writeheader()
+            for note in notes:
+                writer.writerow(_note_row(note))
+        elif extension == ".jsonl":
+            for note in notes:
+                f.write(json.dumps(_note_row(note), ensure_ascii=False) + "\n")
+        else:
+            f.write("[")
+            for index, note in enumerate(notes):
+                f.write((",\n" if index else "\n") + json.dumps(_note_row(note), ensure_ascii=False))
+            f.write("\n]\n")
@@ -0,0 +1,74 @@
+import pytest
+
+from calc_bench import compare, percentile
+
+
+# ==============================
+# Percentiles
+# ==============================
+@pytest.mark.parametrize("values, pct, expected", [
+    ([], 50, 0.0),
+    ([7.0], 50, 7.0), ([7.0], 99, 7.0),
+    ([1, 2, 3, 4], 50, 2), ([1, 2, 3, 4], 51, 3), ([1, 2, 3, 4], 100, 4), ([1, 2, 3, 4], 0, 1),
+    (list(range(1, 11)), 50, 5), (list(range(1, 11)), 95, 10), (list(range(1, 11)), 10, 1),
+    (list(range(1, 21)), 95, 19), (list(range(1, 21)), 96, 20),
+    (list(range(1, 101)), 99, 99), (list(range(1, 101)), 50, 50), (list(range(1, 101)), 1, 1),
+])
+def test_percentile_nearest_rank(values, pct, expected):
+    assert percentile(values, pct) == expected
+
+
+def test_percentile_is_a_sample():
+    values = sorted([0.3, 0.1, 0.7, 0.2, 0.9, 0.4])
+    for pct in range(0, 101):
+        assert percentile(values, pct) in values
+
+
+# ==============================
+# Regression Gate
+# ==============================
+def _stats(p50, p95, peak_kb=100.0):
+    return {"p50": p50, "p95": p95, "p99": p95, "peak_kb": peak_kb, "samples": 20}
+
+
+def _baseline(**stages):
+    return {"version": 1, "stages": stages}
+
+
+@pytest.mark.parametrize("before, after, flagged", [
+    # Over the threshold and the minimum delta
+    (10.0, 13.0, True),
+    # Over the threshold, under the minimum delta
+    (0.01, 0.05, False),
+    # Over the minimum delta, under the threshold
+    (10.0, 12.4, False),
+    # Exactly at the threshold is not a regression
+    (10.0, 12.5, False),
+    # Faster
+    (10.0, 5.0, False),
+])
+def test_compare_needs_threshold_and_min_delta(before, after, flagged):
+    regressions = compare({"parse": _stats(after, before)}, _baseline(parse=_stats(before, before)),
+                          threshold=0.25, min_delta_ms=0.05)
+    assert regressions == ([("parse", "p50", before, after)] if flagged else [])
+
+
+def test_compare_checks_p95_but_not_p99():
+    results = {"approx": dict(_stats(1.0, 3.0), p99=50.0)}
+    regressions = compare(results, _baseline(approx=_stats(1.0, 2.0)), threshold=0.25, min_delta_ms=0.05)
+    assert regressions == [("approx", "p95", 2.0, 3.0)]
+
+
+@pytest.mark.parametrize("before, after, flagged", [
+    (1000.0, 1300.0, True), (100.0, 150.0, False), (1000.0, 1200.0, False),
+])
+def test_compare_peak_memory(before, after, flagged):
+    # Memory growth also has to be more than 64 KB
+    regressions = compare({"latex": _stats(1.0, 1.0, after)}, _baseline(latex=_stats(1.0, 1.0, before)))
+    assert regressions == ([("latex", "peak_kb", before, after)] if flagged else [])
+
+
+def test_compare_skips_what_the_baseline_lacks():
+    results = {"parse": _stats(9.0, 9.0, None), "latex": _stats(9.0, 9.0)}
+    baseline = _baseline(parse=_stats(1.0, 9.0, 10.0), approx=_stats(1.0, 1.0))
+    assert compare(results, baseline) == [("parse", "p50", 1.0, 9.0)]
@@ -0,0 +1,165 @@
+import re
+import json
+
+import pytest
+
+from calc_engine import DEFAULT_FUNCTION_MAPPINGS, FUNCTION_TYPE, ExpressionCache, MappingRewriter, NoteScope
+
+
+# ==============================
+# Mappings
+# ==============================
+@pytest.mark.parametrize("expr_str, expected", [
+    ("sin(x)", "cos(x)"), ("asin(x)+sinh(x)+sin(x)", "asin(x)+sinh(x)+cos(x)"), ("xsin(1)", "xsin(1)"),
+    ("sin2", "sin2"), ("sin_1(x)", "sin_1(x)"), ("2sin(x)", "2cos(x)"), ("1e5sin(x)", "1e5cos(x)"),
+    ("2.5sin(x)", "2.5cos(x)"),
+])
+def test_names_map_on_token_boundaries(expr_str, expected):
+    assert MappingRewriter({"sin": "cos"}).rewrite(expr_str) == expected
+
+
+def test_default_mappings():
+    rewriter = MappingRewriter(DEFAULT_FUNCTION_MAPPINGS)
+    assert rewriter.rewrite("arcsin(1)+arccos(0)+arctan(1)+xarcsin(1)") == "asin(1)+acos(0)+atan(1)+xarcsin(1)"
+
+
+@pytest.mark.parametrize("expr_str, expected", [
+    ("x×y÷z", "x*y/z"), ("√(4)×2", "sqrt(4)*2"), ("2×√2", "2*sqrt2"), ("a→b", "a->b"), ("x→→y", "x=>y"),
+])
+def test_literal_mappings(expr_str, expected):
+    rewriter = MappingRewriter({"×": "*", "÷": "/", "√": "sqrt", "→": "->", "→→": "=>"})
+    assert rewriter.rewrite(expr_str) == expected
+
+
+def test_longest_literal_wins():
+    rewriter = MappingRewriter({"*": "×", "**": "^"})
+    assert rewriter.rewrite("2**3*4") == "2^3×4"
+
+
+@pytest.mark.parametrize("mappings, expr_str, expected", [
+    ({"a": "b", "b": "a"}, "a+b*ab", "b+a*ab"),
+    ({"sin": "cos", "cos": "sin"}, "sin(x)*cos(x)", "cos(x)*sin(x)"),
+    ({"^": "**", "**": "^"}, "2^3**4", "2**3^4"),
+    ({"sqrt": "√", "√": "sqrt"}, "√(4)+sqrt(2)", "sqrt(4)+√(2)"),
+])
+def test_swaps_apply_simultaneously(mappings, expr_str, expected):
+    assert MappingRewriter(mappings).rewrite(expr_str) == expected
+
+
+def test_no_mappings_is_identity():
+    rewriter = MappingRewriter({})
+    assert rewriter.rewrite("sin(x)×2") == "sin(x)×2"
+    assert rewriter.digest == MappingRewriter({}).digest != MappingRewriter({"a": "b"}).digest
+
+
+# ==============================
+# Note Scope
+# ==============================
+def _note(name, input_str, value="", note_type=""):
+    return {"name": name, "input": input_str, "value": value, "type": note_type}
+
+
+def _scope(notes):
+    return NoteScope(notes, MappingRewriter(DEFAULT_FUNCTION_MAPPINGS))
+
+
+NOTES = [
+    _note("a", "b + c", "5"), _note("b", "c*2"), _note("c", "3", "3"), _note("d", "a + 1"),
+    _note("f", "f(u, v) := u*c + v", note_type=FUNCTION_TYPE), _note("g", "f(1, 2) + e"),
+    _note("h", "arcsin(1)"), _note("x", "x + 1"),
+]
+
+
+def test_closure_is_transitive_and_dependencies_first():
+    closure = _scope(NOTES).closure(["d"])
+    assert [entry[0] for entry in closure] == ["c", "b", "a", "d"]
+    assert closure[2] == ["a", ["b+c", "5"], ["b", "c"], None]
+
+
+def test_closure_of_function_notes():
+    closure = _scope(NOTES).closure(["g"])
+    assert closure == [["c", ["3"], [], None], ["f", ["u*c+v"], ["c"], ["u", "v"]], ["g", ["f(1,2)+e"], ["f"], None]]
+
+
+def test_closure_shares_dependencies():
+    closure = _scope(NOTES).closure(["d", "g", "b"])
+    names = [entry[0] for entry in closure]
+    assert sorted(names) == ["a", "b", "c", "d", "f", "g"]
+    for index, entry in enumerate(closure):
+        assert set(entry[2]) <= set(names[:index])
+
+
+def test_definitions_are_mapped_and_self_reference_is_a_symbol():
+    scope = _scope(NOTES)
+    assert scope.definitions["h"] == ("asin(1)",)
+    assert scope.dependencies["x"] == []
+    assert scope.closure(["x"]) == [["x", ["x+1"], [], None]]
+
+
+@pytest.mark.parametrize("notes, name, cycle", [
+    ([_note("a", "b + 1"), _note("b", "a + 1")], "a", "a -> b -> a"),
+    ([_note("a", "b"), _note("b", "c"), _note("c", "a * 2")], "b", "b -> c -> a -> b"),
+    ([_note("p", "q"), _note("q", "q2"), _note("q2", "q")], "p", "p -> q -> q2 -> q"),
+])
+def test_cycles_are_reported(notes, name, cycle):
+    with pytest.raises(ValueError, match="Circular note reference: " + re.escape(cycle)):
+        _scope(notes).closure([name])
+
+
+def test_affected_follows_dependents():
+    scope = _scope(NOTES)
+    assert scope.affected("c") == {"a", "b", "d", "f", "g"}
+    assert scope.affected("a") == {"d"}
+    assert scope.affected("d") == set()
+    assert scope.affected("missing") == set()
+
+
+def test_affected_after_redefinition():
+    notes = [dict(note) for note in NOTES]
+    before = _scope(notes).affected("a")
+    # d stops using a, g starts to
+    notes[3]["input"] = "c + 1"
+    notes[5]["input"] = "f(a, 2)"
+    scope = _scope(notes)
+    assert before == {"d"}
+    assert scope.affected("a") == {"g"}
+    assert scope.affected("c") == {"a", "b", "d", "f", "g"}
+    assert [entry[0] for entry in scope.closure(["d"])] == ["c", "d"]
+
+
+def test_reserved_and_duplicate_names_are_skipped():
+    scope = _scope([_note("pi", "3"), _note("sin", "1"), _note("k", "1"), _note("k", "2"), _note("2k", "1")])
+    assert list(scope.definitions) == ["k"]
+    assert scope.definitions["k"] == ("1",)
+
+
+# ==============================
+# Expression Cache
+# ==============================
+@pytest.mark.parametrize("data", [
+    {"a": {"expr": "x", "approx": "1"}},
+    "cache",
+    [["a"], ["b", "c", "d"], [1, {"approx": "1"}], ["a", ["x"]], ["a", {"expr": "x"}],
+     ["a", {"approx": 1}], ["a", {"approx": "1", "analytical": 2}]],
+])
+def test_load_drops_malformed_entries(tmp_path, data):
+    path = tmp_path / "cache.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    cache = ExpressionCache()
+    cache.load(str(path))
+    assert not cache.entries
+
+
+def test_load_round_trip(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ExpressionCache()
+    cache.put("expr", {"expr": "Integer(2)", "approx": "2", "analytical": None})
+    cache.put("solve", {"analytical": "[1]", "approx": "[1.0]"})
+    cache.save(path)
+    with open(path, "r+", encoding="utf-8") as f:
+        items = json.load(f) + [["bad", {"expr": "x"}]]
+        f.seek(0)
+        json.dump(items, f)
+    loaded = ExpressionCache()
+    loaded.load(path)
+    assert list(loaded.entries) == ["expr", "solve"]
@@ -0,0 +1,53 @@
+import pytest
+import sympy as sp
+
+from calc_fast import fast_approximate
+from calc_math import parse_expression, approximate
+
+# The fast path either declines (None) or prints exactly what the sympy path
+# would: str(sp.N(expr, digits)) for the same input
+CORPUS = [
+    "1+2", "2**100", "1/3", "-7/3", "2**-3", "2**(1/2)", "10**-5", "3**(2/5) - 1",
+    "sqrt(2)", "sqrt(8)/sqrt(2)", "pi*e", "exp(1)", "exp(100)", "exp(-50)", "log(10)", "log(8, 2)", "ln(3)",
+    "sin(1)", "cos(2)/3", "tan(7)", "sin(30)", "cos(60) + tan(45)", "sin(100000)", "sin(10**10)",
+    "cos(10**22)", "tan(10**15 + 1)", "sin(1/7)", "asin(1/3)", "acos(1/4)", "atan(1)*4", "sinh(1/2)",
+    "cosh(3)", "tanh(1/5)", "max(1, 5/2)", "min(3, pi)", "abs(-1/3)", "Abs(1 - pi)", "pi**pi**pi",
+    "1 - 1/10**20", "10**308*10", "sin(pi)", "tan(pi/2)", "sqrt(-1)", "log(0)",
+    "0.1 + 0.2", "2**0.5", "1 - 1e-20", "1e308*10", "sin(1e10)", "123456789.123456789", "2.5*4",
+]
+
+
+@pytest.mark.parametrize("angle_mode", ["rad", "deg"])
+@pytest.mark.parametrize("digits", [15, 30, 50, 100])
+@pytest.mark.parametrize("expr_str", CORPUS)
+def test_matches_sympy(expr_str, angle_mode, digits):
+    fast = fast_approximate(expr_str, angle_mode, digits=digits)
+    if fast is None:
+        return
+    assert fast == str(sp.N(parse_expression(expr_str, angle_mode), digits))
+
+
+@pytest.mark.parametrize("angle_mode", ["rad", "deg"])
+@pytest.mark.parametrize("expr_str", CORPUS)
+def test_matches_worker(expr_str, angle_mode):
+    # The GUI shows the fast result first and the worker's replaces it
+    fast = fast_approximate(expr_str, angle_mode)
+    if fast is None:
+        return
+    assert fast == approximate(parse_expression(expr_str, angle_mode))
+
+
+@pytest.mark.parametrize("expr_str", ["1+2", "sin(10**10)", "cos(60)", "1/3"])
+def test_fast_path_taken(expr_str):
+    assert fast_approximate(expr_str, "deg") is not None
+
+
+@pytest.mark.parametrize("expr_str", ["0.1 + 0.2", "2**0.5", "sin(1e10)"])
+def test_float_literals_declined(expr_str):
+    # A Float's 15 digits decide the result in sympy; the fast path can't reproduce that
+    assert fast_approximate(expr_str, "rad", digits=50) is None
+
+
+def test_user_function():
+    notes = [["f", ["a**2 + b"], [], ["a", "b"]]]
+    assert fast_approximate("f(3, 1/2)", "rad", notes=notes) == str(sp.N(sp.Rational(19, 2), 15))
@@ -0,0 +1,62 @@
+import pytest
+import sympy as sp
+from sympy.parsing.latex import LaTeXParsingError
+
+from calc_latex import parse_latex_fast, LatexUnsupported
+from calc_math import get_latex_parser, _LATEX_CONSTANTS
+
+# Every input either parses to the same value as sympy's ANTLR parser, is
+# refused with LatexUnsupported, so calc_math falls back to ANTLR for it, or
+# is one ANTLR cannot parse at all
+PARITY_CORPUS = [
+    "2^10", "10^23", "e^10", "2^{10}", "x^23", "2^1.5", "2^x", "2^\\pi", "a^bc", "x^2y",
+    "2^3!", "2^10!", "3!", "x!^2", "3!^2", "1.5^2", "2^-1",
+    "\\frac12", "\\frac{1}{2}", "\\frac 1 2", "\\frac123", "\\frac1{23}", "\\frac{12}{34}",
+    "\\frac{x}{2}^2", "\\frac12^2", "\\dfrac{3}{4}", "\\tfrac{3}{4}", "\\frac{\\frac{1}{2}}{3}",
+    "\\sqrt{2}", "\\sqrt[3]{27}", "\\sqrt12",
+    "\\sin^2 x", "\\sin^{-1} x", "\\sin 2x", "\\sin x \\cos x", "\\log_2 8", "\\log_10 100", "e^{x}",
+    "\\sum_{k=1}^{10} k", "\\sum_{k=1}^10 k", "\\prod_{k=1}^{5} k",
+    "|x-3|", "\\left(1+x\\right)^2", "2 \\cdot 3 + 4 \\times 5 \\div 2", "a/b c",
+    "2 3", "3x^2 .5", "1.5.2", "\\frac{1}{2} 3", "\\frac1.5", "\\sqrt 4",
+    "\\frac{d}{dx} x^2", "\\frac{dy}{dx}", "\\frac{\\partial}{\\partial x} x y", "\\frac{d}{2}",
+]
+
+_POINT = {sp.Symbol(name): sp.Rational(index + 2, 7) for index, name in enumerate("abcxy")}
+
+
+def _value(expr):
+    return sp.N(expr.doit().subs(_POINT), 30)
+
+
+@pytest.mark.parametrize("latex_str", PARITY_CORPUS)
+def test_matches_antlr(latex_str):
+    try:
+        fast = parse_latex_fast(latex_str)
+    except LatexUnsupported:
+        return
+    try:
+        antlr = get_latex_parser()(latex_str).xreplace(_LATEX_CONSTANTS)
+    except LaTeXParsingError:
+        # Accepting more than ANTLR does is fine
+        return
+    assert _value(fast) == _value(antlr) or abs(_value(fast) - _value(antlr)) <= 1e-25 * abs(_value(antlr))
+
+
+@pytest.mark.parametrize("latex_str, expected", [
+    ("2^10", 1024), ("10^23", 10 ** 23), ("e^10", sp.E ** 10), ("\\frac123", sp.Rational(3, 2)),
+])
+def test_multi_digit_scripts(latex_str, expected):
+    assert sp.simplify(parse_latex_fast(latex_str).doit() - expected) == 0
+
+
+@pytest.mark.parametrize("latex_str", [
+    "x!^2", "\\sqrt12", "\\frac{d}{dx} x^2", "\\frac{dy}{dx}", "\\frac d{dx} x", "\\frac{\\partial}{\\partial x} x y",
+])
+def test_ambiguous_input_falls_back(latex_str):
+    with pytest.raises(LatexUnsupported):
+        parse_latex_fast(latex_str)
+
+
+def test_log_base():
+    assert parse_latex_fast("\\log_{10} 100").doit() == 2
+    assert parse_latex_fast("\\log_2 {8}").doit() == 3
@@ -0,0 +1,84 @@
+import math
+
+import numpy as np
+import pytest
+import sympy as sp
+
+from calc_engine import DEFAULT_TRANSFORMATIONS, TABLE_VARIABLE
+import calc_math
+from calc_math import approximate, find_closed_form, parse_expression, tabulate
+
+# Every Table cell should be what the Standard tab prints for that x, to
+# float precision; where it gives zoo or nan the cell is undefined (nan)
+GRIDS = {"deg": (-360, 15, 49), "rad": (-3, 0.25, 25)}
+TABLE_CORPUS = [
+    ("deg", "tan(x)"), ("deg", "sin(x)"), ("deg", "cos(x)"), ("deg", "tan(x + 90)"), ("deg", "sin(x)*cos(x)"),
+    ("deg", "sqrt(x)*tan(x)"), ("deg", "factorial(x/15)"), ("deg", "sin(10**10*x)"), ("deg", "asin(x/360)"),
+    ("rad", "tan(pi*x/2)"), ("rad", "sin(pi*x)"), ("rad", "tan(x)"), ("rad", "factorial(x)"), ("rad", "gamma(x)"),
+    ("rad", "sqrt(x)"), ("rad", "log(x + 4)"), ("rad", "asin(x)"), ("rad", "acosh(x)"), ("rad", "x!"),
+]
+
+
+def _standard_value(expr, value):
+    # What the user would type for this x
+    number = sp.Integer(value) if float(value).is_integer() else sp.Float(value)
+    text = approximate(expr.subs(sp.Symbol(TABLE_VARIABLE), number))
+    result = sp.sympify(text)
+    if result.has(sp.zoo, sp.nan):
+        return complex(math.nan, 0)
+    return complex(result)
+
+
+@pytest.mark.parametrize("angle_mode, expr_str", TABLE_CORPUS)
+def test_table_matches_standard(angle_mode, expr_str):
+    start, step, count = GRIDS[angle_mode]
+    values = tabulate(expr_str, angle_mode, DEFAULT_TRANSFORMATIONS, start, step, count)
+    expr = parse_expression(expr_str, angle_mode)
+    for index, cell in enumerate(values):
+        expected = _standard_value(expr, start + step * index)
+        cell = complex(cell)
+        if math.isnan(expected.real):
+            assert math.isnan(cell.real), (start + step * index, cell)
+        else:
+            assert cell == pytest.approx(expected, rel=1e-9, abs=1e-12), (start + step * index, cell, expected)
+
+
+@pytest.mark.parametrize("angle", [-270, -90, 90, 270, 450])
+def test_degree_tan_poles_are_undefined(angle):
+    assert np.isnan(tabulate("tan(x)", "deg", DEFAULT_TRANSFORMATIONS, angle, 1, 1)[0])
+
+
+# Inputs with repeated sub-terms, and sub-terms entered on their own first.
+# The ones nsimplify can't identify (log(8), sin(1)) are where reusing a
+# cached form could change the answer.
+CLOSED_FORM_CORPUS = [
+    ("rad", "sqrt(2)*sqrt(3) + sqrt(2)*sqrt(3)**2", ["sqrt(2)*sqrt(3)"]),
+    ("rad", "(1+sqrt(5))/2 + ((1+sqrt(5))/2)**2", ["(1+sqrt(5))/2"]),
+    ("rad", "atan(1)*4 + atan(1)", ["atan(1)*4", "atan(1)"]),
+    ("rad", "log(8)/log(2) + log(8)", ["log(8)/log(2)", "log(8)"]),
+    ("rad", "sin(1) + sin(1)**2", ["sin(1)"]),
+    ("rad", "sqrt(2+sqrt(3)) * sqrt(2+sqrt(3))", ["sqrt(2+sqrt(3))"]),
+    ("rad", "(sqrt(2)+1)**3 - (sqrt(2)+1)", ["(sqrt(2)+1)**3", "sqrt(2)+1"]),
+    ("rad", "gamma(1/2)**2 + gamma(1/2)", ["gamma(1/2)**2", "gamma(1/2)"]),
+    ("deg", "sin(30)+cos(60)+sin(30)*cos(60)", ["sin(30)", "sin(30)*cos(60)"]),
+    ("rad", "0.1*pi + 0.1*pi*2", ["0.1*pi"]),
+    ("rad", "exp(1.5) + exp(1.5)**2", ["exp(1.5)"]),
+]
+
+
+def _clear_caches():
+    calc_math._CLOSED_FORMS.clear()
+    calc_math._NUMERIC.clear()
+    sp.core.cache.clear_cache()
+
+
+@pytest.mark.parametrize("angle_mode, expr_str, subterms", CLOSED_FORM_CORPUS)
+def test_closed_form_cache_does_not_change_the_answer(angle_mode, expr_str, subterms):
+    expr = parse_expression(expr_str, angle_mode)
+    _clear_caches()
+    cold = find_closed_form(expr)
+    _clear_caches()
+    for subterm in subterms:
+        find_closed_form(parse_expression(subterm, angle_mode))
+    warm = find_closed_form(expr)
+    assert cold == warm == str(sp.nsimplify(expr, [sp.pi, sp.E]))
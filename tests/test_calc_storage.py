@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import queue
+import threading
+
+import pytest
+
+import calc_storage
+from calc_storage import HistoryLog, JsonStore, NoteIndex, read_notes, write_notes
+
+
+def _count_calls(monkeypatch, module, name):
+    calls = []
+    original = getattr(module, name)
+
+    def counted(*args, **kwargs):
+        calls.append(threading.get_ident())
+        return original(*args, **kwargs)
+    monkeypatch.setattr(module, name, counted)
+    return calls
+
+
+# ==============================
+# JSON Store
+# ==============================
+def test_burst_of_changes_is_serialized_and_written_once(tmp_path, monkeypatch):
+    dumps = _count_calls(monkeypatch, calc_storage.json, "dumps")
+    writes = _count_calls(monkeypatch, calc_storage.os, "replace")
+    store = JsonStore(str(tmp_path / "notes.json"), delay=0.2)
+    store.load([])
+    for i in range(1000):
+        store.data.append(i)
+        store.mark_dirty()
+    assert not dumps
+    deadline = time.monotonic() + 5
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    store.close()
+    assert len(dumps) == 1 and len(writes) == 1
+    with open(store.path, encoding="utf-8") as f:
+        assert json.load(f) == list(range(1000))
+
+
+def test_snapshot_runs_on_the_dispatching_thread(tmp_path, monkeypatch):
+    dumps = _count_calls(monkeypatch, calc_storage.json, "dumps")
+    requests = queue.Queue()
+    store = JsonStore(str(tmp_path / "settings.json"), delay=0.05, dispatch=requests.put)
+    store.load({})
+    store.data["a"] = 1
+    store.mark_dirty()
+    # Stands in for the GUI event loop
+    requests.get(timeout=5)()
+    store.close()
+    assert dumps == [threading.get_ident()]
+    with open(store.path, encoding="utf-8") as f:
+        assert json.load(f) == {"a": 1}
+
+
+def test_close_writes_pending_changes(tmp_path):
+    store = JsonStore(str(tmp_path / "settings.json"), delay=60)
+    store.load({})
+    store.data["a"] = 1
+    store.mark_dirty()
+    store.close()
+    with open(store.path, encoding="utf-8") as f:
+        assert json.load(f) == {"a": 1}
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith(".tmp-")]
+
+
+# ==============================
+# History Log
+# ==============================
+@pytest.fixture(params=["fts", "like"])
+def history(request, tmp_path):
+    log = HistoryLog(str(tmp_path / "history.db"))
+    if request.param == "like":
+        log.has_fts = False
+    elif not log.has_fts:
+        pytest.skip("SQLite built without FTS5")
+    yield log
+    log.close()
+
+
+def _inputs(rows):
+    return [row["input"] for row in rows]
+
+
+def test_recent_pages_with_before_id(history):
+    ids = [history.append("standard", "{0}+1".format(i), None, str(i + 1)) for i in range(25)]
+    history.append("latex", "\\frac12", None, "0.5")
+    pages = []
+    before_id = None
+    while True:
+        page = history.recent("standard", 10, before_id)
+        if not page:
+            break
+        pages.append([row["id"] for row in page])
+        before_id = page[-1]["id"]
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == ids[::-1]
+
+
+def test_search_prefixes_and_words(history):
+    history.append("standard", "sin(pi/7)", "sin(pi/7)", "0.433883739117558")
+    history.append("standard", "sqrt(2)*pi", "sqrt(2)*pi", "4.44288293815837")
+    history.append("standard", "sinh(1)", "sinh(1)", "1.17520119364380")
+    history.append("latex", "\\sin x", None, "sin(x)")
+    assert _inputs(history.search("standard", "sin", 10)) == ["sinh(1)", "sin(pi/7)"]
+    assert _inputs(history.search("standard", "pi", 10)) == ["sqrt(2)*pi", "sin(pi/7)"]
+    # Every word has to match, in any column
+    assert _inputs(history.search("standard", "sqrt 4.44", 10)) == ["sqrt(2)*pi"]
+    assert _inputs(history.search("standard", "sin 0.43", 10)) == ["sin(pi/7)"]
+    assert _inputs(history.search("standard", "SQRT", 10)) == ["sqrt(2)*pi"]
+    assert history.search("standard", "sin cos", 10) == []
+    assert history.search("standard", " ()* ", 10) == []
+    assert _inputs(history.search("standard", "s", 1)) == ["sinh(1)"]
+
+
+def test_delete_and_clear_keep_search_consistent(history):
+    first = history.append("standard", "sin(1)", None, "0.841470984807897")
+    history.append("standard", "sin(2)", None, "0.909297426825682")
+    history.append("table", "sin(x)", None, None)
+    history.delete(first)
+    assert _inputs(history.search("standard", "sin", 10)) == ["sin(2)"]
+    assert _inputs(history.recent("standard", 10)) == ["sin(2)"]
+    history.clear("standard")
+    assert history.search("standard", "sin", 10) == []
+    assert history.recent("standard", 10) == []
+    assert _inputs(history.search("table", "sin", 10)) == ["sin(x)"]
+    # Rows written after a delete are found again
+    history.append("standard", "sin(3)", None, "0.141120008059867")
+    assert _inputs(history.search("standard", "sin", 10)) == ["sin(3)"]
+
+
+def test_fts_index_matches_table_after_deletes(tmp_path):
+    log = HistoryLog(str(tmp_path / "history.db"))
+    if not log.has_fts:
+        pytest.skip("SQLite built without FTS5")
+    ids = [log.append("standard", "cos({0})".format(i), None, None) for i in range(10)]
+    for row_id in ids[::3]:
+        log.delete(row_id)
+    log.clear("other")
+    indexed = {row[0] for row in log.conn.execute("SELECT rowid FROM history_fts WHERE history_fts MATCH 'cos*'")}
+    assert indexed == set(ids) - set(ids[::3])
+    log.conn.execute("INSERT INTO history_fts(history_fts) VALUES ('integrity-check')")
+    log.close()
+
+
+# ==============================
+# Notes
+# ==============================
+def _notes_matching(index, notes, text):
+    ids = index.search(text)
+    return None if ids is None else sorted(note["name"] for note in notes if id(note) in ids)
+
+
+def test_note_index_prefix_search():
+    notes = [{"name": "radius", "type": "Length", "value": "2.5"},
+             {"name": "rate", "type": "Speed", "value": "12"},
+             {"name": "area", "type": "", "value": "pi*radius**2"}]
+    index = NoteIndex(notes)
+    assert _notes_matching(index, notes, "ra") == ["area", "radius", "rate"]
+    assert _notes_matching(index, notes, "rat") == ["rate"]
+    assert _notes_matching(index, notes, "RADIUS") == ["area", "radius"]
+    assert _notes_matching(index, notes, "ra len") == ["radius"]
+    assert _notes_matching(index, notes, "speed 12") == ["rate"]
+    assert _notes_matching(index, notes, "zzz") == []
+    assert _notes_matching(index, notes, " , ") is None
+
+
+def test_note_index_add_update_remove():
+    notes = [{"name": "alpha", "type": "", "value": "1"}]
+    index = NoteIndex(notes)
+    beta = {"name": "beta", "type": "Angle", "value": "alpha/2"}
+    notes.append(beta)
+    index.add(beta)
+    assert _notes_matching(index, notes, "al") == ["alpha", "beta"]
+    assert _notes_matching(index, notes, "ang") == ["beta"]
+    beta["type"] = "Ratio"
+    beta["value"] = "3"
+    index.update(beta)
+    assert _notes_matching(index, notes, "al") == ["alpha"]
+    assert _notes_matching(index, notes, "ang") == []
+    assert _notes_matching(index, notes, "rat") == ["beta"]
+    index.remove(beta)
+    notes.remove(beta)
+    assert _notes_matching(index, notes, "b") == []
+    assert index.tokens == sorted(index.postings) == ["1", "alpha"]
+    # Removing twice is harmless
+    index.remove(beta)
+
+
+NOTE_ROWS = [
+    {"name": "a", "type": "", "value": "1.5", "input": "3/2"},
+    {"name": "greeting", "type": "Text", "value": "héllo, \"world\"", "input": ""},
+    {"name": "f", "type": "Function", "value": "", "input": "f(x) := x**2\n+ 1"},
+]
+
+
+@pytest.mark.parametrize("extension", [".csv", ".jsonl", ".json"])
+def test_notes_round_trip(tmp_path, extension):
+    path = str(tmp_path / ("notes" + extension))
+    write_notes(NOTE_ROWS, path)
+    assert list(read_notes(path)) == NOTE_ROWS
+
+
+@pytest.mark.parametrize("extension", [".csv", ".jsonl", ".json"])
+def test_notes_round_trip_empty(tmp_path, extension):
+    path = str(tmp_path / ("notes" + extension))
+    write_notes([], path)
+    assert list(read_notes(path)) == []
+
+
+def test_read_notes_fills_missing_fields(tmp_path):
+    path = tmp_path / "notes.json"
+    path.write_text('[{"name": "a", "value": 2}, {"name": "b", "extra": true}]', encoding="utf-8")
+    assert list(read_notes(str(path))) == [{"name": "a", "type": "", "value": "2", "input": ""},
+                                           {"name": "b", "type": "", "value": "", "input": ""}]
+
+
+def test_json_array_larger_than_a_chunk(tmp_path):
+    notes = [{"name": "n{0}".format(i), "type": "", "value": "x" * (i % 37), "input": str(i)} for i in range(500)]
+    path = tmp_path / "notes.json"
+    path.write_text(json.dumps(notes), encoding="utf-8")
+    with open(str(path), encoding="utf-8") as f:
+        # Chunks smaller than one note, so every item straddles a refill
+        assert list(calc_storage._iter_json_array(f, chunk_size=7)) == notes
+    with open(str(path), encoding="utf-8") as f:
+        assert list(calc_storage._iter_json_array(f, chunk_size=4096)) == notes
+    assert list(read_notes(str(path))) == notes
+
+
+@pytest.mark.parametrize("text", ['{"name": "a"}', '[{"name": "a"}', '[{"name": "a"},, {"name": "b"'])
+def test_malformed_json_notes(tmp_path, text):
+    path = tmp_path / "notes.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(read_notes(str(path)))
+
+
+def test_unsupported_notes_file(tmp_path):
+    with pytest.raises(ValueError):
+        write_notes(NOTE_ROWS, str(tmp_path / "notes.txt"))
@@ -1,54 +1,176 @@
-import sys, os, json, re, subprocess
-import traceback
-import io
+import time
+STARTUP_T0 = time.perf_counter()
+
+import sys, os, json, re, subprocess, math, csv
+import threading
+import multiprocessing
 import webbrowser
 
-from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtGui import QIcon, QPixmap, QFont, QFontMetrics, QColor, QPalette, QPainter, QPainterPath, QPen
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit,
     QPushButton, QTabWidget, QGridLayout, QComboBox, QLabel, QSizePolicy,
-    QInputDialog, QSplitter, QScrollArea, QFrame, QTableWidget, QTableWidgetItem,
-    QHeaderView, QDialog, QCheckBox, QMessageBox, QLineEdit, QFormLayout, QListWidget,
-    QListWidgetItem, QMenu, QAction, QTextBrowser
+    QInputDialog, QSplitter, QFrame, QTableWidget, QTableWidgetItem,
+    QHeaderView, QDialog, QCheckBox, QMessageBox, QLineEdit, QFormLayout,
+    QMenu, QAction, QSpinBox, QListView, QStyledItemDelegate, QTableView,
+    QFileDialog, QTreeWidget, QTreeWidgetItem
+)
+from PyQt5.QtCore import (
+    Qt, QObject, QRunnable, QThreadPool, pyqtSignal, QAbstractListModel, QAbstractTableModel, QModelIndex, QRect,
+    QSize, QEvent, QTimer, QPointF, QSortFilterProxyModel
+)
+
+from calc_storage import HistoryLog, JsonStore, NoteIndex, read_notes, write_notes
+from calc_plot import SampleStore, SampleChunk, resolution, nice_step, PLOT_PREFETCH
+from calc_fast import fast_approximate
+from calc_diagnostics import TRACER, NULL_TRACE
+from calc_engine import (
+    WorkerPool, ExpressionCache, MappingRewriter, normalize_expression, cache_key, latex_cache_key, table_points,
+    solve_portfolio, solver_requests, split_equations, NoteScope, parse_definition, check_note_name, FUNCTION_TYPE,
+    DEFAULT_TRANSFORMATIONS, DEFAULT_FUNCTION_MAPPINGS, DEFAULT_DIGITS, MAX_DIGITS, TABLE_VARIABLE
 )
-from PyQt5.QtCore import Qt
-import sympy as sp
-from sympy.parsing.sympy_parser import parse_expr
+
+# ==============================
+# Startup Timing
+# ==============================
+# Run with --startup-timing to print when each stage finished, counted from the
+# first line of this module
+STARTUP_TIMES = []
+# The forkserver re-imports this module as __mp_main__; only the GUI process reports
+STARTUP_REPORT = "--startup-timing" in sys.argv and __name__ == "__main__"
+
+
+def mark_startup(stage):
+    STARTUP_TIMES.append((stage, time.perf_counter() - STARTUP_T0))
+    if STARTUP_REPORT:
+        print("[startup] {0:<24} {1:8.1f} ms".format(stage, STARTUP_TIMES[-1][1] * 1000), file=sys.stderr)
+
+
+mark_startup("imports")
+
 
 # ==============================
 # Customization Storage
 # ==============================
 CUSTOMIZATION_FILE = "customizations.txt"
-default_function_mappings = {
-    "arcsin": "asin",
-    "arccos": "acos",
-    "arctan": "atan"
-}
+CACHE_FILE = "expression_cache.json"
+HISTORY_FILE = "history.db"
+NOTES_FILE = "notes.json"
+PROFILE_DIR = "profiles"
+default_function_mappings = DEFAULT_FUNCTION_MAPPINGS
+
+
+SETTINGS_STORE = JsonStore(CUSTOMIZATION_FILE, indent=4)
+NOTES_STORE = JsonStore(NOTES_FILE)
 
 
 def load_customizations():
-    if os.path.exists(CUSTOMIZATION_FILE):
-        try:
-            with open(CUSTOMIZATION_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception:
-            data = {}
-    else:
-        data = {}
+    data = SETTINGS_STORE.load({})
+    if not isinstance(data, dict):
+        data = SETTINGS_STORE.data = {}
     data.setdefault("language", "en")
     data.setdefault("labels", {})
     data.setdefault("mappings", default_function_mappings.copy())
     data.setdefault("dark_mode", False)
-    data.setdefault("notes", [])
+    data.setdefault("angle_mode", "rad")
+    data.setdefault("transformations", list(DEFAULT_TRANSFORMATIONS))
+    data.setdefault("eval_timeout", 30)
+    data.setdefault("analytical_deadline", 5)
+    data.setdefault("precision", DEFAULT_DIGITS)
+    data.setdefault("worker_count", 0)  # 0 = pick from the CPU count
+    data.setdefault("worker_max_jobs", 100)
+    data.setdefault("worker_memory_limit_mb", 2048)
+    data.setdefault("worker_cpu_limit", 60)
+    data.setdefault("cache_max_entries", 1000)
+    data.setdefault("cache_max_bytes", 4 * 1024 * 1024)
+    data.setdefault("cache_persist", False)
+    data.setdefault("diagnostics", False)
+    data.setdefault("profile_slow", False)
+    data.setdefault("profile_threshold", 2)
     return data
 
 
 def save_customizations(custom_dict):
-    with open(CUSTOMIZATION_FILE, "w", encoding="utf-8") as f:
-        json.dump(custom_dict, f, indent=4, ensure_ascii=False)
+    # Only marks the file dirty; the store writes it shortly after, off the GUI thread
+    SETTINGS_STORE.data = custom_dict
+    SETTINGS_STORE.mark_dirty()
+
+
+def load_notes(custom_dict):
+    notes = NOTES_STORE.load(None)
+    legacy = custom_dict.pop("notes", None)
+    if notes is None:
+        # Notes used to live inside customizations.txt; move them over once
+        notes = NOTES_STORE.data = legacy if isinstance(legacy, list) else []
+        NOTES_STORE.mark_dirty()
+    if legacy is not None:
+        save_customizations(custom_dict)
+    return notes
+
+
+def save_notes():
+    global NOTE_SCOPE
+    NOTE_SCOPE = None
+    NOTES_STORE.mark_dirty()
+
 
+def flush_stores():
+    SETTINGS_STORE.close()
+    NOTES_STORE.close()
 
-CUSTOM_DICT = load_customizations()
+
+class StoreSnapshots(QObject):
+    # The GUI thread is the only one that changes the stores' data, so the
+    # writer threads have it take their snapshots through this signal
+    requested = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.requested.connect(self.take)
+
+    def take(self, snapshot):
+        snapshot()
+
+
+STORE_SNAPSHOTS = None
+
+
+def connect_stores():
+    global STORE_SNAPSHOTS
+    STORE_SNAPSHOTS = StoreSnapshots()
+    SETTINGS_STORE.dispatch = STORE_SNAPSHOTS.requested.emit
+    NOTES_STORE.dispatch = STORE_SNAPSHOTS.requested.emit
+
+
+# Filled in by load_stores() from main(). The forkserver imports this module
+# too, and must neither migrate notes nor start store threads of its own.
+CUSTOM_DICT = {}
+NOTES = []
+MAPPING_REWRITER = MappingRewriter({})
+NOTE_SCOPE = None
+
+
+def load_stores():
+    global CUSTOM_DICT, NOTES, MAPPING_REWRITER
+    CUSTOM_DICT = load_customizations()
+    TRACER.enabled = CUSTOM_DICT["diagnostics"]
+    NOTES = load_notes(CUSTOM_DICT)
+    MAPPING_REWRITER = MappingRewriter(CUSTOM_DICT["mappings"])
+
+
+def refresh_mapping_rewriter():
+    # Rebuilt only when the mapping set is saved, not on every evaluation
+    global MAPPING_REWRITER, NOTE_SCOPE
+    MAPPING_REWRITER = MappingRewriter(CUSTOM_DICT.get("mappings", default_function_mappings))
+    NOTE_SCOPE = None
+
+
+def get_note_scope():
+    # Rebuilt after the notes or mappings change
+    global NOTE_SCOPE
+    if NOTE_SCOPE is None:
+        NOTE_SCOPE = NoteScope(NOTES, MAPPING_REWRITER)
+    return NOTE_SCOPE
 
 # ==============================
 # Global Stylesheets
@@ -191,13 +313,136 @@ def update_dark_mode_state(enabled):
 
 
 # ==============================
-# LaTeX Parsing
+# Evaluation
 # ==============================
-try:
-    from sympy.parsing.latex import parse_latex
-except ImportError:
-    def parse_latex(latex_str):
-        raise NotImplementedError("Install antlr4-python3-runtime for LaTeX parsing.")
+EVALUATION_POOL = None
+EVALUATION_POOL_LOCK = threading.Lock()
+HISTORY_LOG = None
+EXPRESSION_CACHE = None
+
+
+def load_expression_cache():
+    # Sized from the settings, so only after load_stores()
+    global EXPRESSION_CACHE
+    EXPRESSION_CACHE = ExpressionCache(CUSTOM_DICT.get("cache_max_entries", 1000),
+                                       CUSTOM_DICT.get("cache_max_bytes", 4 * 1024 * 1024))
+    if CUSTOM_DICT.get("cache_persist", False):
+        EXPRESSION_CACHE.load(CACHE_FILE)
+
+
+def save_expression_cache():
+    if CUSTOM_DICT.get("cache_persist", False):
+        EXPRESSION_CACHE.save(CACHE_FILE)
+
+
+def get_history_log():
+    global HISTORY_LOG
+    if HISTORY_LOG is None:
+        HISTORY_LOG = HistoryLog(HISTORY_FILE)
+    return HISTORY_LOG
+
+
+def close_history_log():
+    global HISTORY_LOG
+    if HISTORY_LOG is not None:
+        HISTORY_LOG.close()
+        HISTORY_LOG = None
+
+
+def get_evaluation_pool():
+    global EVALUATION_POOL
+    with EVALUATION_POOL_LOCK:
+        if EVALUATION_POOL is None:
+            EVALUATION_POOL = WorkerPool(
+                size=CUSTOM_DICT.get("worker_count", 0),
+                max_jobs=CUSTOM_DICT.get("worker_max_jobs", 100),
+                memory_limit_mb=CUSTOM_DICT.get("worker_memory_limit_mb", 2048),
+                cpu_limit=CUSTOM_DICT.get("worker_cpu_limit", 60),
+            )
+            # Blocks until the forkserver has imported sympy, so never call this
+            # from the GUI thread
+            EVALUATION_POOL.start()
+        return EVALUATION_POOL
+
+
+def warm_up_evaluation_pool():
+    # Started after the first paint; a round trip to a worker means the first
+    # real evaluation won't wait on imports
+    response = get_evaluation_pool().submit({"op": "ping"}, timeout=60)
+    mark_startup("evaluation ready" if response["status"] == "ok" else "evaluation failed")
+
+
+def preload_latex_parser():
+    get_evaluation_pool().submit({"op": "preload", "parts": ["latex"]}, timeout=60)
+
+
+def shutdown_evaluation_pool():
+    global EVALUATION_POOL
+    with EVALUATION_POOL_LOCK:
+        if EVALUATION_POOL is not None:
+            EVALUATION_POOL.shutdown()
+            EVALUATION_POOL = None
+
+
+def profile_settings(input_str, angle_mode):
+    # Asks the worker for a stack-sample snapshot of evaluations slower than
+    # the threshold, saved with what is needed to reproduce them
+    if not CUSTOM_DICT.get("profile_slow", False):
+        return None
+    return {"dir": os.path.abspath(PROFILE_DIR), "threshold": CUSTOM_DICT.get("profile_threshold", 2),
+            "input": input_str, "angle_mode": angle_mode, "mappings": dict(MAPPING_REWRITER.mappings),
+            "transformations": list(CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS))}
+
+
+def response_error_text(response):
+    status = response.get("status")
+    if status == "timeout":
+        return t("error_prefix") + t("timed_out").format(CUSTOM_DICT.get("eval_timeout", 30))
+    if status == "crashed":
+        return t("error_prefix") + t("worker_crashed")
+    if status == "cancelled":
+        return t("cancelled")
+    return t("error_prefix") + response.get("error", "")
+
+
+class EvaluationSignals(QObject):
+    partial = pyqtSignal(object, object)
+    finished = pyqtSignal(object, object)
+
+
+class EvaluationTask(QRunnable):
+    def __init__(self, entry, request, timeout, cache_key=None, partial_timeout=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.entry = entry
+        self.request = request
+        self.timeout = timeout
+        self.partial_timeout = partial_timeout
+        self.cache_key = cache_key
+        self.last_partial = None
+        self.trace = NULL_TRACE
+        self.signals = EvaluationSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def on_partial(self, message):
+        self.last_partial = message
+        self.signals.partial.emit(self, message)
+
+    def run(self):
+        start = time.perf_counter()
+        response = get_evaluation_pool().submit(self.request, self.timeout, self._cancelled,
+                                                on_partial=self.on_partial,
+                                                partial_timeout=self.partial_timeout)
+        if self.trace:
+            # "worker" covers queueing and the round trip; the worker's own
+            # stages come back with the response (or the last partial on a timeout)
+            self.trace.add("worker", start, time.perf_counter())
+            self.trace.add_remote(response.get("spans") or (self.last_partial or {}).get("spans"), start)
+        self.signals.finished.emit(self, response)
+
 
 # ==============================
 # Localization
@@ -255,7 +500,7 @@ translations = {
         "prompt_add_mapping_name": "Enter mapping name (e.g. arcsin):",
         "prompt_add_mapping_replacement": "Enter replacement (e.g. asin):",
         "dark_mode": "Dark Mode",
-        "mapping_help": "Mappings replace text in your input. For example, if you set 'arctan' to 'atan', every occurrence is replaced.",
+        "mapping_help": "Mappings replace text in your input. For example, if you set 'arctan' to 'atan', every occurrence of the name 'arctan' is replaced (longer names containing it are left alone).",
         "copyright": "witt's Calculator Beta 1.0\n"
                      "By witt\n"
                      "Icon by 3s.",
@@ -263,8 +508,50 @@ translations = {
         "open_notes": "Notes...",
         "notebook": "Notes",
         "clear_history": "Clear History",
+        "search_history": "Search History...",
+        "search_placeholder": "Search inputs and results",
         "save_analytical": "Save Analytical",
-        "save_approx": "Save Approximation"
+        "save_approx": "Save Approximation",
+        "computing": "Computing…",
+        "cancel": "Cancel",
+        "cancelled": "Cancelled",
+        "timed_out": "Evaluation timed out after {0} s",
+        "worker_crashed": "Evaluation process exited unexpectedly",
+        "cache_stats": "Expression cache: {0} hits / {1} misses ({2} entries, {3} KB)",
+        "clear_cache": "Clear Expression Cache",
+        "cache_persist": "Keep expression cache between sessions",
+        "diagnostics": "Record evaluation timings",
+        "slowest_evaluations": "Slowest recent evaluations",
+        "diagnostics_expression": "Expression / stage",
+        "diagnostics_time": "Time (ms)",
+        "refresh": "Refresh",
+        "export_trace": "Export Trace...",
+        "clear_timings": "Clear Timings",
+        "profile_slow": "Save a profile of evaluations slower than (seconds):",
+        "open_profiles": "Open Profiles Folder",
+        "analytical_not_found": "Analytical form not found within budget",
+        "analytical_deadline": "Analytical form deadline (seconds):",
+        "precision": "Approximation digits:",
+        "copy_approx": "Copy Approximation",
+        "table_tab": "Table",
+        "table_expression": "f(x), e.g. sin(x)/x",
+        "table_start": "From:",
+        "table_stop": "To:",
+        "table_step": "Step:",
+        "table_value": "f(x)",
+        "table_undefined": "undefined",
+        "table_bad_number": "Range values must be numbers",
+        "table_done": "{0} points in {1} ms ({2})",
+        "plot_tab": "Plot",
+        "plot_expression": "Functions of x, separated by ; (e.g. sin(x); x^2/10)",
+        "plot": "Plot",
+        "reset_view": "Reset View",
+        "solver_tab": "Solve",
+        "enter_equations": "Equations, one per line or separated by ; (e.g. x**2-2=0 or x+y=3; x-y=1)",
+        "solver_numeric_only": "No exact solution found; numeric roots only",
+        "implicit_multiplication": "Implicit multiplication (2x, 2(1+3))",
+        "convert_xor": "Use ^ for powers (2^3)",
+        "factorial_notation": "Factorial notation (5!)"
     },
     "zh": {
         "app_title": "witt's Calculator",
@@ -320,7 +607,7 @@ translations = {
         "prompt_add_mapping_name": "输入映射名称（如 arcsin）：",
         "prompt_add_mapping_replacement": "输入替换（如 asin）：",
         "dark_mode": "深色界面",
-        "mapping_help": "映射用于替换输入文本。例如，如果你设置 'arctan' 的映射为 'atan'，则所有 'arctan' 都会被替换。",
+        "mapping_help": "映射用于替换输入文本。例如，如果你设置 'arctan' 的映射为 'atan'，则所有名为 'arctan' 的函数都会被替换（包含它的更长名称不受影响）。",
         "copyright": "witt's Calculator Beta 1.0\n"
                      "制作：witt\n"
                      "图标绘制：3s.",
@@ -328,8 +615,50 @@ translations = {
         "open_notes": "笔记本...",
         "notebook": "笔记本",
         "clear_history": "清除历史记录",
+        "search_history": "搜索历史记录...",
+        "search_placeholder": "搜索输入和结果",
         "save_analytical": "保存解析值",
-        "save_approx": "保存近似值"
+        "save_approx": "保存近似值",
+        "computing": "计算中…",
+        "cancel": "取消",
+        "cancelled": "已取消",
+        "timed_out": "计算超时（{0} 秒）",
+        "worker_crashed": "计算进程意外退出",
+        "cache_stats": "表达式缓存：命中 {0} 次 / 未命中 {1} 次（{2} 条，{3} KB）",
+        "clear_cache": "清除表达式缓存",
+        "cache_persist": "退出后保留表达式缓存",
+        "diagnostics": "记录计算耗时",
+        "slowest_evaluations": "最近最慢的计算",
+        "diagnostics_expression": "表达式 / 阶段",
+        "diagnostics_time": "耗时（毫秒）",
+        "refresh": "刷新",
+        "export_trace": "导出跟踪...",
+        "clear_timings": "清除耗时记录",
+        "profile_slow": "为超过以下时间的计算保存性能剖析（秒）：",
+        "open_profiles": "打开剖析文件夹",
+        "analytical_not_found": "未能在限定时间内求得解析值",
+        "analytical_deadline": "解析值求解时限（秒）：",
+        "precision": "近似值位数：",
+        "copy_approx": "复制近似值",
+        "table_tab": "函数表",
+        "table_expression": "f(x)，例如 sin(x)/x",
+        "table_start": "起点：",
+        "table_stop": "终点：",
+        "table_step": "步长：",
+        "table_value": "f(x)",
+        "table_undefined": "无定义",
+        "table_bad_number": "范围必须是数字",
+        "table_done": "{0} 个点，用时 {1} 毫秒（{2}）",
+        "plot_tab": "绘图",
+        "plot_expression": "x 的函数，用 ; 分隔（例如 sin(x); x^2/10）",
+        "plot": "绘制",
+        "reset_view": "重置视图",
+        "solver_tab": "解方程",
+        "enter_equations": "方程，每行一个或用 ; 分隔（如 x**2-2=0 或 x+y=3; x-y=1）",
+        "solver_numeric_only": "未找到精确解，仅有数值解",
+        "implicit_multiplication": "隐式乘法（2x、2(1+3)）",
+        "convert_xor": "使用 ^ 表示乘方（2^3）",
+        "factorial_notation": "阶乘记号（5!）"
     }
 }
 
@@ -345,9 +674,9 @@ def t(key):
 class NoteEditDialog(QDialog):
     def __init__(self, note=None, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Add Note")
+        self.setWindowTitle("Add Note" if note is None else "Edit Note")
         self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
-        self.note = note if note is not None else {"name": "", "value": "", "type": ""}
+        self.note = note if note is not None else {"name": "", "value": "", "type": "", "input": ""}
         self.init_ui()
 
     def init_ui(self):
@@ -355,191 +684,706 @@ class NoteEditDialog(QDialog):
         self.name_edit = QLineEdit(self.note.get("name", ""))
         self.value_edit = QLineEdit(self.note.get("value", ""))
         self.type_edit = QLineEdit(self.note.get("type", ""))
+        self.input_edit = QLineEdit(self.note.get("input", ""))
         layout.addRow("Name:", self.name_edit)
         layout.addRow("Value:", self.value_edit)
         layout.addRow("Type:", self.type_edit)
+        layout.addRow("Input:", self.input_edit)
         btn = QPushButton("Save")
-        btn.clicked.connect(self.accept)
+        btn.clicked.connect(self.save)
         layout.addRow(btn)
         self.setLayout(layout)
 
+    def save(self):
+        try:
+            check_note_name(self.name_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, self.windowTitle(), str(e))
+            return
+        self.accept()
+
     def get_note(self):
         return {"name": self.name_edit.text(),
                 "value": self.value_edit.text(),
-                "type": self.type_edit.text()}
+                "type": self.type_edit.text(),
+                "input": self.input_edit.text()}
+
+
+# -----------------------------
+# NotesModel
+# -----------------------------
+class NotesModel(QAbstractTableModel):
+    # Table model over the NOTES list itself. Rows are inserted and removed
+    # one change at a time, and the NoteIndex is kept in step for filtering.
+    COLUMNS = ("name", "type", "value", "input")
+    HEADERS = ("Name", "Type", "Value", "Input")
+    IMPORT_BATCH = 500
+
+    def __init__(self, notes, parent=None):
+        super().__init__(parent)
+        self.notes = notes
+        self.search_index = NoteIndex(notes)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.notes)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        return self.notes[index.row()].get(self.COLUMNS[index.column()], "")
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def row_of(self, note):
+        for row in range(len(self.notes) - 1, -1, -1):
+            if self.notes[row] is note:
+                return row
+        return -1
+
+    def append(self, notes):
+        if not notes:
+            return
+        row = len(self.notes)
+        self.beginInsertRows(QModelIndex(), row, row + len(notes) - 1)
+        self.notes.extend(notes)
+        for note in notes:
+            self.search_index.add(note)
+        self.endInsertRows()
+        save_notes()
+
+    def remove(self, note):
+        row = self.row_of(note)
+        if row < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.notes[row]
+        self.search_index.remove(note)
+        self.endRemoveRows()
+        save_notes()
+
+    def note_changed(self, note):
+        row = self.row_of(note)
+        if row < 0:
+            return
+        self.search_index.update(note)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+        save_notes()
+
+    def import_file(self, path):
+        # Streamed from disk and inserted a batch at a time
+        batch = []
+        count = 0
+        for note in read_notes(path):
+            batch.append(note)
+            if len(batch) >= self.IMPORT_BATCH:
+                self.append(batch)
+                count += len(batch)
+                batch = []
+        self.append(batch)
+        return count + len(batch)
+
+
+NOTES_MODEL = None
+
+
+def get_notes_model():
+    global NOTES_MODEL
+    if NOTES_MODEL is None:
+        NOTES_MODEL = NotesModel(NOTES)
+    return NOTES_MODEL
+
+
+class NotesFilterProxy(QSortFilterProxyModel):
+    # The filter text is looked up in the NoteIndex once; rows are then
+    # accepted by id, so typing stays instant with thousands of notes
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filter_text = ""
+        self.matches = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        # Added, removed and edited notes may change what the filter matches
+        model.rowsInserted.connect(self.refresh_filter)
+        model.rowsRemoved.connect(self.refresh_filter)
+        model.dataChanged.connect(self.refresh_filter)
+
+    def set_filter_text(self, text):
+        self.filter_text = text
+        self.matches = self.sourceModel().search_index.search(text)
+        self.invalidateFilter()
+
+    def refresh_filter(self, *args):
+        if self.filter_text.strip():
+            self.set_filter_text(self.filter_text)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.matches is None or id(self.sourceModel().notes[source_row]) in self.matches
 
 
 # -----------------------------
 # NotesEditorWindow
 # -----------------------------
 class NotesEditorWindow(QDialog):
+    NOTES_FILTER = "Notes (*.csv *.json *.jsonl)"
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle(t("notebook"))
         self.resize(800, 400)
         self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        # Running tasks are kept referenced until they finish, as elsewhere
+        self.recompute_tasks = set()
         self.init_ui()
 
     def init_ui(self):
         layout = QVBoxLayout()
-        self.table = QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["Name", "Type", "Value", "Input"])
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter by name, type or value")
+        self.filter_edit.setClearButtonEnabled(True)
+        layout.addWidget(self.filter_edit)
+        self.model = get_notes_model()
+        self.proxy = NotesFilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortCaseSensitivity(Qt.CaseInsensitive)
+        self.filter_edit.textChanged.connect(self.proxy.set_filter_text)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.AscendingOrder)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.doubleClicked.connect(self.edit_note)
         layout.addWidget(self.table)
         btn_layout = QHBoxLayout()
         self.btn_add = QPushButton("Add Note")
         self.btn_add.clicked.connect(self.add_note)
         btn_layout.addWidget(self.btn_add)
+        self.btn_edit = QPushButton("Edit Note")
+        self.btn_edit.clicked.connect(self.edit_note)
+        btn_layout.addWidget(self.btn_edit)
         self.btn_delete = QPushButton("Delete Note")
         self.btn_delete.clicked.connect(self.delete_note)
         btn_layout.addWidget(self.btn_delete)
         btn_layout.addStretch()
+        self.btn_import = QPushButton("Import...")
+        self.btn_import.clicked.connect(self.import_notes)
+        btn_layout.addWidget(self.btn_import)
+        self.btn_export = QPushButton("Export...")
+        self.btn_export.clicked.connect(self.export_notes)
+        btn_layout.addWidget(self.btn_export)
         layout.addLayout(btn_layout)
         self.setLayout(layout)
-        self.load_notes()
 
-    def load_notes(self):
-        notes = CUSTOM_DICT.get("notes", [])
-        self.table.setRowCount(len(notes))
-        for i, note in enumerate(notes):
-            self.table.setItem(i, 0, QTableWidgetItem(note.get("name", "")))
-            self.table.setItem(i, 1, QTableWidgetItem(note.get("type", "")))
-            self.table.setItem(i, 2, QTableWidgetItem(note.get("value", "")))
-            self.table.setItem(i, 3, QTableWidgetItem(note.get("input", "")))
+    def selected_notes(self):
+        rows = {self.proxy.mapToSource(index).row() for index in self.table.selectionModel().selectedRows()}
+        return [self.model.notes[row] for row in sorted(rows)]
 
     def add_note(self):
         dlg = NoteEditDialog(None, self)
         if dlg.exec_():
             new_note = dlg.get_note()
-            new_note["input"] = ""
-            notes = CUSTOM_DICT.get("notes", [])
-            notes.append(new_note)
-            CUSTOM_DICT["notes"] = notes
-            save_customizations(CUSTOM_DICT)
-            self.load_notes()
+            self.model.append([new_note])
+            self.recompute_dependents(new_note["name"])
+
+    def edit_note(self):
+        notes = self.selected_notes()
+        if not notes:
+            return
+        note = notes[0]
+        # Notes that used the old name only show up in the scope from before the edit
+        old_dependents = get_note_scope().affected(note.get("name", "").strip())
+        dlg = NoteEditDialog(note, self)
+        if dlg.exec_():
+            note.update(dlg.get_note())
+            self.model.note_changed(note)
+            self.recompute_dependents(note["name"], old_dependents)
+
+    def recompute_dependents(self, name, extra=()):
+        # The changed note and the notes downstream of it are evaluated again;
+        # notes without an input were typed in by hand and keep their value
+        scope = get_note_scope()
+        by_name = {}
+        for note in NOTES:
+            by_name.setdefault(note.get("name", "").strip(), note)
+        name = name.strip()
+        affected = scope.affected(name) | {name} | set(extra)
+        # Function notes have no value to recompute; their body is their input
+        targets = sorted(name for name in affected if name in scope.definitions and by_name[name].get("input")
+                         and scope.params[name] is None)
+        if not targets:
+            return
+        try:
+            closure = scope.closure(targets)
+        except ValueError as e:
+            QMessageBox.warning(self, t("notebook"), str(e))
+            return
+        request = {"op": "notes", "notes": closure, "targets": [[name, scope.types[name]] for name in targets],
+                   "angle_mode": CUSTOM_DICT.get("angle_mode", "rad"),
+                   "transformations": list(CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS)),
+                   "digits": CUSTOM_DICT.get("precision", DEFAULT_DIGITS)}
+        task = EvaluationTask(by_name, request, CUSTOM_DICT.get("eval_timeout", 30))
+        task.signals.finished.connect(self.recompute_finished)
+        self.recompute_tasks.add(task)
+        QThreadPool.globalInstance().start(task)
+
+    def recompute_finished(self, task, response):
+        self.recompute_tasks.discard(task)
+        if response["status"] != "ok":
+            QMessageBox.warning(self, t("notebook"), response_error_text(response))
+            return
+        by_name = task.entry
+        for name, value in response["values"].items():
+            by_name[name]["value"] = value
+            self.model.note_changed(by_name[name])
 
     def delete_note(self):
-        row = self.table.currentRow()
-        if row < 0:
+        for note in self.selected_notes():
+            self.model.remove(note)
+
+    def import_notes(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Notes", "", self.NOTES_FILTER)
+        if not path:
             return
-        notes = CUSTOM_DICT.get("notes", [])
-        del notes[row]
-        CUSTOM_DICT["notes"] = notes
-        save_customizations(CUSTOM_DICT)
-        self.load_notes()
+        try:
+            self.model.import_file(path)
+        except (OSError, ValueError, csv.Error) as e:
+            QMessageBox.warning(self, t("notebook"), str(e))
+
+    def export_notes(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Notes", "notes.csv", self.NOTES_FILTER)
+        if not path:
+            return
+        try:
+            write_notes(NOTES, path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, t("notebook"), str(e))
 
 
 # -----------------------------
 # HistoryEntry
 # -----------------------------
-class HistoryEntry(QFrame):
-    def __init__(self, input_str, analytical_str, approx_str=None, error=False, parent_notes_callback=None):
-        super().__init__()
+class HistoryEntry:
+    # Plain record for one history row; the view paints it, nothing here owns widgets
+    __slots__ = ("input_str", "analytical_str", "approx_str", "error", "pending", "analytical_missing",
+                 "cancel_callback", "model", "log_id", "trace")
+
+    def __init__(self, input_str, analytical_str, approx_str=None, error=False, pending=False,
+                 cancel_callback=None):
         self.input_str = input_str
         self.analytical_str = analytical_str
         self.approx_str = approx_str
         self.error = error
-        self.parent_notes_callback = parent_notes_callback
-        self.init_ui()
+        self.pending = pending
+        self.analytical_missing = None
+        self.cancel_callback = cancel_callback
+        self.model = None
+        self.log_id = None
+        self.trace = NULL_TRACE
+
+    @classmethod
+    def from_log_row(cls, row):
+        entry = cls(row["input"], row["analytical"], row["approx"], bool(row["error"]))
+        entry.analytical_missing = row["analytical_missing"]
+        entry.log_id = row["id"]
+        return entry
+
+    def changed(self):
+        if self.model is not None:
+            self.model.entry_changed(self)
+
+    def set_approx(self, approx_str):
+        # Approximation arrived first; the analytical form is still being computed
+        self.approx_str = approx_str
+        self.changed()
 
-    def init_ui(self):
-        self.setFrameShape(QFrame.StyledPanel)
-        layout = QVBoxLayout(self)
-        layout.setSpacing(2)
-        self.lbl_input = QLabel(self.input_str)
-        self.lbl_input.setAlignment(Qt.AlignLeft)
-        self.lbl_input.setStyleSheet("font-size: 14pt;")
-        layout.addWidget(self.lbl_input)
-        if self.error:
-            self.lbl_error = QLabel(self.analytical_str)
-            self.lbl_error.setAlignment(Qt.AlignRight)
-            self.lbl_error.setStyleSheet("color: red; font-size: 14pt;")
-            layout.addWidget(self.lbl_error)
+    def set_result(self, analytical_str, approx_str, analytical_missing=None):
+        self.pending = False
+        self.error = False
+        self.analytical_str = analytical_str
+        self.approx_str = approx_str
+        self.analytical_missing = analytical_missing
+        self.changed()
+
+    def set_error(self, message):
+        self.pending = False
+        self.error = True
+        self.analytical_str = message
+        self.approx_str = None
+        self.changed()
+
+    def cancel(self):
+        if self.pending and self.cancel_callback:
+            self.cancel_callback(self)
+
+
+# -----------------------------
+# HistoryModel
+# -----------------------------
+class HistoryModel(QAbstractListModel):
+    EntryRole = Qt.UserRole + 1
+    entry_finished = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == self.EntryRole:
+            return entry
+        if role == Qt.DisplayRole:
+            return entry.input_str
+        return None
+
+    def row_of(self, entry):
+        # Updates almost always target recent rows, so search from the end
+        for row in range(len(self.entries) - 1, -1, -1):
+            if self.entries[row] is entry:
+                return row
+        return -1
+
+    def append(self, entry):
+        row = len(self.entries)
+        self.beginInsertRows(QModelIndex(), row, row)
+        entry.model = self
+        self.entries.append(entry)
+        self.endInsertRows()
+
+    def prepend(self, entries):
+        if not entries:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(entries) - 1)
+        for entry in entries:
+            entry.model = self
+        self.entries[:0] = entries
+        self.endInsertRows()
+
+    def remove(self, entry):
+        row = self.row_of(entry)
+        if row < 0:
+            return
+        entry.cancel()
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.entries[row]
+        entry.model = None
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        for entry in self.entries:
+            entry.cancel()
+            entry.model = None
+        self.entries = []
+        self.endResetModel()
+
+    def entry_changed(self, entry):
+        row = self.row_of(entry)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+        if not entry.pending:
+            self.entry_finished.emit(entry)
+
+
+# -----------------------------
+# HistoryDelegate
+# -----------------------------
+class HistoryDelegate(QStyledItemDelegate):
+    # Paints a HistoryEntry the way the old per-entry QFrame laid it out, with
+    # the Save/Cancel buttons drawn in place and hit-tested on click
+    PADDING = 8
+    SPACING = 2
+    BUTTON_WIDTH = 250
+    BUTTON_HEIGHT = 50
+    BUTTON_MARGIN = 10
+    CANCEL_WIDTH = 120
+    MAX_APPROX_LINES = 8
+
+    button_clicked = pyqtSignal(object, str)
+
+    def fonts(self, option):
+        font = QFont(option.font)
+        font.setPointSize(14)
+        bold = QFont(font)
+        bold.setBold(True)
+        italic = QFont(font)
+        italic.setItalic(True)
+        return font, bold, italic
+
+    def layout(self, entry, rect, option):
+        # Returns the text lines and button rects for an entry placed at rect
+        font, bold, italic = self.fonts(option)
+        line_height = QFontMetrics(font).height()
+        x = rect.left() + self.PADDING
+        width = rect.width() - 2 * self.PADDING
+        y = rect.top() + self.PADDING
+        lines = [("input", QRect(x, y, width, line_height))]
+        buttons = []
+        y += line_height + self.SPACING
+        if entry.pending and entry.approx_str is None:
+            height = max(line_height, 36)
+            buttons.append(("cancel", QRect(x + width - self.CANCEL_WIDTH, y, self.CANCEL_WIDTH, height)))
+            lines.append(("pending", QRect(x, y, width - self.CANCEL_WIDTH - self.PADDING, height)))
+            y += height
+        elif entry.error:
+            lines.append(("error", QRect(x, y, width, line_height)))
+            y += line_height
+        else:
+            if entry.analytical_str is None and entry.pending:
+                height = max(line_height, 36)
+                buttons.append(("cancel", QRect(x + width - self.CANCEL_WIDTH, y, self.CANCEL_WIDTH, height)))
+                lines.append(("pending", QRect(x, y, width - self.CANCEL_WIDTH - self.PADDING, height)))
+                y += height + self.SPACING
+            else:
+                lines.append(("analytical", QRect(x, y, width, line_height)))
+                y += line_height + self.SPACING
+            # High-precision approximations wrap instead of being cut at one line
+            approx_width = QFontMetrics(bold).horizontalAdvance(entry.approx_str or "")
+            approx_lines = min(self.MAX_APPROX_LINES, max(1, -(-approx_width // max(width, 1))))
+            lines.append(("approx", QRect(x, y, width, line_height * approx_lines)))
+            y += line_height * approx_lines + self.BUTTON_MARGIN
+            right = x + width
+            buttons.append(("save_approx", QRect(right - self.BUTTON_WIDTH, y,
+                                                 self.BUTTON_WIDTH, self.BUTTON_HEIGHT)))
+            buttons.append(("save_analytical", QRect(right - 2 * self.BUTTON_WIDTH - self.PADDING, y,
+                                                     self.BUTTON_WIDTH, self.BUTTON_HEIGHT)))
+            y += self.BUTTON_HEIGHT + self.BUTTON_MARGIN
+        return lines, buttons, y + self.PADDING - rect.top()
+
+    def sizeHint(self, option, index):
+        entry = index.data(HistoryModel.EntryRole)
+        _, _, height = self.layout(entry, QRect(0, 0, max(option.rect.width(), 1), 0), option)
+        return QSize(option.rect.width(), height)
+
+    def paint(self, painter, option, index):
+        entry = index.data(HistoryModel.EntryRole)
+        lines, buttons, _ = self.layout(entry, option.rect, option)
+        font, bold, italic = self.fonts(option)
+        dark = CUSTOM_DICT.get("dark_mode", False)
+        if dark:
+            analytical_color, approx_color, border = QColor("#00ff00"), QColor("#00ccff"), QColor("#555")
+            button_color = QColor("#3c3f41")
         else:
-            if CUSTOM_DICT.get("dark_mode", False):
-                analytical_color = "#00ff00"
-                approx_color = "#00ccff"
+            analytical_color, approx_color, border = QColor("darkgreen"), QColor("blue"), QColor("#aaa")
+            button_color = QColor("#e0e0e0")
+        text_color = option.palette.color(QPalette.Text)
+        painter.save()
+        for kind, rect in lines:
+            if kind == "input":
+                painter.setFont(font)
+                painter.setPen(text_color)
+                text = " ".join(entry.input_str.split())
+                align = Qt.AlignLeft | Qt.AlignVCenter
+            elif kind == "pending":
+                painter.setFont(italic)
+                painter.setPen(QColor("gray"))
+                text = t("computing")
+                align = Qt.AlignRight | Qt.AlignVCenter
+            elif kind == "error":
+                painter.setFont(font)
+                painter.setPen(QColor("red"))
+                text = entry.analytical_str
+                align = Qt.AlignRight | Qt.AlignVCenter
+            elif kind == "analytical" and entry.analytical_str is None:
+                painter.setFont(italic)
+                painter.setPen(QColor("gray"))
+                text = entry.analytical_missing or t("analytical_not_found")
+                align = Qt.AlignRight | Qt.AlignVCenter
             else:
-                analytical_color = "darkgreen"
-                approx_color = "blue"
-            self.lbl_analytical = QLabel(self.analytical_str)
-            self.lbl_analytical.setAlignment(Qt.AlignRight)
-            self.lbl_analytical.setStyleSheet(f"color: {analytical_color}; font-weight: bold; font-size: 14pt;")
-            layout.addWidget(self.lbl_analytical)
-            self.lbl_approx = QLabel(self.approx_str)
-            self.lbl_approx.setAlignment(Qt.AlignRight)
-            self.lbl_approx.setStyleSheet(f"color: {approx_color}; font-weight: bold; font-size: 14pt;")
-            layout.addWidget(self.lbl_approx)
-            btn_layout = QHBoxLayout()
-            btn_layout.setContentsMargins(0, 10, 0, 10)
-            btn_layout.addStretch()
-            self.btn_save_analytical = QPushButton(t("save_analytical"))
-            self.btn_save_analytical.setFixedSize(250, 50)
-            self.btn_save_analytical.clicked.connect(lambda: self.save_note("Analytical"))
-            btn_layout.addWidget(self.btn_save_analytical)
-            self.btn_save_approx = QPushButton(t("save_approx"))
-            self.btn_save_approx.setFixedSize(250, 50)
-            self.btn_save_approx.clicked.connect(lambda: self.save_note("Approximation"))
-            btn_layout.addWidget(self.btn_save_approx)
-            layout.addLayout(btn_layout)
-        sep = QFrame()
-        sep.setFrameShape(QFrame.HLine)
-        sep.setFrameShadow(QFrame.Sunken)
-        layout.addWidget(sep)
+                painter.setFont(bold)
+                painter.setPen(analytical_color if kind == "analytical" else approx_color)
+                text = entry.analytical_str if kind == "analytical" else entry.approx_str
+                align = Qt.AlignRight | Qt.AlignVCenter
+            metrics = painter.fontMetrics()
+            if kind == "approx" and rect.height() > metrics.height():
+                # Keep as many digits as the wrapped lines hold, then elide
+                flags = Qt.AlignRight | Qt.AlignTop | Qt.TextWrapAnywhere
+                low, high = 0, len(text)
+                while low < high:
+                    middle = (low + high + 1) // 2
+                    shown = text if middle == len(text) else text[:middle] + "…"
+                    if metrics.boundingRect(rect, flags, shown).height() <= rect.height():
+                        low = middle
+                    else:
+                        high = middle - 1
+                painter.drawText(rect, flags, text if low == len(text) else text[:low] + "…")
+                continue
+            text = metrics.elidedText(text or "", Qt.ElideRight, rect.width())
+            painter.drawText(rect, align, text)
+        painter.setFont(font)
+        for kind, rect in buttons:
+            enabled = kind != "save_analytical" or entry.analytical_str is not None
+            painter.setPen(border)
+            painter.setBrush(button_color)
+            painter.drawRoundedRect(rect, 5, 5)
+            painter.setPen(text_color if enabled else QColor("gray"))
+            painter.drawText(rect, Qt.AlignCenter, t(kind))
+        painter.setPen(border)
+        bottom = option.rect.bottom()
+        painter.drawLine(option.rect.left() + self.PADDING, bottom, option.rect.right() - self.PADDING, bottom)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            entry = index.data(HistoryModel.EntryRole)
+            _, buttons, _ = self.layout(entry, option.rect, option)
+            for kind, rect in buttons:
+                if rect.contains(event.pos()):
+                    if kind != "save_analytical" or entry.analytical_str is not None:
+                        self.button_clicked.emit(entry, kind)
+                    return True
+        return super().editorEvent(event, model, option, index)
+
+
+# -----------------------------
+# HistoryWidget
+# -----------------------------
+class HistoryWidget(QListView):
+    PAGE_SIZE = 200
+
+    def __init__(self, parent=None, notes_callback=None, source=None, log=None):
+        super().__init__(parent)
+        self.notes_callback = notes_callback
+        self.source = source
+        self.log = log
+        self.has_older = log is not None
+        self.history_model = HistoryModel(self)
+        self.history_model.entry_finished.connect(self.log_entry)
+        self.delegate = HistoryDelegate(self)
+        self.delegate.button_clicked.connect(self.button_clicked)
+        self.setModel(self.history_model)
+        self.setItemDelegate(self.delegate)
+        self.setSelectionMode(QListView.NoSelection)
+        self.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)
+        # Lay rows out in batches so a very long history never stalls the event loop
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(500)
+        self.verticalScrollBar().valueChanged.connect(self.scrolled)
+        if self.log is not None:
+            self.load_older()
+            QTimer.singleShot(0, self.scrollToBottom)
+
+    def load_older(self):
+        # Pull the next page of logged entries in above what is already shown
+        entries = self.history_model.entries
+        before_id = next((entry.log_id for entry in entries if entry.log_id is not None), None)
+        rows = self.log.recent(self.source, self.PAGE_SIZE, before_id)
+        self.has_older = len(rows) == self.PAGE_SIZE
+        if not rows:
+            return
+        had_entries = bool(entries)
+        self.history_model.prepend([HistoryEntry.from_log_row(row) for row in reversed(rows)])
+        if had_entries:
+            self.scrollTo(self.history_model.index(len(rows)), QListView.PositionAtTop)
+
+    def scrolled(self, value):
+        if value == 0 and self.has_older and self.history_model.entries:
+            self.load_older()
+
+    def log_entry(self, entry):
+        if self.log is None or entry.log_id is not None:
+            return
+        with entry.trace.span("persist"):
+            entry.log_id = self.log.append(self.source, entry.input_str, entry.analytical_str, entry.approx_str,
+                                           entry.error, entry.analytical_missing)
+
+    def delete_entry(self, entry):
+        self.history_model.remove(entry)
+        if self.log is not None and entry.log_id is not None:
+            self.log.delete(entry.log_id)
+
+    def add_entry(self, input_str, analytical_str, approx_str=None, error=False, pending=False,
+                  cancel_callback=None, trace=NULL_TRACE):
+        entry = HistoryEntry(input_str, analytical_str, approx_str, error, pending=pending,
+                             cancel_callback=cancel_callback)
+        entry.trace = trace
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self.history_model.append(entry)
+        if not pending:
+            self.log_entry(entry)
+        if at_bottom:
+            self.scrollToBottom()
+        return entry
+
+    def clear_entries(self):
+        self.history_model.clear()
+        if self.log is not None:
+            self.log.clear(self.source)
+        self.has_older = False
+
+    def button_clicked(self, entry, kind):
+        if kind == "cancel":
+            entry.cancel()
+        elif kind == "save_analytical":
+            self.save_note(entry, "Analytical")
+        elif kind == "save_approx":
+            self.save_note(entry, "Approximation")
 
     def contextMenuEvent(self, event):
+        index = self.indexAt(event.pos())
+        if not index.isValid():
+            return
+        entry = index.data(HistoryModel.EntryRole)
         menu = QMenu(self)
+        if entry.pending:
+            cancel_action = QAction(t("cancel"), self)
+            cancel_action.triggered.connect(entry.cancel)
+            menu.addAction(cancel_action)
+        elif not entry.error:
+            save_analytical_action = QAction(t("save_analytical"), self)
+            save_analytical_action.setEnabled(entry.analytical_str is not None)
+            save_analytical_action.triggered.connect(lambda: self.save_note(entry, "Analytical"))
+            menu.addAction(save_analytical_action)
+            save_approx_action = QAction(t("save_approx"), self)
+            # Function definitions have no approximation to save
+            save_approx_action.setEnabled(entry.approx_str is not None)
+            save_approx_action.triggered.connect(lambda: self.save_note(entry, "Approximation"))
+            menu.addAction(save_approx_action)
+            copy_approx_action = QAction(t("copy_approx"), self)
+            copy_approx_action.setEnabled(entry.approx_str is not None)
+            copy_approx_action.triggered.connect(lambda: QApplication.clipboard().setText(entry.approx_str))
+            menu.addAction(copy_approx_action)
         delete_action = QAction("Delete Entry", self)
-        delete_action.triggered.connect(lambda: self.delete_self())
+        delete_action.triggered.connect(lambda: self.delete_entry(entry))
         menu.addAction(delete_action)
         menu.exec_(event.globalPos())
 
-    def delete_self(self):
-        self.setParent(None)
-        self.deleteLater()
-
-    def save_note(self, result_type):
+    def save_note(self, entry, result_type):
         note_name, ok = QInputDialog.getText(self, "Save Note", "Enter note name:",
                                              flags=Qt.WindowFlags(Qt.WindowTitleHint | Qt.WindowCloseButtonHint)
                                              )
         if ok and note_name:
+            try:
+                check_note_name(note_name)
+            except ValueError as e:
+                QMessageBox.warning(self, "Save Note", str(e))
+                return
             note = {
                 "name": note_name,
                 "type": result_type,
-                "value": self.analytical_str if result_type == "analytical" else self.approx_str,
-                "input": self.input_str,
+                "value": entry.analytical_str if result_type == "Analytical" else entry.approx_str,
+                "input": entry.input_str,
             }
-            notes = CUSTOM_DICT.get("notes", [])
-            notes.append(note)
-            CUSTOM_DICT["notes"] = notes
-            save_customizations(CUSTOM_DICT)
-            if self.parent_notes_callback:
-                self.parent_notes_callback()
-
-
-# -----------------------------
-# HistoryWidget
-# -----------------------------
-class HistoryWidget(QScrollArea):
-    def __init__(self, parent=None, notes_callback=None):
-        super().__init__(parent)
-        self.setWidgetResizable(True)
-        self.container = QWidget()
-        self.vbox = QVBoxLayout(self.container)
-        self.vbox.setSpacing(5)
-        self.vbox.addStretch()
-        self.setWidget(self.container)
-        self.notes_callback = notes_callback
-
-    def add_entry(self, input_str, analytical_str, approx_str=None, error=False):
-        entry = HistoryEntry(input_str, analytical_str, approx_str, error, parent_notes_callback=self.notes_callback)
-        self.vbox.insertWidget(self.vbox.count() - 1, entry)
-
-    def clear_entries(self):
-        for i in reversed(range(self.vbox.count() - 1)):
-            widget = self.vbox.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()
+            get_notes_model().append([note])
+            if self.notes_callback:
+                self.notes_callback()
 
 
 # -----------------------------
@@ -580,14 +1424,65 @@ class CustomButton(QPushButton):
             save_customizations(CUSTOM_DICT)
 
 
+# -----------------------------
+# HistorySearchDialog
+# -----------------------------
+class HistorySearchDialog(QDialog):
+    # Queries the history log directly, so matches older than the loaded pages are found too
+    RESULT_LIMIT = 500
+
+    def __init__(self, source, insert_callback, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.insert_callback = insert_callback
+        self.setWindowTitle(t("search_history"))
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.resize(700, 500)
+        layout = QVBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText(t("search_placeholder"))
+        self.search_edit.setStyleSheet("font-size: 14pt; padding: 5px;")
+        layout.addWidget(self.search_edit)
+        self.results = HistoryWidget(self)
+        self.results.doubleClicked.connect(self.insert_result)
+        layout.addWidget(self.results)
+        self.setLayout(layout)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+
+    def run_search(self):
+        rows = get_history_log().search(self.source, self.search_edit.text(), self.RESULT_LIMIT)
+        self.results.history_model.clear()
+        self.results.history_model.prepend([HistoryEntry.from_log_row(row) for row in reversed(rows)])
+        self.results.scrollToBottom()
+
+    def insert_result(self, index):
+        entry = index.data(HistoryModel.EntryRole)
+        if entry is not None:
+            self.insert_callback(entry.input_str)
+            self.accept()
+
+
 # -----------------------------
 # StandardCalculatorTab
 # -----------------------------
 class StandardCalculatorTab(QWidget):
+    PREVIEW_DELAY_MS = 150
+    PREVIEW_TIMEOUT = 3
+
     def __init__(self):
         super().__init__()
-        self.angle_mode = 'rad'
+        self.angle_mode = CUSTOM_DICT.get("angle_mode", "rad")
         self.custom_buttons = []
+        self.pending_tasks = {}
+        # Every edit bumps the generation; a preview result is only shown if
+        # nothing was typed since it was requested
+        self.preview_generation = 0
+        self.preview_task = None
+        self.preview_waiting = False
         self.init_ui()
 
     def init_ui(self):
@@ -606,10 +1501,21 @@ class StandardCalculatorTab(QWidget):
         self.input_field.setStyleSheet("font-size: 16pt;")
         self.input_field.setFixedHeight(max(min(self.input_field.fontMetrics().lineSpacing() + 20, 200), 120))
         self.input_field.textChanged.connect(self.adjust_input_height)
+        self.input_field.textChanged.connect(self.schedule_preview)
         input_layout.addWidget(self.input_field)
 
+        self.preview_label = QLabel()
+        self.preview_label.setStyleSheet("font-size: 14pt; color: gray;")
+        self.preview_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.preview_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        input_layout.addWidget(self.preview_label)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(self.PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self.update_preview)
+
         mode_layout = QHBoxLayout()
-        self.mode_button = QPushButton(t("mode_rad"))
+        self.mode_button = QPushButton(t("mode_rad") if self.angle_mode == 'rad' else t("mode_deg"))
         self.mode_button.setStyleSheet("font-size: 14pt; padding: 5px;")
         self.mode_button.clicked.connect(self.toggle_angle_mode)
         mode_layout.addWidget(self.mode_button)
@@ -624,6 +1530,12 @@ class StandardCalculatorTab(QWidget):
         self.clear_history_btn.clicked.connect(self.confirm_clear_history)
         mode_layout.addWidget(self.clear_history_btn)
 
+        self.search_history_btn = QPushButton(t("search_history"))
+        self.search_history_btn.setStyleSheet("font-size: 14pt; padding: 5px;")
+        self.search_history_btn.clicked.connect(
+            lambda: HistorySearchDialog("standard", self.input_field.setPlainText, self).show())
+        mode_layout.addWidget(self.search_history_btn)
+
         mode_layout.addStretch()
         input_layout.addLayout(mode_layout)
 
@@ -720,7 +1632,7 @@ class StandardCalculatorTab(QWidget):
         input_layout.addWidget(btn_widget)
 
         # History area
-        self.history_widget = HistoryWidget()
+        self.history_widget = HistoryWidget(source="standard", log=get_history_log())
         main_layout.addWidget(self.history_widget, stretch=1)
         self.setLayout(main_layout)
 
@@ -748,46 +1660,213 @@ class StandardCalculatorTab(QWidget):
         else:
             self.angle_mode = 'rad'
             self.mode_button.setText(t("mode_rad"))
+        CUSTOM_DICT["angle_mode"] = self.angle_mode
+        save_customizations(CUSTOM_DICT)
+        self.schedule_preview()
+
+    def schedule_preview(self):
+        self.preview_generation += 1
+        self.preview_timer.start()
+
+    def show_preview(self, approx_str):
+        self.preview_label.setText("= " + approx_str if approx_str else "")
+
+    def note_context(self, expr_str):
+        # The notes expr_str mentions (with everything they depend on) and the
+        # cache digest covering both the mappings and those notes' definitions
+        scope = get_note_scope()
+        notes = scope.closure(scope.referenced(expr_str))
+        digest = MAPPING_REWRITER.digest
+        if notes:
+            digest += ":" + scope.digest(notes)
+        return notes, digest
+
+    def update_preview(self):
+        expr_str = normalize_expression(self.input_field.toPlainText())
+        if not expr_str:
+            self.show_preview(None)
+            return
+        expr_str = MAPPING_REWRITER.rewrite(expr_str)
+        try:
+            notes, digest = self.note_context(expr_str)
+        except ValueError:
+            self.show_preview(None)
+            return
+        transformations = CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS)
+        key = cache_key(expr_str, self.angle_mode, transformations, digest)
+        cached = EXPRESSION_CACHE.get(key)
+        if cached is not None:
+            self.show_preview(cached["approx"])
+            return
+        approx = fast_approximate(expr_str, self.angle_mode, transformations, notes=notes)
+        if approx is not None:
+            self.show_preview(approx)
+            return
+        if self.preview_task is not None:
+            # One preview in flight at a time; the latest text goes next
+            self.preview_waiting = True
+            return
+        request = {"op": "eval", "expr": expr_str, "angle_mode": self.angle_mode,
+                   "transformations": list(transformations), "analytical": False, "notes": notes}
+        task = EvaluationTask(None, request, self.PREVIEW_TIMEOUT, cache_key=key)
+        task.generation = self.preview_generation
+        task.signals.finished.connect(self.preview_finished)
+        self.preview_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def preview_finished(self, task, response):
+        self.preview_task = None
+        if response["status"] == "ok" and task.cache_key not in EXPRESSION_CACHE.entries:
+            # Stored without an analytical form, so EXE shows the number at once
+            # and only waits for the closed form
+            EXPRESSION_CACHE.put(task.cache_key, {
+                "expr": response["expr"],
+                "approx": response["approx"],
+                "analytical": None,
+            })
+        if task.generation == self.preview_generation:
+            self.show_preview(response["approx"] if response["status"] == "ok" else None)
+        elif self.preview_waiting:
+            self.preview_waiting = False
+            self.update_preview()
 
     def calculate(self):
-        expr_str = (self.input_field.toPlainText()
-                    # .strip()
-                    .replace("\n", "")
-                    .replace("\t", "")
-                    .replace(" ", "")
-                    )
+        input_str = self.input_field.toPlainText()
+        expr_str = normalize_expression(input_str)
         if not expr_str:
             return
-        # Apply mappings
-        for name, repl in CUSTOM_DICT.get("mappings", default_function_mappings).items():
-            expr_str = expr_str.replace(name, repl)
         try:
-            if self.angle_mode == 'deg':
-                trig_sin = lambda x: sp.sin(x * sp.pi / 180)
-                trig_cos = lambda x: sp.cos(x * sp.pi / 180)
-                trig_tan = lambda x: sp.tan(x * sp.pi / 180)
-            else:
-                trig_sin = sp.sin
-                trig_cos = sp.cos
-                trig_tan = sp.tan
-
-            local_dict = {
-                "asin": sp.asin, "acos": sp.acos, "atan": sp.atan, "ln": sp.log,
-                "sin": trig_sin, "cos": trig_cos, "tan": trig_tan,
-                "pi": sp.pi, "e": sp.E
-            }
-            expr = parse_expr(expr_str, local_dict=local_dict, evaluate=True)
-            approx_str = str(sp.N(expr))
-            analytical_str = str(sp.nsimplify(expr, [sp.pi, sp.E]))
-            self.history_widget.add_entry(
-                self.input_field.toPlainText(),
-                analytical_str, approx_str
-            )
-        except Exception as e:
-            self.history_widget.add_entry(
-                self.input_field.toPlainText(),
-                t("error_prefix") + str(e), error=True
+            definition = parse_definition(expr_str)
+        except ValueError as e:
+            self.history_widget.add_entry(input_str, t("error_prefix") + str(e), error=True)
+            return
+        if definition is not None:
+            self.define_function(input_str, definition)
+            return
+        # Traced from here: empty input and definitions aren't evaluations
+        trace = TRACER.begin(input_str, "standard")
+        try:
+            with trace.span("mapping"):
+                expr_str = MAPPING_REWRITER.rewrite(expr_str)
+                notes, digest = self.note_context(expr_str)
+        except ValueError as e:
+            with trace.span("widget"):
+                self.history_widget.add_entry(input_str, t("error_prefix") + str(e), error=True, trace=trace)
+            trace.finish("error")
+            return
+        transformations = CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS)
+        digits = CUSTOM_DICT.get("precision", DEFAULT_DIGITS)
+        key = cache_key(expr_str, self.angle_mode, transformations, digest, digits)
+        cached = EXPRESSION_CACHE.get(key)
+        if cached is not None and cached.get("analytical") is not None:
+            with trace.span("widget"):
+                self.history_widget.add_entry(input_str, cached["analytical"], cached["approx"], trace=trace)
+            trace.finish("cached")
+            return
+        # A cached approximation without an analytical form (e.g. the deadline
+        # passed last time) or a fast-path result for plain arithmetic is shown
+        # at once while the worker looks for the analytical form
+        if cached is not None:
+            approx = cached["approx"]
+        else:
+            with trace.span("fast_path"):
+                approx = fast_approximate(expr_str, self.angle_mode, transformations, notes=notes)
+        with trace.span("widget"):
+            entry = self.history_widget.add_entry(
+                input_str, None, approx,
+                pending=True, cancel_callback=self.cancel_evaluation, trace=trace
             )
+        request = {"op": "eval", "expr": expr_str, "angle_mode": self.angle_mode,
+                   "transformations": list(transformations), "digits": digits, "notes": notes}
+        if trace:
+            request["trace"] = True
+        profile = profile_settings(input_str, self.angle_mode)
+        if profile:
+            request["profile"] = profile
+        task = EvaluationTask(entry, request, CUSTOM_DICT.get("eval_timeout", 30), cache_key=key,
+                              partial_timeout=CUSTOM_DICT.get("analytical_deadline", 5))
+        task.trace = trace
+        task.signals.partial.connect(self.evaluation_partial)
+        task.signals.finished.connect(self.evaluation_finished)
+        self.pending_tasks[entry] = task
+        QThreadPool.globalInstance().start(task)
+
+    def define_function(self, input_str, definition):
+        # f(a,b) := body is checked by a worker first, then saved as a function note
+        name, params, body = definition
+        body = MAPPING_REWRITER.rewrite(body)
+        scope = get_note_scope()
+        dependencies = sorted(scope.referenced(body) - set(params) - {name})
+        try:
+            notes = scope.closure(dependencies)
+            if any(entry[0] == name for entry in notes):
+                raise ValueError("Circular note reference: {0} uses itself".format(name))
+        except ValueError as e:
+            self.history_widget.add_entry(input_str, t("error_prefix") + str(e), error=True)
+            return
+        notes.append([name, [body], dependencies, params])
+        entry = self.history_widget.add_entry(input_str, None, pending=True,
+                                              cancel_callback=self.cancel_evaluation)
+        request = {"op": "define", "notes": notes, "angle_mode": self.angle_mode,
+                   "transformations": list(CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS))}
+        task = EvaluationTask(entry, request, CUSTOM_DICT.get("eval_timeout", 30))
+        task.note = {"name": name, "type": FUNCTION_TYPE, "input": input_str.strip()}
+        task.signals.finished.connect(self.definition_finished)
+        self.pending_tasks[entry] = task
+        QThreadPool.globalInstance().start(task)
+
+    def definition_finished(self, task, response):
+        entry = task.entry
+        self.pending_tasks.pop(entry, None)
+        if response["status"] != "ok":
+            entry.set_error(response_error_text(response))
+            return
+        note = dict(task.note, value=response["value"])
+        existing = next((old for old in NOTES if (old.get("name") or "").strip() == note["name"]), None)
+        if existing is None:
+            get_notes_model().append([note])
+        else:
+            existing.update(note)
+            get_notes_model().note_changed(existing)
+        entry.set_result(response["analytical"], None)
+
+    def cancel_evaluation(self, entry):
+        task = self.pending_tasks.get(entry)
+        if task is not None:
+            task.cancel()
+
+    def evaluation_partial(self, task, message):
+        task.entry.set_approx(message["approx"])
+
+    def evaluation_finished(self, task, response):
+        entry = task.entry
+        self.pending_tasks.pop(entry, None)
+        partial = task.last_partial
+        if response["status"] == "ok":
+            EXPRESSION_CACHE.put(task.cache_key, {
+                "expr": response["expr"],
+                "approx": response["approx"],
+                "analytical": response["analytical"],
+            })
+        elif (response["status"] == "timeout" and partial is not None
+              and partial["digits"] == task.request["digits"]):
+            # The approximation is still good; only the analytical form ran out
+            # of time. One cut short at a lower precision stage isn't kept.
+            EXPRESSION_CACHE.put(task.cache_key, {
+                "expr": partial["expr"],
+                "approx": partial["approx"],
+                "analytical": None,
+            })
+        with task.trace.span("widget"):
+            if response["status"] == "ok":
+                entry.set_result(response["analytical"], response["approx"])
+            elif response["status"] == "timeout" and partial is not None:
+                entry.set_result(None, partial["approx"])
+            elif response["status"] == "cancelled" and entry.approx_str is not None:
+                entry.set_result(None, entry.approx_str, t("cancelled"))
+            else:
+                entry.set_error(response_error_text(response))
+        task.trace.finish(response["status"])
 
     def revert_customizations(self):
         for btn in self.custom_buttons:
@@ -816,17 +1895,38 @@ class StandardCalculatorTab(QWidget):
             btn.updateTranslation()
         self.open_notes_btn.setText(t("open_notes"))
         self.clear_history_btn.setText(t("clear_history"))
+        self.search_history_btn.setText(t("search_history"))
         self.hint_label.setText(t("custom_help"))
 
 
+class SolveTask(EvaluationTask):
+    # Same signals as EvaluationTask, but runs the whole solver portfolio
+    def __init__(self, entry, requests, timeout, cache_key=None):
+        super().__init__(entry, None, timeout, cache_key=cache_key)
+        self.requests = requests
+
+    def run(self):
+        response = solve_portfolio(get_evaluation_pool(), self.requests, self.timeout, self._cancelled)
+        self.signals.finished.emit(self, response)
+
+
 # -----------------------------
 # LatexCalculatorTab
 # -----------------------------
 class LatexCalculatorTab(QWidget):
     def __init__(self):
         super().__init__()
+        self.pending_tasks = {}
+        self.parser_requested = False
         self.init_ui()
 
+    def showEvent(self, event):
+        # The ANTLR-based parser is only loaded once someone opens this tab
+        if not self.parser_requested:
+            self.parser_requested = True
+            QThreadPool.globalInstance().start(preload_latex_parser)
+        super().showEvent(event)
+
     def init_ui(self):
         main_layout = QVBoxLayout()
         splitter = QSplitter(Qt.Vertical)
@@ -844,11 +1944,16 @@ class LatexCalculatorTab(QWidget):
         self.calc_button.setMinimumWidth(180)
         self.calc_button.clicked.connect(self.calculate)
         btn_layout.addWidget(self.calc_button)
+        self.search_history_btn = QPushButton(t("search_history"))
+        self.search_history_btn.setStyleSheet("font-size: 14pt; padding: 5px;")
+        self.search_history_btn.clicked.connect(
+            lambda: HistorySearchDialog("latex", self.latex_input.setPlainText, self).show())
+        btn_layout.addWidget(self.search_history_btn)
         btn_layout.addStretch()
         top_layout.addLayout(btn_layout)
         top_widget.setLayout(top_layout)
         splitter.addWidget(top_widget)
-        self.history_widget = HistoryWidget()
+        self.history_widget = HistoryWidget(source="latex", log=get_history_log())
         splitter.addWidget(self.history_widget)
         splitter.setStretchFactor(0, 0)
         splitter.setStretchFactor(1, 1)
@@ -865,17 +1970,577 @@ class LatexCalculatorTab(QWidget):
         expr_str = self.latex_input.toPlainText().strip()  # .replace("\n", "")
         if not expr_str:
             return
-        try:
-            result = parse_latex(expr_str)
-            result_str = str(sp.N(result))
-            self.history_widget.add_entry(expr_str, result_str)
+        trace = TRACER.begin(expr_str, "latex")
+        key = latex_cache_key(expr_str)
+        cached = EXPRESSION_CACHE.get(key)
+        if cached is not None:
+            with trace.span("widget"):
+                self.history_widget.add_entry(expr_str, cached["approx"], trace=trace)
+            trace.finish("cached")
+            self.latex_input.clear()
+            return
+        with trace.span("widget"):
+            entry = self.history_widget.add_entry(
+                expr_str, None, pending=True, cancel_callback=self.cancel_evaluation, trace=trace
+            )
+        request = {"op": "latex", "expr": expr_str}
+        if trace:
+            request["trace"] = True
+        profile = profile_settings(expr_str, CUSTOM_DICT.get("angle_mode", "rad"))
+        if profile:
+            request["profile"] = profile
+        task = EvaluationTask(entry, request, CUSTOM_DICT.get("eval_timeout", 30), cache_key=key)
+        task.trace = trace
+        task.signals.finished.connect(self.evaluation_finished)
+        self.pending_tasks[entry] = task
+        QThreadPool.globalInstance().start(task)
+
+    def cancel_evaluation(self, entry):
+        task = self.pending_tasks.get(entry)
+        if task is not None:
+            task.cancel()
+
+    def evaluation_finished(self, task, response):
+        entry = task.entry
+        self.pending_tasks.pop(entry, None)
+        if response["status"] == "ok":
+            EXPRESSION_CACHE.put(task.cache_key, {"expr": response["expr"], "approx": response["approx"]})
+        with task.trace.span("widget"):
+            if response["status"] == "ok":
+                entry.set_result(response["approx"], None)
+            else:
+                entry.set_error(response_error_text(response))
+        task.trace.finish(response["status"])
+        if response["status"] == "ok" and self.latex_input.toPlainText().strip() == entry.input_str:
             self.latex_input.clear()
-        except Exception as e:
-            self.history_widget.add_entry(expr_str, t("error_prefix") + str(e), error=True)
 
     def updateTranslations(self):
         self.latex_input.setPlaceholderText(t("enter_latex"))
         self.calc_button.setText(t("equals"))
+        self.search_history_btn.setText(t("search_history"))
+
+
+# -----------------------------
+# SolverCalculatorTab
+# -----------------------------
+class SolverCalculatorTab(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.pending_tasks = {}
+        self.init_ui()
+
+    def init_ui(self):
+        main_layout = QVBoxLayout()
+        splitter = QSplitter(Qt.Vertical)
+        top_widget = QWidget()
+        top_layout = QVBoxLayout()
+        self.equation_input = QTextEdit()
+        self.equation_input.setPlaceholderText(t("enter_equations"))
+        self.equation_input.setStyleSheet("font-size: 16pt;")
+        self.equation_input.setFixedHeight(120)
+        top_layout.addWidget(self.equation_input)
+        btn_layout = QHBoxLayout()
+        self.calc_button = QPushButton(t("equals"))
+        self.calc_button.setStyleSheet("font-size: 14pt; padding: 5px;")
+        self.calc_button.setMinimumWidth(180)
+        self.calc_button.clicked.connect(self.calculate)
+        btn_layout.addWidget(self.calc_button)
+        self.search_history_btn = QPushButton(t("search_history"))
+        self.search_history_btn.setStyleSheet("font-size: 14pt; padding: 5px;")
+        self.search_history_btn.clicked.connect(
+            lambda: HistorySearchDialog("solver", self.equation_input.setPlainText, self).show())
+        btn_layout.addWidget(self.search_history_btn)
+        btn_layout.addStretch()
+        top_layout.addLayout(btn_layout)
+        top_widget.setLayout(top_layout)
+        splitter.addWidget(top_widget)
+        self.history_widget = HistoryWidget(source="solver", log=get_history_log())
+        splitter.addWidget(self.history_widget)
+        splitter.setStretchFactor(0, 0)
+        splitter.setStretchFactor(1, 1)
+        main_layout.addWidget(splitter)
+        self.setLayout(main_layout)
+
+    def calculate(self):
+        input_str = self.equation_input.toPlainText().strip()
+        equations = [MAPPING_REWRITER.rewrite(equation) for equation in split_equations(input_str)]
+        if not equations:
+            return
+        angle_mode = CUSTOM_DICT.get("angle_mode", "rad")
+        transformations = CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS)
+        key = cache_key("solve:" + ";".join(equations), angle_mode, transformations, MAPPING_REWRITER.digest)
+        cached = EXPRESSION_CACHE.get(key)
+        if cached is not None:
+            entry = self.history_widget.add_entry(input_str, None, pending=True)
+            self.show_result(entry, cached)
+            return
+        entry = self.history_widget.add_entry(
+            input_str, None, pending=True, cancel_callback=self.cancel_evaluation
+        )
+        task = SolveTask(entry, solver_requests(equations, angle_mode, transformations),
+                         CUSTOM_DICT.get("eval_timeout", 30), cache_key=key)
+        task.signals.finished.connect(self.evaluation_finished)
+        self.pending_tasks[entry] = task
+        QThreadPool.globalInstance().start(task)
+
+    def cancel_evaluation(self, entry):
+        task = self.pending_tasks.get(entry)
+        if task is not None:
+            task.cancel()
+
+    def show_result(self, entry, result):
+        if result["analytical"] is None:
+            entry.set_result(None, result["approx"], t("solver_numeric_only"))
+        else:
+            entry.set_result(result["analytical"], result["approx"])
+
+    def evaluation_finished(self, task, response):
+        entry = task.entry
+        self.pending_tasks.pop(entry, None)
+        if response["status"] == "ok":
+            result = {"analytical": response["analytical"], "approx": response["approx"]}
+            EXPRESSION_CACHE.put(task.cache_key, result)
+            self.show_result(entry, result)
+            if self.equation_input.toPlainText().strip() == entry.input_str:
+                self.equation_input.clear()
+        else:
+            entry.set_error(response_error_text(response))
+
+    def updateTranslations(self):
+        self.equation_input.setPlaceholderText(t("enter_equations"))
+        self.calc_button.setText(t("equals"))
+        self.search_history_btn.setText(t("search_history"))
+
+
+# -----------------------------
+# TableModel
+# -----------------------------
+def format_table_number(value):
+    if isinstance(value, complex):
+        if value != value:
+            return t("table_undefined")
+        return "{0:.15g}{1:+.15g}i".format(value.real, value.imag)
+    if value != value:
+        return t("table_undefined")
+    return "{0:.15g}".format(value)
+
+
+class TableModel(QAbstractTableModel):
+    # Only the result array is kept; x values and display strings are made
+    # when the view asks for a visible row, so a million rows cost nothing extra
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.start = 0.0
+        self.step = 1.0
+        self.values = None
+
+    def set_values(self, start, step, values):
+        self.beginResetModel()
+        self.start = start
+        self.step = step
+        self.values = values
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.values is None else len(self.values)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            row = index.row()
+            if index.column() == 0:
+                return format_table_number(self.start + self.step * row)
+            return format_table_number(self.values[row])
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return TABLE_VARIABLE if section == 0 else t("table_value")
+        return str(section + 1)
+
+
+# -----------------------------
+# TableCalculatorTab
+# -----------------------------
+class TableCalculatorTab(QWidget):
+    # The expression is lambdified once in a worker and evaluated over the
+    # whole range in one NumPy call; only the result array comes back
+    def __init__(self):
+        super().__init__()
+        self.task = None
+        self.generation = 0
+        self.init_ui()
+
+    def init_ui(self):
+        main_layout = QVBoxLayout()
+        self.expr_input = QLineEdit()
+        self.expr_input.setPlaceholderText(t("table_expression"))
+        self.expr_input.setStyleSheet("font-size: 16pt;")
+        self.expr_input.returnPressed.connect(self.calculate)
+        main_layout.addWidget(self.expr_input)
+
+        range_layout = QHBoxLayout()
+        self.range_labels = []
+        self.range_inputs = []
+        for key, default in (("table_start", "0"), ("table_stop", "10"), ("table_step", "1")):
+            label = QLabel(t(key))
+            label.setStyleSheet("font-size: 14pt;")
+            field = QLineEdit(default)
+            field.setStyleSheet("font-size: 14pt;")
+            field.returnPressed.connect(self.calculate)
+            range_layout.addWidget(label)
+            range_layout.addWidget(field)
+            self.range_labels.append((label, key))
+            self.range_inputs.append(field)
+        self.calc_button = QPushButton(t("equals"))
+        self.calc_button.setStyleSheet("font-size: 14pt; padding: 5px;")
+        self.calc_button.clicked.connect(self.calculate)
+        range_layout.addWidget(self.calc_button)
+        main_layout.addLayout(range_layout)
+
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("font-size: 10pt; color: gray;")
+        main_layout.addWidget(self.status_label)
+
+        self.model = TableModel(self)
+        self.table_view = QTableView()
+        self.table_view.setModel(self.model)
+        self.table_view.setStyleSheet("font-size: 14pt;")
+        self.table_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table_view.verticalHeader().setDefaultSectionSize(self.table_view.fontMetrics().lineSpacing() + 8)
+        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        main_layout.addWidget(self.table_view)
+        self.setLayout(main_layout)
+
+    def calculate(self):
+        expr_str = normalize_expression(self.expr_input.text())
+        if not expr_str:
+            return
+        try:
+            start, stop, step = (float(field.text()) for field in self.range_inputs)
+        except ValueError:
+            self.status_label.setText(t("error_prefix") + t("table_bad_number"))
+            return
+        try:
+            count = table_points(start, stop, step)
+        except ValueError as e:
+            self.status_label.setText(t("error_prefix") + str(e))
+            return
+        if self.task is not None:
+            self.task.cancel()
+        angle_mode = CUSTOM_DICT.get("angle_mode", "rad")
+        request = {"op": "table", "expr": MAPPING_REWRITER.rewrite(expr_str), "angle_mode": angle_mode,
+                   "transformations": list(CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS)),
+                   "start": start, "step": step, "count": count}
+        self.generation += 1
+        task = EvaluationTask(None, request, CUSTOM_DICT.get("eval_timeout", 30))
+        task.generation = self.generation
+        task.range = (start, step)
+        task.started = time.perf_counter()
+        task.signals.finished.connect(self.evaluation_finished)
+        self.task = task
+        self.status_label.setText(t("computing"))
+        QThreadPool.globalInstance().start(task)
+
+    def evaluation_finished(self, task, response):
+        if task.generation != self.generation:
+            return
+        self.task = None
+        if response["status"] != "ok":
+            self.status_label.setText(response_error_text(response))
+            return
+        values = response["values"]
+        self.model.set_values(task.range[0], task.range[1], values)
+        elapsed_ms = int((time.perf_counter() - task.started) * 1000)
+        mode = t("mode_rad") if task.request["angle_mode"] == "rad" else t("mode_deg")
+        self.status_label.setText(t("table_done").format(len(values), elapsed_ms, mode))
+
+    def updateTranslations(self):
+        self.expr_input.setPlaceholderText(t("table_expression"))
+        for label, key in self.range_labels:
+            label.setText(t(key))
+        self.calc_button.setText(t("equals"))
+        self.model.headerDataChanged.emit(Qt.Horizontal, 0, 1)
+
+
+# -----------------------------
+# PlotCurve
+# -----------------------------
+class PlotCurve:
+    def __init__(self, label, expr_str, color):
+        self.label = label
+        self.expr_str = expr_str
+        self.color = color
+        self.store = SampleStore()
+        self.task = None
+        self.error = None
+
+
+# -----------------------------
+# PlotCanvas
+# -----------------------------
+class PlotCanvas(QWidget):
+    # Draws the curves' samples with QPainter and turns wheel/drag input into
+    # view changes. Sampling itself is left to PlotCalculatorTab.
+    DEFAULT_VIEW = (-10.0, 10.0, -10.0, 10.0)
+    ZOOM_STEP = 1.25
+    MIN_SPAN = 1e-12
+    MAX_SPAN = 1e12
+
+    view_changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.curves = []
+        self.x0, self.x1, self.y0, self.y1 = self.DEFAULT_VIEW
+        self.drag_origin = None
+        self.setMinimumHeight(300)
+        self.setMouseTracking(False)
+
+    def reset_view(self):
+        self.x0, self.x1, self.y0, self.y1 = self.DEFAULT_VIEW
+        self.view_changed.emit()
+        self.update()
+
+    def x_per_pixel(self):
+        return (self.x1 - self.x0) / max(self.width(), 1)
+
+    def y_per_pixel(self):
+        return (self.y1 - self.y0) / max(self.height(), 1)
+
+    def to_pixel(self, x, y):
+        return ((x - self.x0) / self.x_per_pixel(), self.height() - (y - self.y0) / self.y_per_pixel())
+
+    def wheelEvent(self, event):
+        factor = self.ZOOM_STEP ** (-event.angleDelta().y() / 120)
+        span_x = (self.x1 - self.x0) * factor
+        span_y = (self.y1 - self.y0) * factor
+        if not (self.MIN_SPAN < span_x < self.MAX_SPAN and self.MIN_SPAN < span_y < self.MAX_SPAN):
+            return
+        # Zoom about the point under the cursor
+        pos = event.pos()
+        cx = self.x0 + pos.x() * self.x_per_pixel()
+        cy = self.y0 + (self.height() - pos.y()) * self.y_per_pixel()
+        self.x0 = cx - (cx - self.x0) * factor
+        self.x1 = self.x0 + span_x
+        self.y0 = cy - (cy - self.y0) * factor
+        self.y1 = self.y0 + span_y
+        self.view_changed.emit()
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_origin = (event.pos(), self.x0, self.x1, self.y0, self.y1)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_origin is None:
+            return
+        pos, x0, x1, y0, y1 = self.drag_origin
+        dx = (event.pos().x() - pos.x()) * self.x_per_pixel()
+        dy = (event.pos().y() - pos.y()) * self.y_per_pixel()
+        self.x0, self.x1 = x0 - dx, x1 - dx
+        self.y0, self.y1 = y0 + dy, y1 + dy
+        self.view_changed.emit()
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_origin = None
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.view_changed.emit()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        palette = self.palette()
+        painter.fillRect(self.rect(), palette.color(QPalette.Base))
+        self.paint_grid(painter, palette.color(QPalette.Text))
+        for curve in self.curves:
+            self.paint_curve(painter, curve)
+        painter.end()
+
+    def paint_grid(self, painter, text_color):
+        grid_color = QColor(text_color)
+        grid_color.setAlpha(40)
+        width, height = self.width(), self.height()
+        metrics = painter.fontMetrics()
+        for axis in ("x", "y"):
+            low, high = (self.x0, self.x1) if axis == "x" else (self.y0, self.y1)
+            step = nice_step(high - low, 8)
+            # Enough significant digits that neighbouring labels differ at any zoom
+            digits = min(max(int(math.log10(max(abs(low), abs(high), step) / step)) + 2, 6), 17)
+            first = math.ceil(low / step)
+            for index in range(int((high - low) / step) + 1):
+                value = (first + index) * step
+                if value > high:
+                    break
+                label = "{0:.{1}g}".format(value, digits)
+                painter.setPen(QPen(grid_color, 1))
+                if axis == "x":
+                    px = self.to_pixel(value, 0)[0]
+                    painter.drawLine(QPointF(px, 0), QPointF(px, height))
+                    painter.setPen(text_color)
+                    painter.drawText(QPointF(px + 3, height - 4), label)
+                else:
+                    py = self.to_pixel(0, value)[1]
+                    painter.drawLine(QPointF(0, py), QPointF(width, py))
+                    painter.setPen(text_color)
+                    painter.drawText(QPointF(3, py - 3), label)
+        painter.setPen(QPen(text_color, 1))
+        if self.x0 <= 0 <= self.x1:
+            px = self.to_pixel(0, 0)[0]
+            painter.drawLine(QPointF(px, 0), QPointF(px, height))
+        if self.y0 <= 0 <= self.y1:
+            py = self.to_pixel(0, 0)[1]
+            painter.drawLine(QPointF(0, py), QPointF(width, py))
+        y = metrics.height()
+        for curve in self.curves:
+            label = curve.label if curve.error is None else curve.label + "  " + curve.error
+            painter.setPen(curve.color if curve.error is None else QColor("red"))
+            painter.drawText(QPointF(width - metrics.width(label) - 8, y), label)
+            y += metrics.height()
+
+    def paint_curve(self, painter, curve):
+        # Points far off-screen are clamped so QPainter never sees huge
+        # coordinates; nan (undefined, or a break at a pole) lifts the pen
+        height = self.height()
+        limit = 4 * height
+        path = QPainterPath()
+        for xs, ys in curve.store.visible(self.x0, self.x1):
+            pxs = (xs - self.x0) / self.x_per_pixel()
+            pys = (height - (ys - self.y0) / self.y_per_pixel()).clip(-limit, height + limit)
+            pen_down = False
+            for px, py in zip(pxs.tolist(), pys.tolist()):
+                if py != py:
+                    pen_down = False
+                elif pen_down:
+                    path.lineTo(px, py)
+                else:
+                    path.moveTo(px, py)
+                    pen_down = True
+        painter.setPen(QPen(curve.color, 2))
+        painter.drawPath(path)
+
+
+# -----------------------------
+# PlotCalculatorTab
+# -----------------------------
+class PlotCalculatorTab(QWidget):
+    # Every curve has at most one sampling job in flight. A job asks only for
+    # the parts of the (slightly widened) view its SampleStore has not covered
+    # at the current resolution; when it returns, the next gap is requested.
+    RESAMPLE_DELAY_MS = 40
+    COLORS = ("#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf")
+
+    def __init__(self):
+        super().__init__()
+        self.curves = []
+        self.angle_mode = CUSTOM_DICT.get("angle_mode", "rad")
+        self.init_ui()
+
+    def init_ui(self):
+        main_layout = QVBoxLayout()
+        input_layout = QHBoxLayout()
+        self.expr_input = QLineEdit()
+        self.expr_input.setPlaceholderText(t("plot_expression"))
+        self.expr_input.setStyleSheet("font-size: 16pt;")
+        self.expr_input.returnPressed.connect(self.plot)
+        input_layout.addWidget(self.expr_input)
+        self.plot_button = QPushButton(t("plot"))
+        self.plot_button.setStyleSheet("font-size: 14pt; padding: 5px;")
+        self.plot_button.clicked.connect(self.plot)
+        input_layout.addWidget(self.plot_button)
+        self.reset_button = QPushButton(t("reset_view"))
+        self.reset_button.setStyleSheet("font-size: 14pt; padding: 5px;")
+        input_layout.addWidget(self.reset_button)
+        main_layout.addLayout(input_layout)
+
+        self.canvas = PlotCanvas()
+        self.canvas.curves = self.curves
+        self.reset_button.clicked.connect(self.canvas.reset_view)
+        main_layout.addWidget(self.canvas, 1)
+        self.setLayout(main_layout)
+
+        self.resample_timer = QTimer(self)
+        self.resample_timer.setSingleShot(True)
+        self.resample_timer.setInterval(self.RESAMPLE_DELAY_MS)
+        self.resample_timer.timeout.connect(self.request_samples)
+        self.canvas.view_changed.connect(self.resample_timer.start)
+
+    def showEvent(self, event):
+        # The angle mode is switched on the Standard tab
+        if CUSTOM_DICT.get("angle_mode", "rad") != self.angle_mode and self.curves:
+            self.plot()
+        super().showEvent(event)
+
+    def plot(self):
+        for curve in self.curves:
+            if curve.task is not None:
+                curve.task.cancel()
+        self.curves.clear()
+        self.angle_mode = CUSTOM_DICT.get("angle_mode", "rad")
+        for part in self.expr_input.text().split(";"):
+            expr_str = normalize_expression(part)
+            if expr_str:
+                color = QColor(self.COLORS[len(self.curves) % len(self.COLORS)])
+                self.curves.append(PlotCurve(part.strip(), MAPPING_REWRITER.rewrite(expr_str), color))
+        self.canvas.update()
+        self.request_samples()
+
+    def request_samples(self):
+        canvas = self.canvas
+        if not canvas.isVisible():
+            return
+        tolerance = resolution(canvas.y_per_pixel()) / 2
+        min_width = resolution(canvas.x_per_pixel()) / 4
+        pad_x = (canvas.x1 - canvas.x0) * PLOT_PREFETCH
+        span_y = canvas.y1 - canvas.y0
+        view_y = (canvas.y0, canvas.y1)
+        y_range = (canvas.y0 - span_y, canvas.y1 + span_y)
+        transformations = list(CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS))
+        for curve in self.curves:
+            if curve.task is not None or curve.error is not None:
+                continue
+            intervals = curve.store.missing(canvas.x0 - pad_x, canvas.x1 + pad_x, tolerance, view_y, min_width)
+            if not intervals:
+                continue
+            request = {"op": "sample", "expr": curve.expr_str, "angle_mode": self.angle_mode,
+                       "transformations": transformations, "intervals": intervals,
+                       "tolerance": tolerance, "min_width": min_width, "y_range": y_range}
+            task = EvaluationTask(curve, request, CUSTOM_DICT.get("eval_timeout", 30))
+            task.signals.finished.connect(self.samples_finished)
+            curve.task = task
+            QThreadPool.globalInstance().start(task)
+
+    def samples_finished(self, task, response):
+        curve = task.entry
+        curve.task = None
+        if curve not in self.curves:
+            return
+        request = task.request
+        if response["status"] == "ok":
+            view = (self.canvas.x0, self.canvas.x1)
+            for (start, stop), (xs, ys) in zip(request["intervals"], response["chunks"]):
+                curve.store.add(SampleChunk(start, stop, request["tolerance"], request["y_range"], xs, ys), view)
+        elif response["status"] != "cancelled":
+            curve.error = response_error_text(response)
+        self.canvas.update()
+        # The view may have moved while this job ran
+        self.request_samples()
+
+    def updateTranslations(self):
+        self.expr_input.setPlaceholderText(t("plot_expression"))
+        self.plot_button.setText(t("plot"))
+        self.reset_button.setText(t("reset_view"))
 
 
 # -----------------------------
@@ -934,6 +2599,7 @@ class MappingEditorWindow(QDialog):
             mappings[name] = repl
             CUSTOM_DICT["mappings"] = mappings
             save_customizations(CUSTOM_DICT)
+            refresh_mapping_rewriter()
             self.load_table()
 
     def remove_selected(self):
@@ -948,6 +2614,7 @@ class MappingEditorWindow(QDialog):
             del mappings[name]
             CUSTOM_DICT["mappings"] = mappings
             save_customizations(CUSTOM_DICT)
+            refresh_mapping_rewriter()
             self.load_table()
 
     def revert_mappings(self):
@@ -959,6 +2626,7 @@ class MappingEditorWindow(QDialog):
         if reply == QMessageBox.Yes:
             CUSTOM_DICT["mappings"] = default_function_mappings.copy()
             save_customizations(CUSTOM_DICT)
+            refresh_mapping_rewriter()
             self.load_table()
 
 
@@ -966,6 +2634,8 @@ class MappingEditorWindow(QDialog):
 # SettingsTab
 # -----------------------------
 class SettingsTab(QWidget):
+    SLOWEST_SHOWN = 20
+
     def __init__(self, update_callback, revert_custom_callback):
         super().__init__()
         self.update_callback = update_callback
@@ -1087,6 +2757,109 @@ QComboBox QAbstractItemView::item:hover {
         file_btn_layout.addStretch()
         main_layout.addLayout(file_btn_layout)
 
+        self.transformation_cbs = {}
+        for name in ("implicit_multiplication", "convert_xor", "factorial_notation"):
+            cb = QCheckBox(t(name))
+            cb.setStyleSheet("font-size: 14pt;")
+            cb.setChecked(name in CUSTOM_DICT.get("transformations", DEFAULT_TRANSFORMATIONS))
+            cb.stateChanged.connect(self.change_transformations)
+            main_layout.addWidget(cb)
+            self.transformation_cbs[name] = cb
+
+        deadline_layout = QHBoxLayout()
+        self.deadline_label = QLabel(t("analytical_deadline"))
+        self.deadline_label.setStyleSheet("font-size: 14pt;")
+        deadline_layout.addWidget(self.deadline_label)
+        self.deadline_spin = QSpinBox()
+        self.deadline_spin.setRange(1, 600)
+        self.deadline_spin.setValue(CUSTOM_DICT.get("analytical_deadline", 5))
+        self.deadline_spin.setStyleSheet("font-size: 14pt;")
+        self.deadline_spin.valueChanged.connect(self.change_analytical_deadline)
+        deadline_layout.addWidget(self.deadline_spin)
+        deadline_layout.addStretch()
+        main_layout.addLayout(deadline_layout)
+
+        precision_layout = QHBoxLayout()
+        self.precision_label = QLabel(t("precision"))
+        self.precision_label.setStyleSheet("font-size: 14pt;")
+        precision_layout.addWidget(self.precision_label)
+        self.precision_spin = QSpinBox()
+        self.precision_spin.setRange(DEFAULT_DIGITS, MAX_DIGITS)
+        self.precision_spin.setValue(CUSTOM_DICT.get("precision", DEFAULT_DIGITS))
+        self.precision_spin.setStyleSheet("font-size: 14pt;")
+        self.precision_spin.valueChanged.connect(self.change_precision)
+        precision_layout.addWidget(self.precision_spin)
+        precision_layout.addStretch()
+        main_layout.addLayout(precision_layout)
+
+        self.cache_persist_cb = QCheckBox(t("cache_persist"))
+        self.cache_persist_cb.setStyleSheet("font-size: 14pt;")
+        self.cache_persist_cb.setChecked(CUSTOM_DICT.get("cache_persist", False))
+        self.cache_persist_cb.stateChanged.connect(self.toggle_cache_persist)
+        main_layout.addWidget(self.cache_persist_cb)
+
+        cache_layout = QHBoxLayout()
+        self.cache_label = QLabel()
+        self.cache_label.setStyleSheet("font-size: 12pt; color: gray;")
+        cache_layout.addWidget(self.cache_label)
+        self.clear_cache_btn = QPushButton(t("clear_cache"))
+        self.clear_cache_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.clear_cache_btn.setStyleSheet("font-size: 14pt; padding: 8px 12px;")
+        self.clear_cache_btn.clicked.connect(self.clear_cache)
+        cache_layout.addWidget(self.clear_cache_btn)
+        cache_layout.addStretch()
+        main_layout.addLayout(cache_layout)
+        self.update_cache_stats()
+
+        self.diagnostics_cb = QCheckBox(t("diagnostics"))
+        self.diagnostics_cb.setStyleSheet("font-size: 14pt;")
+        self.diagnostics_cb.setChecked(CUSTOM_DICT.get("diagnostics", False))
+        self.diagnostics_cb.stateChanged.connect(self.toggle_diagnostics)
+        main_layout.addWidget(self.diagnostics_cb)
+        self.slowest_label = QLabel(t("slowest_evaluations"))
+        self.slowest_label.setStyleSheet("font-size: 12pt; color: gray;")
+        main_layout.addWidget(self.slowest_label)
+        self.diagnostics_tree = QTreeWidget()
+        self.diagnostics_tree.setHeaderLabels([t("diagnostics_expression"), t("diagnostics_time")])
+        self.diagnostics_tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.diagnostics_tree.header().setStretchLastSection(False)
+        self.diagnostics_tree.setMinimumHeight(160)
+        main_layout.addWidget(self.diagnostics_tree)
+        diagnostics_layout = QHBoxLayout()
+        self.refresh_diagnostics_btn = QPushButton(t("refresh"))
+        self.export_trace_btn = QPushButton(t("export_trace"))
+        self.clear_timings_btn = QPushButton(t("clear_timings"))
+        for btn, slot in ((self.refresh_diagnostics_btn, self.update_diagnostics),
+                          (self.export_trace_btn, self.export_trace),
+                          (self.clear_timings_btn, self.clear_timings)):
+            btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+            btn.setStyleSheet("font-size: 14pt; padding: 8px 12px;")
+            btn.clicked.connect(slot)
+            diagnostics_layout.addWidget(btn)
+        diagnostics_layout.addStretch()
+        main_layout.addLayout(diagnostics_layout)
+        self.update_diagnostics()
+
+        profile_layout = QHBoxLayout()
+        self.profile_cb = QCheckBox(t("profile_slow"))
+        self.profile_cb.setStyleSheet("font-size: 14pt;")
+        self.profile_cb.setChecked(CUSTOM_DICT.get("profile_slow", False))
+        self.profile_cb.stateChanged.connect(self.toggle_profile)
+        profile_layout.addWidget(self.profile_cb)
+        self.profile_spin = QSpinBox()
+        self.profile_spin.setRange(1, 600)
+        self.profile_spin.setValue(CUSTOM_DICT.get("profile_threshold", 2))
+        self.profile_spin.setStyleSheet("font-size: 14pt;")
+        self.profile_spin.valueChanged.connect(self.change_profile_threshold)
+        profile_layout.addWidget(self.profile_spin)
+        self.open_profiles_btn = QPushButton(t("open_profiles"))
+        self.open_profiles_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.open_profiles_btn.setStyleSheet("font-size: 14pt; padding: 8px 12px;")
+        self.open_profiles_btn.clicked.connect(lambda: self.open_folder(os.path.abspath(PROFILE_DIR)))
+        profile_layout.addWidget(self.open_profiles_btn)
+        profile_layout.addStretch()
+        main_layout.addLayout(profile_layout)
+
         self.help_btn = QPushButton(t("help"))
         self.help_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
         self.help_btn.setStyleSheet("font-size: 14pt; padding: 8px 12px;")
@@ -1120,6 +2893,7 @@ QComboBox QAbstractItemView::item:hover {
         self.update_callback()
 
     def open_custom_file(self):
+        SETTINGS_STORE.flush()
         if os.path.exists(CUSTOMIZATION_FILE):
             if sys.platform.startswith('win'):
                 os.startfile(CUSTOMIZATION_FILE)
@@ -1129,7 +2903,9 @@ QComboBox QAbstractItemView::item:hover {
                 subprocess.call(('xdg-open', CUSTOMIZATION_FILE))
 
     def open_in_file_browser(self):
-        folder = os.path.dirname(os.path.abspath(CUSTOMIZATION_FILE))
+        self.open_folder(os.path.dirname(os.path.abspath(CUSTOMIZATION_FILE)))
+
+    def open_folder(self, folder):
         if os.path.exists(folder):
             if sys.platform.startswith('win'):
                 os.startfile(folder)
@@ -1147,6 +2923,74 @@ QComboBox QAbstractItemView::item:hover {
         editor = MappingEditorWindow(self)
         editor.show()
 
+    def showEvent(self, event):
+        self.update_cache_stats()
+        self.update_diagnostics()
+        super().showEvent(event)
+
+    def update_cache_stats(self):
+        self.cache_label.setText(t("cache_stats").format(
+            EXPRESSION_CACHE.hits, EXPRESSION_CACHE.misses,
+            len(EXPRESSION_CACHE.entries), EXPRESSION_CACHE.bytes // 1024
+        ))
+
+    def clear_cache(self):
+        EXPRESSION_CACHE.clear()
+        if os.path.exists(CACHE_FILE):
+            os.remove(CACHE_FILE)
+        self.update_cache_stats()
+
+    def toggle_diagnostics(self, state):
+        TRACER.enabled = CUSTOM_DICT["diagnostics"] = state == Qt.Checked
+        save_customizations(CUSTOM_DICT)
+
+    def update_diagnostics(self):
+        # Slowest evaluations in the ring buffer, each expandable into its stages
+        self.diagnostics_tree.clear()
+        for trace in TRACER.slowest(self.SLOWEST_SHOWN):
+            item = QTreeWidgetItem(["[{0}] {1}".format(trace.status, trace.label),
+                                    "{0:.1f}".format(trace.total * 1000)])
+            for name, seconds in trace.breakdown().items():
+                item.addChild(QTreeWidgetItem([name, "{0:.1f}".format(seconds * 1000)]))
+            self.diagnostics_tree.addTopLevelItem(item)
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, t("export_trace"), "trace.json", "Chrome Trace (*.json)")
+        if not path:
+            return
+        try:
+            TRACER.export(path)
+        except OSError as e:
+            QMessageBox.warning(self, t("export_trace"), str(e))
+
+    def clear_timings(self):
+        TRACER.clear()
+        self.update_diagnostics()
+
+    def toggle_profile(self, state):
+        CUSTOM_DICT["profile_slow"] = state == Qt.Checked
+        save_customizations(CUSTOM_DICT)
+
+    def change_profile_threshold(self, value):
+        CUSTOM_DICT["profile_threshold"] = value
+        save_customizations(CUSTOM_DICT)
+
+    def change_transformations(self):
+        CUSTOM_DICT["transformations"] = [name for name, cb in self.transformation_cbs.items() if cb.isChecked()]
+        save_customizations(CUSTOM_DICT)
+
+    def change_analytical_deadline(self, value):
+        CUSTOM_DICT["analytical_deadline"] = value
+        save_customizations(CUSTOM_DICT)
+
+    def change_precision(self, value):
+        CUSTOM_DICT["precision"] = value
+        save_customizations(CUSTOM_DICT)
+
+    def toggle_cache_persist(self, state):
+        CUSTOM_DICT["cache_persist"] = state == Qt.Checked
+        save_customizations(CUSTOM_DICT)
+
     def confirm_revert(self, which):
         if which == "labels":
             reply = QMessageBox.question(self, "Revert Button Labels",
@@ -1161,6 +3005,7 @@ QComboBox QAbstractItemView::item:hover {
             if reply == QMessageBox.Yes:
                 CUSTOM_DICT["mappings"] = default_function_mappings.copy()
                 save_customizations(CUSTOM_DICT)
+                refresh_mapping_rewriter()
 
     def updateTranslations(self):
         self.lang_label.setText(t("choose_language"))
@@ -1173,6 +3018,21 @@ QComboBox QAbstractItemView::item:hover {
         self.open_btn.setText(t("open_custom_file"))
         self.browser_btn.setText(t("open_in_file_browser"))
         self.help_btn.setText(t("help"))
+        for name, cb in self.transformation_cbs.items():
+            cb.setText(t(name))
+        self.deadline_label.setText(t("analytical_deadline"))
+        self.precision_label.setText(t("precision"))
+        self.cache_persist_cb.setText(t("cache_persist"))
+        self.clear_cache_btn.setText(t("clear_cache"))
+        self.update_cache_stats()
+        self.diagnostics_cb.setText(t("diagnostics"))
+        self.slowest_label.setText(t("slowest_evaluations"))
+        self.diagnostics_tree.setHeaderLabels([t("diagnostics_expression"), t("diagnostics_time")])
+        self.refresh_diagnostics_btn.setText(t("refresh"))
+        self.export_trace_btn.setText(t("export_trace"))
+        self.clear_timings_btn.setText(t("clear_timings"))
+        self.profile_cb.setText(t("profile_slow"))
+        self.open_profiles_btn.setText(t("open_profiles"))
         self.copyright_label.setText(t("copyright"))
         self.dark_mode_cb.setText(t("dark_mode"))
         self.dark_mode_cb.setChecked(CUSTOM_DICT.get("dark_mode", False))
@@ -1195,11 +3055,12 @@ QComboBox QAbstractItemView::item:hover {
 class CalculatorApp(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.first_paint_seen = False
         self.setWindowTitle(t("app_title"))
         self.resize(600, 1100)
 
         base_path = getattr(sys, '_MEIPASS', os.path.abspath("."))
-        app.setWindowIcon(QIcon(os.path.join(base_path, "icon.ico")))
+        QApplication.instance().setWindowIcon(QIcon(os.path.join(base_path, "icon.ico")))
 
         self.tabs = QTabWidget()
 
@@ -1207,10 +3068,16 @@ class CalculatorApp(QMainWindow):
 
         self.standard_tab = StandardCalculatorTab()
         self.latex_tab = LatexCalculatorTab()
+        self.table_tab = TableCalculatorTab()
+        self.plot_tab = PlotCalculatorTab()
+        self.solver_tab = SolverCalculatorTab()
         self.settings_tab = SettingsTab(self.updateTranslations, self.standard_tab.revert_customizations)
 
         self.tabs.addTab(self.standard_tab, t("standard_tab"))
         self.tabs.addTab(self.latex_tab, t("latex_tab"))
+        self.tabs.addTab(self.table_tab, t("table_tab"))
+        self.tabs.addTab(self.plot_tab, t("plot_tab"))
+        self.tabs.addTab(self.solver_tab, t("solver_tab"))
         self.tabs.addTab(self.settings_tab, t("settings_tab"))
 
         # TabBar with a border, hover effect, and min-width of 180px
@@ -1244,21 +3111,47 @@ class CalculatorApp(QMainWindow):
 
         self.setCentralWidget(self.tabs)
 
+    def event(self, event):
+        if event.type() == QEvent.Paint and not self.first_paint_seen:
+            self.first_paint_seen = True
+            mark_startup("first paint")
+            QThreadPool.globalInstance().start(warm_up_evaluation_pool)
+        return super().event(event)
+
     def updateTranslations(self):
         self.standard_tab.updateTranslations()
         self.latex_tab.updateTranslations()
+        self.table_tab.updateTranslations()
+        self.plot_tab.updateTranslations()
+        self.solver_tab.updateTranslations()
         self.settings_tab.updateTranslations()
 
         self.tabs.setTabText(0, t("standard_tab"))
         self.tabs.setTabText(1, t("latex_tab"))
-        self.tabs.setTabText(2, t("settings_tab"))
+        self.tabs.setTabText(2, t("table_tab"))
+        self.tabs.setTabText(3, t("plot_tab"))
+        self.tabs.setTabText(4, t("solver_tab"))
+        self.tabs.setTabText(5, t("settings_tab"))
 
         self.setWindowTitle(t("app_title"))
 
 
-if __name__ == "__main__":
+def main():
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
+    connect_stores()
+    load_stores()
     set_dark_mode(CUSTOM_DICT.get("dark_mode", False))
+    load_expression_cache()
+    app.aboutToQuit.connect(shutdown_evaluation_pool)
+    app.aboutToQuit.connect(save_expression_cache)
+    app.aboutToQuit.connect(close_history_log)
+    app.aboutToQuit.connect(flush_stores)
     calc_app = CalculatorApp()
+    mark_startup("window constructed")
     calc_app.show()
     sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()